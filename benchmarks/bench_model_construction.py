@@ -0,0 +1,100 @@
+"""Benchmark construction of ermrest_model.Model for a large synthetic catalog.
+
+Compares eager construction with lazy construction, and lazy construction
+followed by typical access to a few tables, reporting elapsed time and
+peak traced memory. Run from the repository root:
+
+    python benchmarks/bench_model_construction.py [--tables 2000]
+"""
+import argparse
+import copy
+import gc
+import time
+import tracemalloc
+
+from deriva.core import ermrest_model
+from deriva.core.ermrest_model import Schema, Table, Column, Key, ForeignKey, builtin_types
+
+
+def synthetic_model_doc(ntables, nschemas=10, ncolumns=10):
+    """Build a model document shaped like a server response, with each table referencing two earlier tables."""
+    schemas = {}
+    for i in range(ntables):
+        sname = 'S%d' % (i % nschemas)
+        schema_doc = schemas.setdefault(sname, dict(Schema.define(sname), tables={}))
+        tname = 'T%d' % i
+        fkey_defs = [
+            ForeignKey.define(['fk%d' % n], 'S%d' % (j % nschemas), 'T%d' % j, ['RID'],
+                              constraint_name='%s_fk%d_fkey' % (tname, n))
+            for n, j in enumerate({i // 2, i // 3})
+        ]
+        table_doc = Table.define(
+            tname,
+            column_defs=[Column.define('c%d' % n, builtin_types.text) for n in range(ncolumns)] +
+                        [Column.define('fk%d' % n, builtin_types.text) for n in range(2)],
+            key_defs=[Key.define(['c0'], constraint_name='%s_c0_key' % tname)],
+            fkey_defs=fkey_defs,
+            comment='Synthetic table %d' % i,
+        )
+        table_doc.update(schema_name=sname, kind='table')
+        for doc in table_doc['keys'] + table_doc['foreign_keys']:
+            if not doc['names']:
+                doc['names'] = [[sname, '%s_%s_key' % (tname, '_'.join(doc['unique_columns']))]]
+            elif doc['names'][0][0] == 'placeholder':
+                doc['names'][0][0] = sname
+        schema_doc['tables'][tname] = table_doc
+    return {'acls': {}, 'annotations': {}, 'schemas': schemas}
+
+
+def touch_few_tables(model):
+    for tname in ('T1', 'T100', 'T1000'):
+        table = model.table('S%s' % (int(tname[1:]) % 10), tname)
+        [fkey.pk_table for fkey in table.foreign_keys]
+        table.referenced_by
+
+
+def measure(label, doc, repeat, func):
+    timings = []
+    for _ in range(repeat):
+        d = copy.deepcopy(doc)
+        gc.collect()
+        start = time.perf_counter()
+        func(d)
+        timings.append(time.perf_counter() - start)
+    d = copy.deepcopy(doc)
+    gc.collect()
+    tracemalloc.start()
+    result = func(d)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    print("%-28s %9.1f ms %9.1f MiB" % (label, min(timings) * 1000, peak / 2**20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tables', type=int, default=2000, help='number of tables in the synthetic model')
+    parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (minimum is reported)')
+    args = parser.parse_args()
+
+    doc = synthetic_model_doc(args.tables)
+    print("%d tables; time is best of %d; memory is peak traced allocation" % (args.tables, args.repeat))
+    print("%-28s %12s %13s" % ('', 'time', 'memory'))
+    measure('eager', doc, args.repeat, lambda d: ermrest_model.Model(None, d))
+    measure('lazy', doc, args.repeat, lambda d: ermrest_model.Model(None, d, lazy=True))
+
+    def lazy_touch(d):
+        model = ermrest_model.Model(None, d, lazy=True)
+        touch_few_tables(model)
+        return model
+    measure('lazy, touch 3 tables', doc, args.repeat, lazy_touch)
+
+    def lazy_all(d):
+        model = ermrest_model.Model(None, d, lazy=True)
+        model._materialize()
+        return model
+    measure('lazy, then materialize all', doc, args.repeat, lazy_all)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Benchmark the memory retained by a fully constructed ermrest_model.Model.
+
+Builds a synthetic catalog model with many wide tables and reports the
+memory retained by the Model object graph (excluding the model document
+it was built from), in total and per column. Run from the repository root:
+
+    python benchmarks/bench_model_memory.py [--tables 2000] [--columns 25]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from deriva.core import ermrest_model
+
+from bench_model_construction import synthetic_model_doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tables', type=int, default=2000, help='number of tables in the synthetic model')
+    parser.add_argument('--columns', type=int, default=25, help='number of user columns per table')
+    args = parser.parse_args()
+
+    doc = synthetic_model_doc(args.tables, ncolumns=args.columns)
+    gc.collect()
+    tracemalloc.start()
+    model = ermrest_model.Model(None, doc)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tables = [table for schema in model.schemas.values() for table in schema.tables.values()]
+    ncolumns = sum(len(table.columns) for table in tables)
+    nkeys = sum(len(table.keys) for table in tables)
+    nfkeys = sum(len(table.foreign_keys) for table in tables)
+    print("%d tables, %d columns, %d keys, %d foreign keys" % (len(tables), ncolumns, nkeys, nfkeys))
+    print("retained model memory: %.1f MiB (%.0f bytes per column)" % (retained / 2**20, retained / ncolumns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark columnar conversion of datapath result sets.
+
+Compares building a pandas DataFrame from the list of result row
+dictionaries with the model-typed ResultSet.to_pandas, to_numpy, and
+to_arrow conversions, for a synthetic result of typed columns served
+from memory. Reports elapsed time and peak traced memory, including
+decoding of the JSON response; memory allocated by Arrow itself is not
+traced. Run from the repository root:
+
+    python benchmarks/bench_resultset_columnar.py [--rows 200000]
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import pandas
+
+from deriva.core.columnar import ColumnSpec
+from deriva.core.datapath import _ResultSet
+
+SPECS = [
+    ColumnSpec('RID', 'ermrest_rid', False),
+    ColumnSpec('RCT', 'timestamptz', False),
+    ColumnSpec('count', 'int4', False),
+    ColumnSpec('score', 'float8', False),
+    ColumnSpec('flag', 'boolean', False),
+    ColumnSpec('day', 'date', False),
+    ColumnSpec('name', 'text', False),
+]
+
+
+def synthetic_rows(nrows):
+    """Build result rows for SPECS, with some null values."""
+    return [
+        {
+            'RID': '1-%04X' % i,
+            'RCT': '2020-01-%02dT%02d:%02d:00.000000+00:00' % (i % 28 + 1, i % 24, i % 60),
+            'count': None if i % 97 == 0 else i,
+            'score': i / 7.0,
+            'flag': i % 2 == 0,
+            'day': '2021-03-%02d' % (i % 28 + 1),
+            'name': 'name %d' % i,
+        }
+        for i in range(nrows)
+    ]
+
+
+def result_set(body, stream_body):
+    """Return a result set whose fetcher decodes the JSON body, or returns the JSON-stream body when raw."""
+    def fetcher(limit, sort, headers, raw=False):
+        return stream_body if raw else json.loads(body)
+    return _ResultSet('memory:', fetcher, columns=SPECS)
+
+
+def measure(label, body, stream_body, repeat, func):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(result_set(body, stream_body))
+        timings.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    result = func(result_set(body, stream_body))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    print("%-28s %9.1f ms %9.1f MiB" % (label, min(timings) * 1000, peak / 2**20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000, help='number of rows in the synthetic result')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repetitions (minimum is reported)')
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    body = json.dumps(rows)
+    stream_body = '\n'.join(json.dumps(row) for row in rows).encode()
+    del rows
+    print("%d rows; time is best of %d; memory is peak traced allocation" % (args.rows, args.repeat))
+    print("%-28s %12s %13s" % ('', 'time', 'memory'))
+    measure('DataFrame(list(rs))', body, stream_body, args.repeat, lambda rs: pandas.DataFrame(list(rs)))
+    measure('rs.to_pandas()', body, stream_body, args.repeat, lambda rs: rs.to_pandas())
+    measure('rs.to_numpy()', body, stream_body, args.repeat, lambda rs: rs.to_numpy())
+    measure('rs.to_arrow() (JSON-stream)', body, stream_body, args.repeat, lambda rs: rs.to_arrow())
+
+
+if __name__ == '__main__':
+    main()
@@ -412,8 +412,11 @@ class AclConfig:
         else:
             raise ValueError("toplevel config is a {t}".format(t=str(type(self.toplevel_config))))
 
-    def apply_acls(self):
-        self.toplevel_config.apply(self.saved_toplevel_config)
+    def plan_acls(self):
+        return ermrest_model.ApplyPlan(self.toplevel_config, self.saved_toplevel_config)
+
+    def apply_acls(self, workers=1):
+        self.plan_acls().execute(workers=workers)
 
     def dumps(self):
         """Dump a serialized (string) representation of the config.
@@ -530,6 +533,8 @@ class AclCLI(ConfigBaseCLI):
         group = self.parser.add_mutually_exclusive_group()
         group.add_argument('-g', '--groups-only', help="create group table only", action="store_true")
         group.add_argument('-o', '--omit-groups', help="do not create group table", action="store_true")
+        self.parser.add_argument('--workers', metavar='<n>', type=int, default=1,
+                                 help="number of configuration changes sent concurrently (default 1)")
 
 
 def main():
@@ -550,7 +555,7 @@ def main():
             if not args.groups_only:
                 acl_config.set_acls()
                 if not args.dryrun:
-                    acl_config.apply_acls()
+                    acl_config.apply_acls(workers=args.workers)
         except HTTPError as e:
             print(format_exception(e))
             raise
@@ -230,12 +230,17 @@ class AttrConfig:
         else:
             raise ValueError("toplevel config is a {t}".format(t=str(type(self.toplevel_config))))
 
-    def apply_annotations(self):
-        self.toplevel_config.apply(self.saved_toplevel_config)
+    def plan_annotations(self):
+        return ermrest_model.ApplyPlan(self.toplevel_config, self.saved_toplevel_config)
+
+    def apply_annotations(self, workers=1):
+        self.plan_annotations().execute(workers=workers)
 
 
 def main():
     cli = ConfigBaseCLI("annotation config tool", None, version=MY_VERSION)
+    cli.parser.add_argument('--workers', metavar='<n>', type=int, default=1,
+                            help="number of configuration changes sent concurrently (default 1)")
     args = cli.parse_cli()
     table_name = cli.get_table_arg(args)
     schema_names = cli.get_schema_arg_list(args)
@@ -245,7 +250,9 @@ def main():
                                  schema, table_name)
         attr_config.set_attributes()
         if not args.dryrun:
-            attr_config.apply_annotations()
+            attr_config.apply_annotations(workers=args.workers)
+        else:
+            print(json.dumps(attr_config.plan_annotations().prejson(), indent=2))
 
 
 if __name__ == '__main__':
@@ -1,13 +1,22 @@
 __version__ = "1.7.12"
 
 from deriva.core.utils.core_utils import *
+from deriva.core.utils.request_metrics import RequestEvent, RequestMetrics, add_request_observer, \
+    remove_request_observer, install_request_metrics
+from deriva.core.utils.json_utils import JSONCodec, set_json_codec, json_loads, json_dumps, json_dumpb, \
+    response_json
+from deriva.core.utils.paging_utils import PageSizeController, PageSizeHistory
 from deriva.core.base_cli import BaseCLI, KeyValuePairArgs
+from deriva.core.response_cache import ResponseCache, DiskResponseCache
 from deriva.core.deriva_binding import DerivaBinding, DerivaPathError, DerivaClientContext
 from deriva.core.deriva_server import DerivaServer
 from deriva.core.ermrest_catalog import ErmrestCatalog, ErmrestSnapshot, ErmrestCatalogMutationError, ErmrestAlias
+from deriva.core.model_cache import ModelCache
+from deriva.core.model_diff import ModelOp, ModelPatch
 from deriva.core.polling_ermrest_catalog import PollingErmrestCatalog
 from deriva.core.hatrac_store import HatracStore, HatracHashMismatch, HatracJobPaused, HatracJobAborted, \
     HatracJobTimeout
+from deriva.core.async_binding import AsyncDerivaBinding, AsyncErmrestCatalog, AsyncHatracStore
 from deriva.core.utils.globus_auth_utils import GlobusNativeLogin
 
 
@@ -0,0 +1,727 @@
+"""Asyncio bindings for DERIVA services.
+
+The classes in this module mirror DerivaBinding, ErmrestCatalog, and
+HatracStore, but expose coroutine request methods so that a single
+event loop can drive many concurrent requests over one bounded
+connection pool. They require the optional "aiohttp" package, which is
+imported on first use.
+
+Responses are returned as requests.Response instances so that callers
+(and the response cache) can treat them the same as responses from the
+synchronous bindings.
+"""
+import os
+import asyncio
+import logging
+import datetime
+import time
+import importlib
+from urllib.parse import urlparse
+from urllib3.util.retry import Retry
+
+from . import urlquote, NotModified, DEFAULT_HEADERS, DEFAULT_SESSION_CONFIG, DEFAULT_REQUESTS_TIMEOUT, \
+    DEFAULT_CHUNK_SIZE, DEFAULT_MAX_REQUEST_SIZE, Megabyte, format_exception, get_transfer_summary
+from .deriva_binding import DerivaBinding, DerivaClientContext, DerivaPathError, _response_raise_for_status
+from .response_cache import ResponseCache, DiskResponseCache, build_response
+from .ermrest_catalog import _is_empty_content
+from .hatrac_store import HatracHashMismatch, HatracJobAborted, HatracJobPaused
+from .utils import hash_utils as hu, mime_utils as mu
+from .utils.request_metrics import RequestEvent, has_request_observers, notify_request_observers, \
+    path_template, dcctx_fields
+
+DEFAULT_ASYNC_MAX_CONNECTIONS = 100
+
+_aiohttp = None
+
+
+def _import_aiohttp():
+    global _aiohttp
+    if _aiohttp is None:
+        try:
+            _aiohttp = importlib.import_module("aiohttp")
+        except ImportError as e:
+            raise ImportError("Unable to find required module. "
+                              "Ensure that the Python package \"aiohttp\" is installed.") from e
+    return _aiohttp
+
+
+class _TransferCancelled (Exception):
+    pass
+
+
+class AsyncDerivaBinding (object):
+    """This is a base-class for implementation purposes. Not useful for clients.
+
+    Request methods are coroutines and must be awaited from a running
+    event loop. The underlying HTTP session is created on first use
+    and should be released with `await binding.close()` or by using
+    the binding as an async context manager.
+    """
+
+    def __init__(self, scheme, server, credentials=None, caching=True, session_config=None,
+                 max_connections=DEFAULT_ASYNC_MAX_CONNECTIONS):
+        """Create asyncio HTTP(S) server binding.
+
+           Arguments:
+             scheme: 'http' or 'https'
+             server: server FQDN string
+             credentials: credential secrets, e.g. cookie
+             caching: whether to retain a GET response cache, or a
+               ResponseCache instance to use as that cache; lookups
+               and stores of a DiskResponseCache run in the default
+               executor rather than on the event loop
+             session_config: retry and timeout configuration, as for DerivaBinding
+             max_connections: size of the connection pool shared by
+               all concurrent requests on this binding
+
+           Deriva Client Context: You MAY mutate self.dcctx to
+           customize the context for this service endpoint prior to
+           invoking web requests, exactly as for DerivaBinding.
+
+        """
+        self._base_server_uri = "%s://%s" % (
+            scheme,
+            server
+        )
+        self._server_uri = self._base_server_uri
+        self._auth_uri = self._base_server_uri + "/authn/session"
+        self._server = server
+        self._credentials = credentials
+
+        self.session_config = DEFAULT_SESSION_CONFIG if not session_config else session_config
+        self.max_connections = max_connections
+        self._session = None
+        self._authn = None
+        self._request_observers = []
+
+        # a ResponseCache instance enables caching even when empty, i.e. when len(caching) == 0
+        self._caching = caching is not None and caching is not False
+        if isinstance(caching, ResponseCache):
+            self._cache = caching
+        else:
+            self._cache = ResponseCache()
+
+        self._response_raise_for_status = _response_raise_for_status
+
+        self.dcctx = DerivaClientContext()
+
+    # request preparation and status handling are shared with the synchronous binding
+    check_path = staticmethod(DerivaBinding.check_path)
+    cache_stats = DerivaBinding.cache_stats
+    _pre_get = DerivaBinding._pre_get
+    _pre_mutate = DerivaBinding._pre_mutate
+    _compress_requests = False
+    _encode_body = DerivaBinding._encode_body
+    _raise_for_status_304 = DerivaBinding._raise_for_status_304
+    _raise_for_status_412 = staticmethod(DerivaBinding._raise_for_status_412)
+
+    def get_server_uri(self):
+        return self._server_uri
+
+    async def __aenter__(self):
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _client_timeout(self):
+        aiohttp = _import_aiohttp()
+        timeout = self.session_config.get("timeout", DEFAULT_REQUESTS_TIMEOUT)
+        if isinstance(timeout, (list, tuple)):
+            connect, read = timeout
+        else:
+            connect = read = timeout
+        return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            aiohttp = _import_aiohttp()
+            ssl = None
+            upr = urlparse(self._base_server_uri)
+            if upr.scheme == "https" and upr.hostname in self.session_config.get("bypass_cert_verify_host_list", []):
+                ssl = False
+            headers = {}
+            if self.session_config.get("accept_encoding"):
+                headers['Accept-Encoding'] = self.session_config["accept_encoding"]
+            cookie_jar = aiohttp.CookieJar(unsafe=True)
+            credentials = self._credentials or {}
+            if 'bearer-token' in credentials:
+                headers['Authorization'] = 'Bearer {token}'.format(token=credentials['bearer-token'])
+            elif 'cookie' in credentials:
+                cname, cval = credentials['cookie'].split('=', 1)
+                cookie_jar.update_cookies({cname: cval}, response_url=importlib.import_module("yarl").URL(
+                    self._base_server_uri))
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ssl=ssl),
+                cookie_jar=cookie_jar,
+                headers=headers,
+                timeout=self._client_timeout(),
+            )
+            if 'bearer-token' not in credentials and 'cookie' not in credentials \
+                    and 'username' in credentials and 'password' in credentials:
+                # every caller waits on the same login request
+                self._authn = asyncio.ensure_future(self._login(credentials))
+        if self._authn is not None:
+            await self._authn
+        return self._session
+
+    async def _login(self, credentials):
+        headers = {'deriva-client-context': self.dcctx.encoded()}
+        async with self._session.post(self._auth_uri, data=credentials, headers=headers) as resp:
+            r = build_response(str(resp.url), resp.status, resp.reason, resp.headers, await resp.read())
+        _response_raise_for_status(r)
+        return r
+
+    async def close(self):
+        """Release the underlying HTTP session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._authn = None
+
+    def add_request_observer(self, observer):
+        """Add an observer called with a RequestEvent for each request made by this binding."""
+        if observer not in self._request_observers:
+            self._request_observers.append(observer)
+
+    def remove_request_observer(self, observer):
+        """Remove an observer previously added with add_request_observer()."""
+        self._request_observers[:] = [o for o in self._request_observers if o != observer]
+
+    async def _request(self, method, url, headers=None, data=None, sink=None, reset=None):
+        """Perform one HTTP request with retries, returning a requests.Response.
+
+        When sink is provided, it is called with each chunk of a
+        successful response body instead of retaining the body in
+        the returned response. A request whose body was partly
+        delivered to sink is only retried when reset is provided; it
+        is called before the retry to discard the partial body.
+
+        One RequestEvent is reported to the request observers for
+        the whole exchange, including any retries.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if not has_request_observers(self._request_observers):
+            return await self._send(method, url, headers, data, sink, reset, dict())
+
+        stats = {'retries': 0, 'response_bytes': 0}
+        start = time.perf_counter()
+        r = error = None
+        try:
+            r = await self._send(method, url, headers, data, sink, reset, stats)
+            return r
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            cid, action = dcctx_fields(headers)
+            event = RequestEvent(method, url, path_template(url), r.status_code if r is not None else None,
+                                 time.perf_counter() - start,
+                                 len(data) if isinstance(data, (bytes, bytearray)) else None,
+                                 stats['response_bytes'] if r is not None else None, stats['retries'], cid, action,
+                                 type(error).__name__ if r is None else None)
+            notify_request_observers(event, self._request_observers)
+
+    async def _send(self, method, url, headers, data, sink, reset, stats):
+        aiohttp = _import_aiohttp()
+        session = await self._get_session()
+        config = self.session_config
+        retry_connect = config.get("retry_connect", 2)
+        retry_read = config.get("retry_read", 4)
+        backoff_factor = config.get("retry_backoff_factor", 1.0)
+        status_forcelist = set(config.get("retry_status_forcelist", []))
+        may_retry = config.get("allow_retry_on_all_methods", False) or method in Retry.DEFAULT_ALLOWED_METHODS
+        data_pos = data.tell() if hasattr(data, 'seek') else None
+
+        connect_errors = read_errors = 0
+        sunk = False
+        while True:
+            if data_pos is not None:
+                data.seek(data_pos)
+            if sunk:
+                reset()
+                sunk = False
+            try:
+                async with session.request(method, url, headers=headers, data=data) as resp:
+                    if may_retry and resp.status in status_forcelist and read_errors < retry_read:
+                        read_errors += 1
+                    else:
+                        if sink is not None and resp.status < 300:
+                            nbytes = 0
+                            async for buf in resp.content.iter_chunked(DEFAULT_CHUNK_SIZE):
+                                sunk = True
+                                sink(buf)
+                                nbytes += len(buf)
+                            content = b''
+                        else:
+                            content = await resp.read()
+                            nbytes = len(content)
+                        stats['response_bytes'] = nbytes
+                        return build_response(str(resp.url), resp.status, resp.reason, resp.headers, content)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+                if not may_retry or (sunk and reset is None):
+                    raise
+                if isinstance(e, aiohttp.ClientConnectorError):
+                    connect_errors += 1
+                    if connect_errors > retry_connect:
+                        raise
+                else:
+                    read_errors += 1
+                    if read_errors > retry_read:
+                        raise
+                logging.debug("Retrying %s %s after error: %s" % (method, url, format_exception(e)))
+            attempt = stats['retries'] = connect_errors + read_errors
+            await asyncio.sleep(backoff_factor * (2 ** (attempt - 1)) if attempt > 1 else 0)
+
+    async def get_authn_session(self):
+        headers = {'deriva-client-context': self.dcctx.encoded()}
+        r = await self._request('GET', self._auth_uri, headers=headers)
+        _response_raise_for_status(r)
+        return r
+
+    async def post_authn_session(self, credentials):
+        headers = {'deriva-client-context': self.dcctx.encoded()}
+        r = await self._request('POST', self._auth_uri, headers=headers, data=credentials)
+        _response_raise_for_status(r)
+        return r
+
+    async def _cache_call(self, func, *args):
+        """Return func(*args), run in the default executor if it may block on a DiskResponseCache."""
+        if self._caching and isinstance(self._cache, DiskResponseCache):
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+        return func(*args)
+
+    async def head(self, path, headers=DEFAULT_HEADERS, raise_not_modified=False, cache=True):
+        """Perform HEAD request, returning response object.
+
+           Same semantics as DerivaBinding.head().
+        """
+        url, headers, prev_response = await self._cache_call(self._pre_get, path, headers, cache)
+        return self._raise_for_status_304(
+            await self._request('HEAD', url, headers=headers),
+            prev_response,
+            raise_not_modified
+        )
+
+    async def get(self, path, headers=DEFAULT_HEADERS, raise_not_modified=False, cache=True):
+        """Perform GET request, returning response object.
+
+           Same semantics as DerivaBinding.get(), except that content
+           is always retrieved before returning. Use get_as_file()
+           or get_obj() on subclasses to stream large content.
+        """
+        if headers is None:
+            headers = {}
+        url, headers, prev_response = await self._cache_call(self._pre_get, path, headers, cache)
+        r = self._raise_for_status_304(
+            await self._request('GET', url, headers=headers),
+            prev_response,
+            raise_not_modified
+        )
+        if self._caching and cache and r is not prev_response:
+            await self._cache_call(self._cache.put, url, r)
+        return r
+
+    async def post(self, path, data=None, json=None, headers=DEFAULT_HEADERS):
+        """Perform POST request, returning response object.
+
+           Raises ConcurrentUpdate for 412 status.
+        """
+        url, headers = self._pre_mutate(path, headers)
+        data, headers = self._encode_body(data, json, headers)
+        return self._raise_for_status_412(await self._request('POST', url, headers=headers, data=data))
+
+    async def put(self, path, data=None, json=None, headers=DEFAULT_HEADERS, guard_response=None):
+        """Perform PUT request, returning response object.
+
+           Uses guard_response to build appropriate 'if-match' header
+           to assure change is only applied to expected state.
+
+           Raises ConcurrentUpdate for 412 status.
+        """
+        url, headers = self._pre_mutate(path, headers, guard_response)
+        data, headers = self._encode_body(data, json, headers)
+        return self._raise_for_status_412(await self._request('PUT', url, headers=headers, data=data))
+
+    async def delete(self, path, headers=DEFAULT_HEADERS, guard_response=None):
+        """Perform DELETE request, returning response object.
+
+           Uses guard_response to build appropriate 'if-match' header
+           to assure change is only applied to expected state.
+
+           Raises ConcurrentUpdate for 412 status.
+        """
+        url, headers = self._pre_mutate(path, headers, guard_response)
+        return self._raise_for_status_412(await self._request('DELETE', url, headers=headers))
+
+    async def _get_to_file(self, url, headers, destfilename, on_chunk=None):
+        """Stream a GET response body into destfilename, returning (response, total bytes) or (None, total) if cancelled.
+
+        on_chunk is called with the running byte total and chunk count
+        after each write and may return False to cancel the transfer.
+        """
+        state = {'total': 0, 'chunks': 0}
+        destfile = open(destfilename, 'w+b')
+
+        def sink(buf):
+            destfile.write(buf)
+            state['total'] += len(buf)
+            state['chunks'] += 1
+            if on_chunk is not None and not on_chunk(state['total'], state['chunks']):
+                raise _TransferCancelled()
+
+        def reset():
+            # a retried request streams the body again from the start
+            destfile.seek(0)
+            destfile.truncate()
+            state['total'] = state['chunks'] = 0
+
+        try:
+            r = await self._request('GET', url, headers=headers, sink=sink, reset=reset)
+            destfile.flush()
+            return r, state['total']
+        except _TransferCancelled:
+            return None, state['total']
+        finally:
+            destfile.close()
+
+
+class AsyncErmrestCatalog (AsyncDerivaBinding):
+    """Asyncio handle for an ERMrest catalog.
+
+       Provides coroutine REST client methods for arbitrary catalog
+       paths, with the same path, header, and error conventions as
+       ErmrestCatalog.
+    """
+    _compress_requests = True
+
+    def __init__(self, scheme, server, catalog_id, credentials=None, caching=True, session_config=None,
+                 max_connections=DEFAULT_ASYNC_MAX_CONNECTIONS):
+        """Create asyncio ERMrest catalog binding.
+
+           Arguments:
+             scheme: 'http' or 'https'
+             server: server FQDN string
+             catalog_id: e.g. '1'
+             credentials: credential secrets, e.g. cookie
+             caching: whether to retain a GET response cache
+             session_config: retry and timeout configuration
+             max_connections: size of the shared connection pool
+        """
+        super(AsyncErmrestCatalog, self).__init__(scheme, server, credentials, caching, session_config,
+                                                  max_connections)
+        if isinstance(catalog_id, int):
+            catalog_id = str(catalog_id)
+        self._server_uri = "%s/ermrest/catalog/%s" % (
+            self._server_uri,
+            urlquote(catalog_id),
+        )
+        self._catalog_id = catalog_id
+
+    @property
+    def catalog_id(self):
+        return self._catalog_id
+
+    async def getCatalogSchema(self):
+        r = await self.get('/schema')
+        r.raise_for_status()
+        return r.json()
+
+    async def get_as_file(self, path, destfilename, headers=DEFAULT_HEADERS, callback=None, delete_if_empty=False):
+        """Retrieve catalog data streamed to destination file.
+
+           Same semantics as ErmrestCatalog.get_as_file() without
+           paged retrieval support. Caller is responsible to clean up
+           file even on error, when the file may or may not exist.
+        """
+        self.check_path(path)
+        headers = headers.copy()
+        headers['deriva-client-context'] = self.dcctx.merged(headers.get('deriva-client-context', {})).encoded()
+        url = self._server_uri + path
+        start = datetime.datetime.now()
+
+        def on_chunk(total, chunks):
+            if callback:
+                return callback(progress="Downloading: %.2f MB transferred" % (float(total) / float(Megabyte)))
+            return True
+
+        logging.debug("Transferring file %s to %s" % (url, destfilename))
+        r, total = await self._get_to_file(url, headers, destfilename, on_chunk)
+        if r is None:
+            return
+        self._response_raise_for_status(r)
+        summary = get_transfer_summary(total, datetime.datetime.now() - start)
+
+        delete_file = True if total == 0 else False
+        if delete_if_empty and total > 0:
+            with open(destfilename, 'rb') as destfile:
+                delete_file = _is_empty_content(destfile, r.headers.get("Content-Type"))
+        if delete_file:
+            os.remove(destfilename)
+
+        log_msg = "File [%s] transfer successful. %s %s" % \
+                  (destfilename, summary,
+                   "File was automatically deleted due to empty content." if delete_file else "")
+        logging.info(log_msg)
+        if callback:
+            callback(summary=log_msg, file_path=destfilename)
+
+    async def delete(self, path, headers=DEFAULT_HEADERS, guard_response=None):
+        """Perform DELETE request, returning response object.
+
+           Refuses to delete the catalog itself.
+        """
+        if path == "/":
+            raise DerivaPathError('Catalog deletion is not supported by the asyncio binding.')
+        return await AsyncDerivaBinding.delete(self, path, headers=headers, guard_response=guard_response)
+
+
+class AsyncHatracStore (AsyncDerivaBinding):
+    """Asyncio handle for a Hatrac object store."""
+
+    def __init__(self, scheme, server, credentials=None, session_config=None,
+                 max_connections=DEFAULT_ASYNC_MAX_CONNECTIONS):
+        """Create asyncio Hatrac server binding.
+
+           Arguments:
+             scheme: 'http' or 'https'
+             server: server FQDN string
+             credentials: credential secrets, e.g. cookie
+             session_config: retry and timeout configuration
+             max_connections: size of the shared connection pool
+        """
+        super(AsyncHatracStore, self).__init__(scheme, server, credentials, caching=False,
+                                               session_config=session_config, max_connections=max_connections)
+
+    @staticmethod
+    async def _file_hashes(file_path, hashes):
+        return await asyncio.get_running_loop().run_in_executor(None, hu.compute_file_hashes, file_path, hashes)
+
+    async def content_equals(self, path, filename=None, md5=None, sha256=None):
+        """Check if a remote object's content equals the specified file or digests.
+
+           Same semantics as HatracStore.content_equals().
+        """
+        self.check_path(path)
+
+        assert filename or md5 or sha256
+        if filename:
+            hashes = await self._file_hashes(filename, ['md5', 'sha256'])
+            md5 = hashes['md5'][1]
+            sha256 = hashes['sha256'][1]
+
+        r = await self.head(path)
+        return r.status_code == 200 and \
+            bool(md5 and r.headers.get('Content-MD5') == md5 or sha256 and r.headers.get('Content-SHA256') == sha256)
+
+    async def get_obj(self, path, headers=DEFAULT_HEADERS, destfilename=None, callback=None):
+        """Retrieve resource optionally streamed to destination file.
+
+           Same semantics as HatracStore.get_obj(), including hash
+           verification of downloaded files.
+        """
+        self.check_path(path)
+        headers = headers.copy()
+        headers['deriva-client-context'] = self.dcctx.merged(headers.get('deriva-client-context', {})).encoded()
+        url = self._server_uri + path
+
+        if destfilename is None:
+            r = await self._request('GET', url, headers=headers)
+            self._response_raise_for_status(r)
+            return r
+
+        start = datetime.datetime.now()
+
+        def on_chunk(total, chunks):
+            if callback:
+                return callback(progress="Downloading: %.2f MB transferred" % (total / Megabyte),
+                                total_bytes=total, current_chunk=chunks)
+            return True
+
+        logging.debug("Transferring file %s to %s" % (url, destfilename))
+        r, total = await self._get_to_file(url, headers, destfilename, on_chunk)
+        if r is None:
+            os.remove(destfilename)
+            return None
+        self._response_raise_for_status(r)
+        summary = get_transfer_summary(total, datetime.datetime.now() - start)
+        logging.info("File [%s] transfer successful. %s" % (destfilename, summary))
+        if callback:
+            callback(summary=summary, file_path=destfilename)
+
+        if 'Content-SHA256' in r.headers:
+            logging.info("Verifying SHA256 checksum for downloaded file [%s]" % destfilename)
+            fsha256 = (await self._file_hashes(destfilename, ['sha256']))['sha256'][1]
+            rsha256 = r.headers.get('Content-SHA256')
+            if fsha256 != rsha256:
+                raise HatracHashMismatch('Content-SHA256 %s != computed sha256 %s' % (rsha256, fsha256))
+        elif 'Content-MD5' in r.headers:
+            logging.info("Verifying MD5 checksum for downloaded file [%s]" % destfilename)
+            fmd5 = (await self._file_hashes(destfilename, ['md5']))['md5'][1]
+            rmd5 = r.headers.get('Content-MD5')
+            if fmd5 != rmd5:
+                raise HatracHashMismatch('Content-MD5 %s != computed MD5 %s' % (rmd5, fmd5))
+        return r
+
+    async def _existing_location(self, path, md5, sha256, allow_versioning, file_path):
+        """Return existing object location if content matches, else None."""
+        try:
+            r = await self.head(path)
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            if response is None or response.status_code != 404:
+                logging.debug("HEAD request failed: %s" % format_exception(e))
+            return None
+        if r.status_code == 200:
+            if (md5 and r.headers.get('Content-MD5') == md5 or
+                    sha256 and r.headers.get('Content-SHA256') == sha256):
+                return r.headers.get('Content-Location')
+            elif not allow_versioning:
+                raise NotModified("The file [%s] cannot be uploaded because content already exists for this object "
+                                  "and multiple versions are not allowed." % file_path)
+        return None
+
+    def _location(self, r):
+        loc = r.text.strip() or r.url
+        if loc.startswith(self._server_uri):
+            loc = loc[len(self._server_uri):]
+        return loc
+
+    async def put_obj(self, path, file_path, headers=DEFAULT_HEADERS, md5=None, sha256=None, parents=True,
+                      content_type=None, content_disposition=None, allow_versioning=True, force=False):
+        """Idempotent single-request upload of a file, returning object location URI.
+
+           Same semantics as HatracStore.put_obj() for a filename.
+        """
+        self.check_path(path)
+        if not (md5 or sha256):
+            md5 = (await self._file_hashes(file_path, ['md5']))['md5'][1]
+
+        file_size = os.path.getsize(file_path)
+        max_request_size = self.session_config.get("max_request_size", DEFAULT_MAX_REQUEST_SIZE)
+        if file_size > max_request_size:
+            raise ValueError("The PUT request payload size of %d bytes is larger than the currently allowed maximum "
+                             "payload size of %d bytes for single request PUT operations. Use the 'put_loc' function "
+                             "to perform chunked uploads of large data objects." % (file_size, max_request_size))
+        if not force:
+            loc = await self._existing_location(path, md5, sha256, allow_versioning, file_path)
+            if loc:
+                return loc
+
+        headers = headers.copy()
+        if md5:
+            headers['Content-MD5'] = md5
+        if sha256:
+            headers['Content-SHA256'] = sha256
+        headers['deriva-client-context'] = self.dcctx.merged(headers.get('deriva-client-context', {})).encoded()
+        if content_type:
+            headers['Content-Type'] = content_type
+        if content_disposition:
+            headers['Content-Disposition'] = content_disposition
+
+        url = self._server_uri + path
+        url = '%s%s' % (url.rstrip("/") if url.endswith("/") else url,
+                        "" if not parents else "?parents=%s" % str(parents).lower())
+        with open(file_path, 'rb') as f:
+            r = await self._request('PUT', url, headers=headers, data=f)
+        self._response_raise_for_status(r)
+        return self._location(r)
+
+    async def put_loc(self, path, file_path, headers=DEFAULT_HEADERS, md5=None, sha256=None, content_type=None,
+                      content_disposition=None, chunked=False, chunk_size=DEFAULT_CHUNK_SIZE, create_parents=True,
+                      allow_versioning=True, callback=None, cancel_job_on_error=True, force=False):
+        """Idempotent upload of a file, optionally using a chunked upload job, returning object location URI.
+
+           Same semantics as HatracStore.put_loc().
+        """
+        self.check_path(path)
+
+        if not chunked:
+            return await self.put_obj(path, file_path, headers, md5, sha256, parents=create_parents,
+                                      content_type=content_type, content_disposition=content_disposition,
+                                      allow_versioning=allow_versioning, force=force)
+
+        if not (md5 or sha256):
+            md5 = (await self._file_hashes(file_path, ['md5']))['md5'][1]
+
+        if not force:
+            loc = await self._existing_location(path, md5, sha256, allow_versioning, file_path)
+            if loc:
+                return loc
+
+        job_id = await self.create_upload_job(path, file_path, md5, sha256, create_parents=create_parents,
+                                              chunk_size=chunk_size, content_type=content_type,
+                                              content_disposition=content_disposition)
+        try:
+            job_info = (await self.get_upload_job(path, job_id)).json()
+            chunk_size = job_info.get("chunk-length", chunk_size)
+            file_size = os.path.getsize(file_path)
+            chunks = file_size // chunk_size + (1 if file_size % chunk_size else 0)
+            start = datetime.datetime.now()
+            with open(file_path, 'rb') as f:
+                for chunk in range(chunks):
+                    data = f.read(chunk_size)
+                    url = '%s;upload/%s/%d' % (path, job_id, chunk)
+                    chunk_headers = {'Content-Type': 'application/octet-stream', 'Content-Length': '%d' % len(data)}
+                    r = await self.put(url, data=data, headers=chunk_headers)
+                    self._response_raise_for_status(r)
+                    if callback:
+                        ret = callback(job_info=job_info, completed=chunk + 1, total=chunks,
+                                       file_path=file_path, host=self._server_uri)
+                        if ret == 0:
+                            raise HatracJobAborted("Upload in-progress cancelled by user.")
+                        elif ret == -1:
+                            raise HatracJobPaused("Upload in-progress paused by user.")
+            summary = get_transfer_summary(file_size, datetime.datetime.now() - start)
+            logging.info("File [%s] upload successful. %s" % (file_path, summary))
+            if callback:
+                callback(summary=summary, file_path=file_path)
+        except HatracJobPaused:
+            raise
+        except BaseException:
+            if cancel_job_on_error:
+                try:
+                    await self.cancel_upload_job(path, job_id)
+                except Exception:
+                    pass
+            raise
+        return await self.finalize_upload_job(path, job_id)
+
+    async def create_upload_job(self, path, file_path, md5, sha256, create_parents=True,
+                                chunk_size=DEFAULT_CHUNK_SIZE, content_type=None, content_disposition=None):
+        self.check_path(path)
+        url = '%s;upload%s' % (path, "" if not create_parents else "?parents=%s" % str(create_parents).lower())
+        obj = {"chunk-length": chunk_size,
+               "content-length": os.path.getsize(file_path)}
+        if md5:
+            obj["content-md5"] = md5
+        if sha256:
+            obj["content-sha256"] = sha256
+        if content_disposition:
+            obj['content-disposition'] = content_disposition
+        obj['content-type'] = content_type if content_type else mu.guess_content_type(file_path)
+        r = await self.post(url, json=obj, headers={'Content-Type': 'application/json'})
+        job_id = r.text.split('/')[-1][:-1]
+        logging.debug('Created job_id "%s" for url "%s".' % (job_id, url))
+        return job_id
+
+    async def get_upload_job(self, path, job_id):
+        self.check_path(path)
+        return await self.get('%s;upload/%s' % (path, job_id), headers={})
+
+    async def finalize_upload_job(self, path, job_id):
+        self.check_path(path)
+        r = await self.post('%s;upload/%s' % (path, job_id), headers={})
+        return r.text.strip()
+
+    async def cancel_upload_job(self, path, job_id):
+        self.check_path(path)
+        await self.delete('%s;upload/%s' % (path, job_id), headers={})
+
+    async def del_obj(self, path):
+        """Delete an object."""
+        self.check_path(path)
+        await self.delete(path)
+        logging.debug('Deleted object "%s%s".' % (self._server_uri, path))
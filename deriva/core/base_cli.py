@@ -3,6 +3,7 @@ import logging
 
 from . import init_logging, __version__
 from .utils.version_utils import get_installed_version
+from .utils.request_metrics import install_request_metrics
 
 
 class BaseCLI(object):
@@ -47,9 +48,21 @@ class BaseCLI(object):
                     self.parser._handle_conflict_resolve(None, [(option, action)])
                     break
 
+    def add_request_metrics_options(self):
+        self.parser.add_argument(
+            '--request-metrics', metavar='<file>',
+            help="Write a summary of HTTP request metrics to <file> at exit. Use \"-\" to write to stderr.")
+
+        self.parser.add_argument(
+            '--request-metrics-format', choices=['prometheus', 'json'],
+            help="Format of the request metrics summary. Default: \"json\" if the file name ends with \".json\", "
+                 "otherwise \"prometheus\" (text exposition format).")
+
     def parse_cli(self):
         args = self.parser.parse_args()
         init_logging(level=logging.CRITICAL if args.quiet else (logging.DEBUG if args.debug else logging.INFO))
+        if getattr(args, "request_metrics", None):
+            install_request_metrics(args.request_metrics, args.request_metrics_format)
 
         return args
 
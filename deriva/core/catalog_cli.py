@@ -154,8 +154,23 @@ class DerivaCatalogCLI (BaseCLI):
                                   help="Do not truncate destination history after cloning.")
         clone_parser.add_argument("--exclude-schemas", metavar="<schema-name> <schema-name> ...",
                                   nargs="+", help="List of schema names to exclude from the cloning process.")
+        clone_parser.add_argument("--copy-workers", metavar="<n>", type=int, default=4,
+                                  help="Number of tables whose data is copied concurrently. Default: 4")
         clone_parser.set_defaults(func=self.catalog_clone)
 
+        # sync parser
+        sync_parser = subparsers.add_parser('sync', help="Incrementally synchronize the table data of a previously "
+                                                         "cloned destination catalog with a source catalog.")
+        sync_parser.add_argument("id", metavar="<id>", type=str, help="Source catalog ID")
+        sync_parser.add_argument("dest_id", metavar="<dest-id>", type=str, help="Destination catalog ID")
+        sync_parser.add_argument("--no-propagate-deletes", action="store_false",
+                                 help="Do not delete destination rows which no longer exist in the source.")
+        sync_parser.add_argument("--exclude-schemas", metavar="<schema-name> <schema-name> ...",
+                                 nargs="+", help="List of schema names to exclude from synchronization.")
+        sync_parser.add_argument("--copy-workers", metavar="<n>", type=int, default=4,
+                                 help="Number of tables synchronized concurrently. Default: 4")
+        sync_parser.set_defaults(func=self.catalog_sync)
+
         # create_alias parser
         create_alias_parser = subparsers.add_parser('create-alias', help="Create a new catalog alias")
         create_alias_parser.add_argument("--id", metavar="<id>", type=str, help="The alias id.")
@@ -267,7 +282,8 @@ class DerivaCatalogCLI (BaseCLI):
                                              copy_annotations=args.no_copy_annotations,
                                              copy_policy=args.no_copy_policy,
                                              truncate_after=args.no_truncate_after,
-                                             exclude_schemas=args.exclude_schemas)
+                                             exclude_schemas=args.exclude_schemas,
+                                             copy_workers=args.copy_workers)
             print("Catalog successfully cloned into new catalog: %s" % dest_cat.catalog_id)
         except HTTPError as e:
             if e.response.status_code == requests.codes.not_found:
@@ -275,6 +291,24 @@ class DerivaCatalogCLI (BaseCLI):
             else:
                 raise e
 
+    def catalog_sync(self, args):
+        """Implements the catalog_sync sub-command.
+        """
+        try:
+            catalog = self.server.connect_ermrest(args.id)
+            dest_cat = self.server.connect_ermrest(args.dest_id)
+            print("Attempting to sync catalog %s into catalog %s. Please wait..." % (args.id, args.dest_id))
+            result = catalog.sync_catalog(dest_cat,
+                                          exclude_schemas=args.exclude_schemas,
+                                          propagate_deletes=args.no_propagate_deletes,
+                                          copy_workers=args.copy_workers)
+            print("Catalog %s successfully synchronized to source snapshot %s." % (args.dest_id, result["snaptime"]))
+        except HTTPError as e:
+            if e.response.status_code == requests.codes.not_found:
+                raise ResourceException('Catalog not found', e)
+            else:
+                raise e
+
     def catalog_get(self, args):
         """Implements the catalog_get sub-command.
         """
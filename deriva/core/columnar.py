@@ -0,0 +1,283 @@
+"""Columnar materialization of catalog query results as NumPy arrays, pandas DataFrames, or Arrow tables.
+
+Result rows are transposed once into one list of values per result
+column, and each list is converted to a typed column according to the
+ERMrest type of the result column as found in the catalog model.
+Domain types are converted as their base types:
+
+  ERMrest type                   NumPy              pandas                Arrow
+  int2, int4, int8, serial*      int16/32/64 (1)    Int16/32/64           int16/32/64
+  float4, float8, numeric        float32/64         float32/64            float32/64
+  boolean                        bool (1)           boolean               bool
+  date                           datetime64[D]      datetime64            date32
+  timestamp                      datetime64[us]     datetime64[us]        timestamp[us]
+  timestamptz                    datetime64[us] (2) datetime64[us, UTC]   timestamp[us, UTC]
+  json, jsonb                    object             object                string (3)
+  arrays of the above            object (lists)     object (lists)        list<...>
+  text and other types           object             object                string
+
+(1) NumPy has no missing value for integers or booleans, so integer
+    columns with nulls become float64 with NaN, and boolean columns
+    with nulls become object arrays.
+(2) normalized to UTC.
+(3) serialized JSON text.
+
+Columns of unknown type (e.g. bins) are converted as NumPy object
+arrays and by inference in pandas and Arrow. NumPy, pandas, and pyarrow
+are optional dependencies, imported on first use.
+"""
+import datetime
+import importlib
+from collections import OrderedDict, namedtuple
+
+from .utils.json_utils import json_dumps
+from .ermrest_model import ArrayType, timestamptz_to_datetime
+
+_modules = {}
+
+
+def _import(name, package=None):
+    module = _modules.get(name)
+    if module is None:
+        try:
+            module = _modules[name] = importlib.import_module(name)
+        except ImportError as e:
+            raise ImportError("Unable to find required module. Ensure that the Python package \"%s\" is installed."
+                              % (package or name)) from e
+    return module
+
+
+def _import_numpy():
+    return _import("numpy")
+
+
+def _import_pandas():
+    return _import("pandas")
+
+
+def _import_pyarrow():
+    return _import("pyarrow")
+
+
+_int_types = {
+    'int2': 'int16', 'int4': 'int32', 'int8': 'int64',
+    'serial2': 'int16', 'serial4': 'int32', 'serial8': 'int64',
+}
+_float_types = {'float4': 'float32', 'float8': 'float64', 'numeric': 'float64'}
+_temporal_types = {'date', 'timestamp', 'timestamptz'}
+_json_types = {'json', 'jsonb'}
+
+
+class ColumnSpec (namedtuple('ColumnSpec', 'name typename is_array')):
+    """Name and type of a result column.
+
+    :param name: the output column name
+    :param typename: the scalar ERMrest type name with domains resolved (of array elements for arrays), or None if unknown
+    :param is_array: True if the column is an array of typename
+    """
+    __slots__ = ()
+
+    @classmethod
+    def fromtype(cls, name, column_type):
+        """Return the spec of a column named name of ermrest_model.Type column_type, which may be None if unknown."""
+        if column_type is None:
+            return cls(name, None, False)
+        is_array = False
+        while True:
+            if isinstance(column_type, ArrayType):
+                if is_array:
+                    # arrays of arrays are not converted
+                    return cls(name, None, False)
+                is_array = True
+                column_type = column_type.base_type
+            elif column_type.is_domain:
+                column_type = column_type.base_type
+            else:
+                return cls(name, column_type.typename, is_array)
+
+
+def _parse_timestamptz(value):
+    """Return a naive UTC datetime for an ERMrest timestamptz string, or None."""
+    if value is None:
+        return None
+    return timestamptz_to_datetime(value).astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _timestamptz_array(values):
+    """Return a NumPy datetime64[us] array of UTC times for a list of ERMrest timestamptz strings or None.
+
+    The local times are parsed by NumPy and shifted by their UTC offsets, which are parsed once per distinct
+    offset. Values not in the form serialized by ERMrest are parsed one at a time.
+    """
+    np = _import_numpy()
+    bases, offsets, parsed = [], [], {}
+    for value in values:
+        if value is None:
+            bases.append('NaT')
+            offsets.append(0)
+            continue
+        i = max(value.rfind('+'), value.rfind('-'))
+        minutes = parsed.get(value[i:]) if i > 10 else None
+        if minutes is None and i > 10:
+            offset = value[i + 1:].split(':')
+            if len(offset) <= 2 and all(len(part) == 2 and part.isdigit() for part in offset):
+                minutes = int(offset[0]) * 60 + (int(offset[1]) if len(offset) > 1 else 0)
+                minutes = parsed[value[i:]] = minutes if value[i] == '+' else -minutes
+        if minutes is None:
+            bases.append(_parse_timestamptz(value).isoformat())
+            offsets.append(0)
+        else:
+            bases.append(value[:i])
+            offsets.append(minutes)
+    return np.array(bases, dtype='datetime64[us]') - np.array(offsets, dtype='timedelta64[m]')
+
+
+class ColumnarBuilder (object):
+    """Accumulates result rows as columns and converts them to NumPy, pandas, or Arrow.
+
+    :param specs: iterable of ColumnSpec for the expected result columns, or None if unknown
+
+    The columns are those of the first batch of rows, in order, or the
+    specs if there are no rows. Rows are copied into the columns by
+    extend(), which may be called once per page of results.
+    """
+    def __init__(self, specs=None):
+        self.specs = OrderedDict((spec.name, spec) for spec in specs or [])
+        self.columns = None
+        self.nrows = 0
+
+    def extend(self, rows):
+        """Append a list of row dictionaries to the columns."""
+        if self.columns is None:
+            names = list(rows[0].keys()) if rows else list(self.specs)
+            if not names:
+                return
+            self.columns = OrderedDict((name, []) for name in names)
+        for name, values in self.columns.items():
+            values.extend([row.get(name) for row in rows])
+        self.nrows += len(rows)
+
+    def _items(self):
+        """Yield (spec, values) for each column."""
+        for name, values in (self.columns or OrderedDict((name, []) for name in self.specs)).items():
+            yield self.specs.get(name) or ColumnSpec(name, None, False), values
+
+    @staticmethod
+    def _numpy_column(spec, values):
+        np = _import_numpy()
+        typename = None if spec.is_array else spec.typename
+        if typename in _int_types:
+            if any(v is None for v in values):
+                return np.array(values, dtype='float64')
+            return np.array(values, dtype=_int_types[typename])
+        elif typename in _float_types:
+            return np.array(values, dtype=_float_types[typename])
+        elif typename == 'boolean' and not any(v is None for v in values):
+            return np.array(values, dtype='bool')
+        elif typename == 'date':
+            return np.array(values, dtype='datetime64[D]')
+        elif typename == 'timestamp':
+            return np.array(values, dtype='datetime64[us]')
+        elif typename == 'timestamptz':
+            return _timestamptz_array(values)
+        column = np.empty(len(values), dtype=object)
+        column[:] = values
+        return column
+
+    def to_numpy(self):
+        """Return an ordered dictionary mapping column names to NumPy arrays."""
+        return OrderedDict((spec.name, self._numpy_column(spec, values)) for spec, values in self._items())
+
+    def to_pandas(self):
+        """Return a pandas DataFrame of the columns."""
+        pd = _import_pandas()
+        columns = OrderedDict()
+        for spec, values in self._items():
+            typename = None if spec.is_array else spec.typename
+            if typename in _int_types:
+                columns[spec.name] = pd.array(values, dtype=_int_types[typename].capitalize())
+            elif typename == 'boolean':
+                columns[spec.name] = pd.array(values, dtype='boolean')
+            elif typename == 'timestamptz':
+                columns[spec.name] = pd.Series(self._numpy_column(spec, values)).dt.tz_localize('UTC')
+            elif typename in _float_types or typename in _temporal_types:
+                columns[spec.name] = self._numpy_column(spec, values)
+            elif typename is None and not spec.is_array:
+                columns[spec.name] = pd.Series(values)
+            else:
+                columns[spec.name] = pd.Series(self._numpy_column(spec, values), dtype=object)
+        return pd.DataFrame(columns, index=pd.RangeIndex(self.nrows))
+
+    @staticmethod
+    def _arrow_type(typename):
+        pa = _import_pyarrow()
+        if typename in _int_types or typename in _float_types:
+            return pa.type_for_alias(_int_types.get(typename) or _float_types[typename])
+        return {
+            'boolean': pa.bool_(),
+            'date': pa.date32(),
+            'timestamp': pa.timestamp('us'),
+            'timestamptz': pa.timestamp('us', tz='UTC'),
+        }.get(typename, pa.string())
+
+    @classmethod
+    def arrow_schema(cls, specs):
+        """Return the pyarrow.Schema of columns with the given ColumnSpecs, or None if any type is unknown."""
+        pa = _import_pyarrow()
+        fields = []
+        for spec in specs:
+            if spec.typename is None:
+                return None
+            arrow_type = cls._arrow_type(spec.typename)
+            fields.append(pa.field(spec.name, pa.list_(arrow_type) if spec.is_array else arrow_type))
+        return pa.schema(fields)
+
+    @classmethod
+    def _arrow_column(cls, spec, values):
+        pa = _import_pyarrow()
+        if spec.typename is None:
+            return pa.array(values)
+        if spec.typename in _json_types:
+            return pa.array([None if v is None else json_dumps(v) for v in values], type=pa.string())
+        arrow_type = cls._arrow_type(spec.typename)
+        if spec.typename in _temporal_types:
+            # temporal values arrive as ISO strings, which Arrow parses natively
+            if spec.is_array:
+                return pa.array(values, type=pa.list_(pa.string())).cast(pa.list_(arrow_type))
+            return pa.array(values, type=pa.string()).cast(arrow_type)
+        return pa.array(values, type=pa.list_(arrow_type) if spec.is_array else arrow_type)
+
+    def to_arrow(self):
+        """Return a pyarrow.Table of the columns."""
+        pa = _import_pyarrow()
+        names, arrays = [], []
+        for spec, values in self._items():
+            names.append(spec.name)
+            arrays.append(self._arrow_column(spec, values))
+        return pa.Table.from_arrays(arrays, names=names)
+
+
+def read_json_stream_arrow(data, specs):
+    """Return a pyarrow.Table parsed natively from a JSON-stream (newline-delimited JSON) document of result rows.
+
+    :param data: the bytes of the document
+    :param specs: list of ColumnSpec for every result column, none of unknown or JSON type
+
+    Temporal columns are parsed as strings and then cast, since Arrow's
+    JSON reader does not accept timezone offsets.
+    """
+    pa = _import_pyarrow()
+    pa_json = _import("pyarrow.json", "pyarrow")
+    schema = ColumnarBuilder.arrow_schema(specs)
+    if not data.strip():
+        return schema.empty_table()
+    read_schema = pa.schema([
+        pa.field(spec.name, pa.list_(pa.string()) if spec.is_array else pa.string())
+        if spec.typename in _temporal_types else schema.field(spec.name)
+        for spec in specs
+    ])
+    table = pa_json.read_json(
+        pa.BufferReader(data),
+        parse_options=pa_json.ParseOptions(explicit_schema=read_schema, unexpected_field_behavior='error'),
+    )
+    return table.select([spec.name for spec in specs]).cast(schema)
@@ -1,6 +1,8 @@
 """Definitions and implementations for data-path expressions to query and manipulate (insert, update, delete)."""
 
-from . import urlquote
+from . import urlquote, stob
+from collections import deque
+import concurrent.futures
 import copy
 from datetime import date
 import itertools
@@ -10,8 +12,11 @@ import re
 from requests import HTTPError
 import warnings
 from . import DEFAULT_HEADERS, ermrest_model as _erm
+from .utils.json_utils import json_dumpb, json_loads, response_json
+from .utils.paging_utils import as_page_size_controller
+from .columnar import ColumnSpec, ColumnarBuilder, read_json_stream_arrow
 
-__all__ = ['DataPathException', 'Min', 'Max', 'Sum', 'Avg', 'Cnt', 'CntD', 'Array', 'ArrayD', 'Bin', 'All', 'Any',
+__all__ = ['DataPathException', 'DataPathBatchException', 'Min', 'Max', 'Sum', 'Avg', 'Cnt', 'CntD', 'Array', 'ArrayD', 'Bin', 'All', 'Any',
            'simple_denormalization', 'simple_denormalization_with_whole_entities']
 
 logger = logging.getLogger(__name__)
@@ -20,6 +25,9 @@ logger = logging.getLogger(__name__)
 _system_defaults = {'RID', 'RCT', 'RCB', 'RMT', 'RMB'}
 """Set of system default column names"""
 
+DEFAULT_ITER_PAGE_SIZE = 10000
+"""Default number of rows per page fetched by _ResultSet.iter()"""
+
 
 def deprecated(f):
     """A simple 'deprecated' function decorator."""
@@ -131,6 +139,28 @@ class DataPathException (Exception):
         return self.message
 
 
+class DataPathBatchException (DataPathException):
+    """Exception for a batched data manipulation in which some batches failed.
+
+    The `results` are the result rows of the batches which succeeded, in input order. The `errors` are a list of
+    `(start, stop, exception)` tuples, where `start` and `stop` are the positions in the consumed input of the
+    entities of a failed batch. Since the input may have been a generator, the `bodies` are kept as well: the encoded
+    JSON array of entities of each failed batch, in the same order as `errors`.
+    """
+    def __init__(self, results, errors, bodies=()):
+        super(DataPathBatchException, self).__init__(
+            '%d batches failed, first error for entities[%d:%d]: %s' % (len(errors), errors[0][0], errors[0][1], errors[0][2]),
+            errors[0][2]
+        )
+        self.results = results
+        self.errors = errors
+        self.bodies = list(bodies)
+
+    def failed_entities(self):
+        """Returns the list of entities of the failed batches, decoded from their `bodies`, in input order."""
+        return [entity for body in self.bodies for entity in json_loads(body)]
+
+
 class _CatalogWrapper (object):
     """Wraps a Catalog for datapath expressions.
     """
@@ -432,26 +462,16 @@ class DataPath (object):
             # if 'on' not given, default to the 'right' table
             on = right
         elif isinstance(on, _erm.ForeignKey):
-            catalog = self._root._schema._catalog
             fk = on
             # determine 'direction' -- inbound or outbound
             path_context_table = self.context._base_table._wrapped_table
             if (path_context_table.schema.name, path_context_table.name) == (fk.table.schema.name, fk.table.name):
-                fkcols = zip(fk.foreign_key_columns, fk.referenced_columns)
+                outbound = True
             elif (path_context_table.schema.name, path_context_table.name) == (fk.pk_table.schema.name, fk.pk_table.name):
-                fkcols = zip(fk.referenced_columns, fk.foreign_key_columns)
+                outbound = False
             else:
                 raise ValueError('"%s" is not an inbound or outbound foreign key for the path\'s context, table "%s"' % (fk.constraint_name, path_context_table.name))
-
-            # compose join condition
-            on = None
-            for lcol, rcol in fkcols:
-                lcol = catalog.schemas[lcol.table.schema.name].tables[lcol.table.name].columns[lcol.name]
-                rcol = catalog.schemas[rcol.table.schema.name].tables[rcol.table.name].columns[rcol.name]
-                if on:
-                    on = on & (lcol == rcol)
-                else:
-                    on = lcol == rcol
+            on = self._fkey_join_condition(fk, outbound)
 
         # Extend path expression
         self._path_expression = _Link(self._path_expression, on, right, join_type)
@@ -461,6 +481,87 @@ class DataPath (object):
 
         return self
 
+    def _fkey_join_condition(self, fk, outbound):
+        """Returns the join condition of a foreign key traversed outbound or inbound from the path's context.
+
+        :param fk: an `ermrest_model.ForeignKey` object
+        :param outbound: True to join from the referring table, False to join from the referenced table
+        :return: a comparison or conjunction of comparisons
+        """
+        catalog = self._root._schema._catalog
+        if outbound:
+            fkcols = zip(fk.foreign_key_columns, fk.referenced_columns)
+        else:
+            fkcols = zip(fk.referenced_columns, fk.foreign_key_columns)
+
+        # compose join condition
+        on = None
+        for lcol, rcol in fkcols:
+            lcol = catalog.schemas[lcol.table.schema.name].tables[lcol.table.name].columns[lcol.name]
+            rcol = catalog.schemas[rcol.table.schema.name].tables[rcol.table.name].columns[rcol.name]
+            if on:
+                on = on & (lcol == rcol)
+            else:
+                on = lcol == rcol
+        return on
+
+    def link_to(self, right, join_path=None, join_type='', max_hops=None):
+        """Links this path with another table through a join path planned from the catalog model.
+
+        Unlike `link`, the tables need not be directly related. The shortest chain of foreign key joins from the
+        path's context to the `right` table is found with the model's `ermrest_model.SchemaGraph`, and a table
+        instance is linked for each intermediate table.
+
+        ```
+        # let A reference B, and C reference B, in the catalog
+        path = A.path.link_to(C)  # same as A.path.link(B).link(C)
+        ```
+
+        If more than one shortest join path exists, the link is ambiguous. Choose one of the paths from
+        `graph.shortest_paths(...)` and pass it as `join_path`.
+
+        ```
+        graph = catalog._wrapped_model.schema_graph()
+        paths = graph.shortest_paths(A._wrapped_table, C._wrapped_table, k=3)
+        path = A.path.link_to(C, join_path=paths[1])
+        ```
+
+        :param right: the right hand table of the link expression, as for `link`.
+        :param join_path: a list of `ermrest_model.JoinEdge` objects to follow, or None (default) to plan the path.
+        :param join_type: the join type of every link in the path, as for `link`.
+        :param max_hops: maximum number of links in a planned path, or None (default) for no limit.
+        :return: self
+        """
+        if not isinstance(right, _TableWrapper):
+            raise TypeError("'right' must be a '_TableWrapper' instance")
+        if right._schema._catalog != self._root._schema._catalog:
+            raise ValueError("'right' is from a different catalog. Cannot link across catalogs.")
+        catalog = self._root._schema._catalog
+        source = self.context._base_table._wrapped_table
+        target = right._base_table._wrapped_table if isinstance(right, _TableAlias) else right._wrapped_table
+
+        if join_path is None:
+            paths = catalog._wrapped_model.schema_graph().shortest_paths(source, target, k=2, max_hops=max_hops)
+            if not paths:
+                raise DataPathException('No join path from table "%s" to table "%s"' % (source.name, target.name))
+            if len(paths) > 1 and len(paths[1]) == len(paths[0]):
+                raise DataPathException('Ambiguous join paths from table "%s" to table "%s"; specify join_path' % (source.name, target.name))
+            join_path = paths[0]
+        if not join_path:
+            raise ValueError("'right' must not be the table of the path's context")
+        if join_path[0].source is not source or join_path[-1].target is not target:
+            raise ValueError("'join_path' must lead from the path's context to the 'right' table")
+
+        for i, edge in enumerate(join_path):
+            table = edge.target
+            if i < len(join_path) - 1:
+                table = catalog.schemas[table.schema.name].tables[table.name]
+            else:
+                table = right
+            self.link(table, on=self._fkey_join_condition(edge.fkey, edge.outbound), join_type=join_type)
+
+        return self
+
     def entities(self):
         """Returns a results set of whole entities from this data path's current context.
 
@@ -554,19 +655,16 @@ class DataPath (object):
         if context:
             expression = _ResetContext(expression, context)
         if mode != _Project.ENTITY:
-            expression = _Project(expression, mode, projection, group_key)
-        base_path = str(expression)
+            base_path = str(_Project(expression, mode, projection, group_key))
+        else:
+            base_path = str(expression)
 
-        def fetcher(limit=None, sort=None, headers=DEFAULT_HEADERS):
-            assert limit is None or isinstance(limit, int)
-            assert sort is None or hasattr(sort, '__iter__')
-            limiting = '?limit=%d' % limit if limit else ''
-            sorting = '@sort(' + ','.join([col._uname for col in sort]) + ')' if sort else ''
-            path = base_path + sorting + limiting
+        def get(path, headers, raw=False):
             logger.debug("Fetching " + path)
             try:
-                resp = catalog.get(path, headers=headers)
-                return resp.json()
+                # results are retained by the result set or the caller, so skip the binding's response cache
+                resp = catalog.get(path, headers=headers, cache=False)
+                return resp.content if raw else response_json(resp)
             except HTTPError as e:
                 logger.debug(e.response.text)
                 if 400 <= e.response.status_code < 500:
@@ -574,7 +672,77 @@ class DataPath (object):
                 else:
                     raise e
 
-        return _ResultSet(self._base_uri + base_path, fetcher)
+        def fetcher(limit=None, sort=None, headers=DEFAULT_HEADERS, raw=False):
+            assert limit is None or isinstance(limit, int)
+            assert sort is None or hasattr(sort, '__iter__')
+            limiting = '?limit=%d' % limit if limit else ''
+            sorting = '@sort(' + ','.join([col._uname for col in sort]) + ')' if sort else ''
+            return get(base_path + sorting + limiting, headers, raw)
+
+        page_path, page_key, hidden = self._paging_projection(expression, mode, projection, group_key, context or self._context)
+
+        def pager(limit, sort, after, headers=DEFAULT_HEADERS):
+            assert isinstance(limit, int) and sort
+            paging = '@after(' + ','.join(after) + ')' if after else ''
+            return get(page_path + '@sort(' + ','.join(sort) + ')' + paging + '?limit=%d' % limit, headers)
+
+        columns = self._result_columns(mode, projection, group_key, context or self._context)
+        return _ResultSet(self._base_uri + base_path, fetcher, pager if page_key else None, page_key, hidden, columns)
+
+    @staticmethod
+    def _result_columns(mode, projection, group_key, context):
+        """Returns the list of `ColumnSpec` of the output columns of a query, as found in the catalog model.
+
+        :param mode: a valid mode in Project.MODES
+        :param projection: a projection list.
+        :param group_key: a group key list (only for attributegroup queries).
+        :param context: the table instance which is the context of the query.
+        :return: list of ColumnSpec objects
+        """
+        if mode == _Project.ENTITY:
+            return [ColumnSpec.fromtype(col.name, col.type) for col in context._wrapped_table.columns]
+        specs = []
+        for obj in list(group_key) + list(projection):
+            if isinstance(obj, _TableWrapper):
+                specs.extend(ColumnSpec.fromtype(col.name, col.type) for col in obj._wrapped_table.columns)
+            elif isinstance(obj, _AggregateFunctionAlias):
+                specs.append(obj._fn._result_spec(obj._name))
+            else:
+                specs.append(ColumnSpec.fromtype(obj._name, _column_type(obj)))
+        return specs
+
+    @staticmethod
+    def _paging_projection(expression, mode, projection, group_key, context):
+        """Returns the path, unique output key, and hidden output columns for keyset pagination of a query.
+
+        Entities are keyed by RID and attribute groups by their group key. Attribute queries are keyed by the RID of
+        the context table, which is projected under a hidden output name if it is not already projected.
+
+        :param expression: the path expression of the query, without projection.
+        :param mode: a valid mode in Project.MODES
+        :param projection: a projection list.
+        :param group_key: a group key list (only for attributegroup queries).
+        :param context: the table instance which is the context of the query.
+        :return: (path, key, hidden) where key is a list of output column names, or None if the query cannot be paged
+        """
+        if mode == _Project.ATTRGROUP:
+            return str(_Project(expression, mode, projection, group_key)), [k._name for k in group_key], []
+        if mode == _Project.AGGREGATE or 'RID' not in context.column_definitions:
+            return None, None, []
+        if mode == _Project.ENTITY:
+            return str(expression), ['RID'], []
+        rid = context.column_definitions['RID']
+        outputs = set()
+        for obj in projection:
+            if isinstance(obj, _ColumnWrapper) and obj._instancename in ('RID', rid._instancename):
+                return str(_Project(expression, mode, projection)), [obj._name], []
+            elif isinstance(obj, _ColumnAlias) and obj._base_column._instancename in ('RID', rid._instancename):
+                return str(_Project(expression, mode, projection)), [obj._name], []
+            outputs.add(obj._name)
+        hidden = '_RID'
+        while hidden in outputs:
+            hidden = '_' + hidden
+        return str(_Project(expression, mode, projection + [rid.alias(hidden)])), [hidden], [hidden]
 
     def merge(self, path):
         """Merges the current path with the given path.
@@ -628,14 +796,25 @@ class _ResultSet (object):
     The result set is produced by a path. The results may be explicitly fetched. The result set behaves like a
     container. If the result set has not been fetched explicitly, on first use of container operations, it will
     be implicitly fetched from the catalog.
+
+    Alternatively, the results may be iterated lazily one page at a time with `iter`, without retaining them.
     """
-    def __init__(self, uri, fetcher_fn):
+    def __init__(self, uri, fetcher_fn, pager_fn=None, page_key=None, hidden=[], columns=None):
         """Initializes the _ResultSet.
         :param uri: the uri for the entity set in the catalog.
         :param fetcher_fn: a function that fetches the entities from the catalog.
+        :param pager_fn: a function that fetches one page of entities in keyset order from the catalog.
+        :param page_key: the output column names which uniquely identify a result row, for keyset pagination.
+        :param hidden: the output column names fetched by pager_fn only for keyset pagination.
+        :param columns: list of `ColumnSpec` of the output columns, or None if unknown.
         """
         assert fetcher_fn is not None
+        assert pager_fn is None or page_key
         self._fetcher_fn = fetcher_fn
+        self._pager_fn = pager_fn
+        self._page_key = page_key
+        self._hidden = hidden
+        self._columns = columns
         self._results_doc = None
         self._sort_keys = None
         self._limit = None
@@ -697,60 +876,197 @@ class _ResultSet (object):
         logger.debug("Fetched %d entities" % len(self._results_doc))
         return self
 
-def _json_size_approx(data):
-    """Return approximate byte count for minimal JSON encoding of data
+    def iter(self, page_size=DEFAULT_ITER_PAGE_SIZE, batches=False, headers=DEFAULT_HEADERS):
+        """Lazily iterates over the results, fetching them from the catalog one page at a time.
+
+        Pages are requested with `@sort(...)@after(...)` keyset pagination, ordered by the sort keys of this result
+        set, if any, and then by a key which is unique to each result: the RID of entities or of the context table of
+        attributes, or the group key of attribute groups. Only the current page is held in memory and no results are
+        retained by this result set. A limit set on this result set applies to the whole iteration.
+
+        ```
+        for row in my_path.entities().iter(page_size=10000):
+            process(row)
+        ```
+
+        Aggregate results, and results of tables without a RID column, are fetched as a single page.
+
+        :param page_size: rows per page, or a `PageSizeController` to adapt the page size to observed page latency.
+        :param batches: if True, yield each page as a list of rows instead of yielding individual rows.
+        :param headers: headers to send in requests to server
+        :return: a generator of rows, or of lists of rows if batches is True
+        """
+        if self._pager_fn is None:
+            pages = iter([self._fetcher_fn(self._limit, self._sort_keys, headers)])
+        else:
+            pages = self._iter_pages(as_page_size_controller(page_size), headers)
+        if batches:
+            return pages
+        return itertools.chain.from_iterable(pages)
+
+    def _iter_pages(self, page_size, headers):
+        """Generates the pages of results in keyset order, adapting the size of each page with page_size."""
+        sort_terms = [attr._uname for attr in self._sort_keys or []]
+        sort_names = [attr._attr._name if isinstance(attr, _SortDescending) else attr._name for attr in self._sort_keys or []]
+        for name in self._page_key:
+            if name not in sort_names:
+                sort_terms.append(urlquote(name))
+                sort_names.append(name)
+        after = None
+        remaining = self._limit
+        while remaining is None or remaining > 0:
+            size = page_size.size if remaining is None else min(page_size.size, remaining)
+            page_start = time.perf_counter()
+            try:
+                rows = self._pager_fn(size, sort_terms, after, headers)
+            except DataPathException as e:
+                response = getattr(e.reason, 'response', None)
+                if response is None or response.status_code != 400 or "Query run time limit exceeded" not in response.text:
+                    raise
+                try:
+                    reduced = page_size.failure(size)
+                except ValueError:
+                    raise e
+                logger.warning("Query run time exceeded while fetching a page of %d rows. The page size is being "
+                               "reduced to %d and the query will be retried." % (size, reduced))
+                continue
+            page_size.observe(len(rows), time.perf_counter() - page_start)
+            logger.debug("Fetched page of %d entities" % len(rows))
+            if not rows:
+                return
+            after = [_page_key_value(rows[-1].get(name)) for name in sort_names]
+            if self._hidden:
+                for row in rows:
+                    for name in self._hidden:
+                        row.pop(name, None)
+            yield rows
+            if len(rows) < size:
+                return
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def _columnar(self, page_size, headers):
+        """Returns a `ColumnarBuilder` of the results, fetching them unless they have already been fetched."""
+        builder = ColumnarBuilder(self._columns)
+        if self._results_doc is not None:
+            builder.extend(self._results_doc)
+        elif page_size:
+            for page in self.iter(page_size=page_size, batches=True, headers=headers):
+                builder.extend(page)
+        else:
+            builder.extend(self._fetcher_fn(self._limit, self._sort_keys, headers))
+        return builder
+
+    def to_numpy(self, page_size=None, headers=DEFAULT_HEADERS):
+        """Returns the results as a dictionary of NumPy arrays, one per column, typed by the catalog model.
+
+        Results which have already been fetched are converted without fetching them again. Otherwise they are fetched
+        and converted without being retained by this result set. See the `deriva.core.columnar` module for the mapping
+        of ERMrest types to NumPy dtypes. Requires the `numpy` package.
+
+        :param page_size: if given, fetch the results one page at a time as by `iter`, so that only the columns and
+        the current page are held in memory.
+        :param headers: headers to send in requests to server
+        :return: an ordered dictionary mapping column names to NumPy arrays.
+        """
+        return self._columnar(page_size, headers).to_numpy()
+
+    def to_pandas(self, page_size=None, headers=DEFAULT_HEADERS):
+        """Returns the results as a pandas DataFrame with column dtypes derived from the catalog model.
+
+        Integer and boolean columns use pandas nullable dtypes and timestamptz columns are timezone-aware (UTC). See
+        `to_numpy` for the other parameters. Requires the `pandas` package.
+
+        :return: a pandas DataFrame.
+        """
+        return self._columnar(page_size, headers).to_pandas()
+
+    def to_arrow(self, page_size=None, headers=DEFAULT_HEADERS):
+        """Returns the results as a pyarrow Table with a schema derived from the catalog model.
+
+        When the results have not been fetched, `page_size` is not given, and every column has a known non-JSON type,
+        they are fetched in the JSON-stream format and parsed by Arrow's native JSON reader, without decoding rows as
+        Python objects. See `to_numpy` for the other parameters. Requires the `pyarrow` package.
+
+        :return: a pyarrow Table.
+        """
+        if self._results_doc is None and not page_size and self._columns \
+                and all(spec.typename is not None and spec.typename not in ('json', 'jsonb') for spec in self._columns):
+            headers = {k: v for k, v in headers.items() if k.lower() != 'accept'}
+            headers['Accept'] = 'application/x-json-stream'
+            data = self._fetcher_fn(self._limit, self._sort_keys, headers, raw=True)
+            return read_json_stream_arrow(data, self._columns)
+        return self._columnar(page_size, headers).to_arrow()
+
+
+def _column_type(obj):
+    """Returns the `ermrest_model.Type` of a column or column alias, or None for other objects."""
+    if isinstance(obj, _ColumnAlias):
+        obj = obj._base_column
+    if isinstance(obj, _ColumnWrapper):
+        return obj._wrapped_column.type
+    return None
+
+
+def _page_key_value(value):
+    """Returns the url-encoded form of a result value for use in an `@after(...)` page key."""
+    if value is None:
+        return '::null::'
+    elif isinstance(value, bool):
+        return 'true' if value else 'false'
+    return urlquote(str(value))
+
+
+def _canonical_key_value(value, spec):
+    """Returns a key value of an input entity or a returned row in a canonical form of its column's `ColumnSpec`.
 
-    Minimal encoding has no optional whitespace/indentation.
+    Values which do not convert to the column's type are returned as is, so that they never match a canonical value.
     """
-    nbytes = 0
-
-    if isinstance(data, (list, tuple)):
-        nbytes += 2
-        for elem in data:
-            nbytes += _json_size_approx(elem) + 1
-    elif isinstance(data, dict):
-        nbytes += 2
-        for k, v in data.items():
-            nbytes += _json_size_approx(k) + _json_size_approx(v) + 2
-    elif isinstance(data, str):
-        nbytes += len(data.encode("utf-8")) + 2
-    else:
-        nbytes += len(str(data))
+    if value is None:
+        return None
+    if spec.is_array:
+        if not isinstance(value, (list, tuple)):
+            return value
+        return tuple(_canonical_key_value(v, spec._replace(is_array=False)) for v in value)
+    try:
+        if spec.typename in {'int2', 'int4', 'int8', 'serial2', 'serial4', 'serial8'}:
+            return int(value)
+        elif spec.typename in {'float4', 'float8'}:
+            return float(value)
+        elif spec.typename == 'boolean':
+            return value if isinstance(value, bool) else stob(value)
+        return str(value)
+    except (TypeError, ValueError):
+        return value
 
-    return nbytes
 
 def _generate_batches(entities, max_batch_rows=1000, max_batch_bytes=250*1024):
-    """Generate a series of entity batches as slices of the input entities
+    """Generate a series of (nrows, body) batches of entities, where body is a JSON array of nrows entities
 
+    Each entity is serialized once, as it is consumed from the input
+    iterable. A batch is cut when it has max_batch_rows entities or
+    when the next entity would make its body exceed max_batch_bytes,
+    though each batch has at least one entity. A false max_batch_rows
+    disables batching, so that all entities are sent in one batch.
     """
-    if not isinstance(entities, (list, tuple)):
-        raise TypeError('invalid type %s for entities, list or tuple expected' % (type(entities),))
-
     if not max_batch_rows:
         logger.debug("disabling batching due to max_batch_rows=%r" % (max_batch_rows,))
-        return entities
-
-    top = len(entities)
-    lower = 0
+        max_batch_rows = max_batch_bytes = float('inf')
 
-    while lower < top:
-        # to ensure progress, always use at least one row per batch regardless of nbytes
-        upper = lower + 1
-        batch_nbytes = _json_size_approx(entities[lower])
+    rows, nbytes = [], 1
 
-        # advance upper position until a batch size limit is reached
-        while (upper - lower) < max_batch_rows:
-            if upper >= top:
-                break
-            batch_nbytes += _json_size_approx(entities[upper])
-            if batch_nbytes > max_batch_bytes:
-                break
-            upper += 1
+    for entity in entities:
+        row = json_dumpb(entity)
+        if rows and (len(rows) >= max_batch_rows or nbytes + len(row) + 1 > max_batch_bytes):
+            logger.debug("yielding batch of %d entities (%d bytes)" % (len(rows), nbytes))
+            yield len(rows), b'[' + b','.join(rows) + b']'
+            rows, nbytes = [], 1
+        rows.append(row)
+        nbytes += len(row) + 1
 
-        # generate one batch and advance for next batch
-        logger.debug("yielding batch of %d/%d entities (%d:%d)" % (upper-lower, top, lower, upper))
-        yield entities[lower:upper]
-        lower = upper
+    if rows:
+        logger.debug("yielding batch of %d entities (%d bytes)" % (len(rows), nbytes))
+        yield len(rows), b'[' + b','.join(rows) + b']'
 
 def _request_with_retry(request_func, retry_codes={408, 429, 500, 502, 503, 504}, backoff_factor=4, max_attempts=5):
     """Perform request func with exponential backoff and retry.
@@ -785,7 +1101,7 @@ def _request_with_retry(request_func, retry_codes={408, 429, 500, 502, 503, 504}
             if int(e.response.status_code) not in retry_codes:
                 raise last_ex
         except Exception as e:
-            logger.debug(e.response.text)
+            logger.debug(e)
             last_ex = e
 
     # early return means we don't get here on successful requests
@@ -794,6 +1110,70 @@ def _request_with_retry(request_func, retry_codes={408, 429, 500, 502, 503, 504}
         raise ValueError('exceeded max_attempts without catching a request exception')
     raise last_ex
 
+def _send_batches(send_func, batches, workers=1, fail_fast=True):
+    """Send batches of entities and return the concatenated results in input order.
+
+    :param send_func: A function sending one encoded batch body and returning its list of result rows
+    :param batches: An iterable of (nrows, body) batches as produced by _generate_batches
+    :param workers: Maximum number of batches sent concurrently
+    :param fail_fast: If True, raise the first error; otherwise, send every batch before raising DataPathBatchException
+
+    With fail_fast, batches not yet started are cancelled after the
+    first failure, but batches already sent may have been applied.
+    Concurrent sending keeps at most 2*workers batches pending.
+    """
+    results, errors, bodies = [], [], []
+    if workers <= 1:
+        start = 0
+        for nrows, body in batches:
+            try:
+                results.extend(send_func(body))
+            except Exception as e:
+                if fail_fast:
+                    raise
+                errors.append((start, start + nrows, e))
+                bodies.append(body)
+            start += nrows
+    else:
+        pending = deque()  # of (start, stop, body, future) in input order
+
+        def wait_and_collect():
+            concurrent.futures.wait(
+                [f for _, _, _, f in pending if not f.done()], return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if fail_fast:
+                for _, _, _, future in pending:
+                    if future.done() and future.exception() is not None:
+                        raise future.exception()
+            while pending and pending[0][3].done():
+                start, stop, body, future = pending.popleft()
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    if fail_fast:
+                        raise
+                    errors.append((start, stop, e))
+                    bodies.append(body)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                start = 0
+                for nrows, body in batches:
+                    if len(pending) >= 2 * workers:
+                        wait_and_collect()
+                    pending.append((start, start + nrows, body, pool.submit(send_func, body)))
+                    start += nrows
+                while pending:
+                    wait_and_collect()
+            finally:
+                for _, _, _, future in pending:
+                    future.cancel()
+
+    if errors:
+        raise DataPathBatchException(results, errors, bodies)
+    return results
+
+
 class _TableWrapper (object):
     """Wraps a Table for datapath expressions.
     """
@@ -890,6 +1270,10 @@ class _TableWrapper (object):
         """See the docs for this method in `DataPath` for more information."""
         return self._contextualized_path.link(right, on, join_type)
 
+    def link_to(self, right, join_path=None, join_type='', max_hops=None):
+        """See the docs for this method in `DataPath` for more information."""
+        return self._contextualized_path.link_to(right, join_path, join_type, max_hops)
+
     def _query(self, mode='entity', projection=[], group_key=[], context=None):
         """Invokes query on the path for this table."""
         return self.path._query(mode, projection, group_key=group_key, context=context)
@@ -934,10 +1318,10 @@ class _TableWrapper (object):
         """
         return self.path.denormalize(context_name=context_name, heuristic=heuristic, groupkey_name=groupkey_name)
 
-    def insert(self, entities, defaults=set(), nondefaults=set(), add_system_defaults=True, on_conflict_skip=False, retry_codes={408, 429, 500, 502, 503, 504}, backoff_factor=4, max_attempts=5, max_batch_rows=1000, max_batch_bytes=250*1024):
+    def insert(self, entities, defaults=set(), nondefaults=set(), add_system_defaults=True, on_conflict_skip=False, retry_codes={408, 429, 500, 502, 503, 504}, backoff_factor=4, max_attempts=5, max_batch_rows=1000, max_batch_bytes=250*1024, workers=1, fail_fast=True, keep_results=True):
         """Inserts entities into the table.
 
-        :param entities: an iterable collection of entities (i.e., rows) to be inserted into the table.
+        :param entities: an iterable of entities (i.e., rows), such as a list or a generator, to be inserted into the table.
         :param defaults: optional, set of column names to be assigned the default expression value.
         :param nondefaults: optional, set of columns names to override implicit system defaults
         :param add_system_defaults: flag to add system columns to the set of default columns.
@@ -946,7 +1330,10 @@ class _TableWrapper (object):
         :param backoff_factor: number of seconds for base of exponential retry backoff.
         :param max_attempts: maximum number of requests attempts with retry.
         :param max_batch_rows: maximum number of rows for one request, or False to disable batching.
-        :param max_batch_bytes: approximate maximum number of bytes for one request.
+        :param max_batch_bytes: maximum number of bytes for one request, unless a single entity is larger.
+        :param workers: maximum number of batch requests sent concurrently.
+        :param fail_fast: flag to raise the first error; otherwise, send every batch and then raise DataPathBatchException.
+        :param keep_results: flag to keep the rows returned by the catalog; otherwise, the returned collection is empty.
         :return a collection of newly created entities.
 
         Retry will only be attempted for idempotent insertion
@@ -959,6 +1346,17 @@ class _TableWrapper (object):
         backoff_factor**attempt_number seconds for attempts 0 through
         max_attempts-1.
 
+        With workers > 1, batches are sent concurrently and the
+        results are returned in input order. Each batch is retried
+        under the same rules as above. If a batch fails and fail_fast
+        is True, batches not yet sent are cancelled, but batches sent
+        concurrently may already have been inserted.
+
+        Entities are consumed from the iterable and serialized once, as
+        batches are sent. To insert more entities than fit in memory,
+        e.g., from a generator reading a JSON-stream file, pass a
+        generator and keep_results=False.
+
         """
         # empty entities will be accepted but results are therefore an empty entity set
         if not entities:
@@ -984,18 +1382,22 @@ class _TableWrapper (object):
             path += "?" + "&".join(options)
         logger.debug("Inserting entities to path: {path}".format(path=path))
 
-        # JSONEncoder does not handle general iterable objects, so we have to make sure its an acceptable collection
+        # entities are consumed lazily, so peek at the first entity of a possibly empty iterator
         if not hasattr(entities, '__iter__'):
             raise TypeError('entities is not iterable')
-        entities = entities if isinstance(entities, (list, tuple)) else list(entities)
+        entities = iter(entities)
+        first = next(entities, None)
+        if first is None:
+            return _ResultSet(self.path.uri, lambda ignore1, ignore2, ignore3: [])
+        entities = itertools.chain([first], entities)
 
         # test the first entity element to make sure that it looks like a dictionary
-        if not hasattr(entities[0], 'keys'):
+        if not hasattr(first, 'keys'):
             raise TypeError('entities[0] does not look like a dictionary -- does not have a "keys()" method')
 
         # perform one batch request in a helper we can hand to retry helper
-        def request_func(batch):
-            return self._schema._catalog._wrapped_catalog.post(path, json=batch, headers={'Content-Type': 'application/json'})
+        def request_func(body):
+            return self._schema._catalog._wrapped_catalog.post(path, data=body, headers={'Content-Type': 'application/json'})
 
         def _has_user_pkey(table):
             """Return True if table has at least one primary key other than the system RID key"""
@@ -1009,24 +1411,18 @@ class _TableWrapper (object):
         # determine whether insert is idempotent and therefore retry safe
         retry_safe = on_conflict_skip and _has_user_pkey(self._wrapped_table)
 
-        # perform all requests synchronously so the caller can get exceptions
-        results = []
-        for batch in _generate_batches(
-            entities,
-            max_batch_rows=max_batch_rows,
-            max_batch_bytes=max_batch_bytes
-        ):
+        def send_func(body):
             try:
                 if retry_safe:
                     resp = _request_with_retry(
-                        lambda: request_func(batch),
+                        lambda: request_func(body),
                         retry_codes=retry_codes,
                         backoff_factor=backoff_factor,
                         max_attempts=max_attempts
                     )
                 else:
-                    resp = request_func(batch)
-                results.extend(resp.json())
+                    resp = request_func(body)
+                return response_json(resp) if keep_results else []
             except HTTPError as e:
                 logger.debug(e.response.text)
                 if 400 <= e.response.status_code < 500:
@@ -1034,11 +1430,19 @@ class _TableWrapper (object):
                 else:
                     raise e
 
+        # perform all requests before returning so the caller can get exceptions
+        results = _send_batches(
+            send_func,
+            _generate_batches(entities, max_batch_rows=max_batch_rows, max_batch_bytes=max_batch_bytes),
+            workers=workers,
+            fail_fast=fail_fast
+        )
+
         result = _ResultSet(self.path.uri, lambda ignore1, ignore2, ignore3: results)
         return result
 
 
-    def update(self, entities, correlation={'RID'}, targets=None, retry_codes={408, 429, 500, 502, 503, 504}, backoff_factor=4, max_attempts=5, max_batch_rows=1000, max_batch_bytes=250*1024):
+    def update(self, entities, correlation={'RID'}, targets=None, retry_codes={408, 429, 500, 502, 503, 504}, backoff_factor=4, max_attempts=5, max_batch_rows=1000, max_batch_bytes=250*1024, workers=1, fail_fast=True, keep_results=True):
         """Update entities of a table.
 
         For more information see the ERMrest protocol for the `attributegroup` interface. By default, this method will
@@ -1046,7 +1450,7 @@ class _TableWrapper (object):
         column names found in the first row of the `entities` input, which are not found in the `correlation` set and
         not defined as 'system columns' by ERMrest, as the targets if `targets` is not set.
 
-        :param entities: an iterable collection of entities (i.e., rows) to be updated in the table.
+        :param entities: an iterable of entities (i.e., rows), such as a list or a generator, to be updated in the table.
         :param correlation: an iterable collection of column names used to correlate input set to the set of rows to be
         updated in the catalog. E.g., `{'col name'}` or `{mytable.mycolumn}` will work if you pass a _ColumnWrapper object.
         :param targets: an iterable collection of column names used as the targets of the update operation.
@@ -1054,25 +1458,34 @@ class _TableWrapper (object):
         :param backoff_factor: number of seconds for base of exponential retry backoff.
         :param max_attempts: maximum number of requests attempts with retry.
         :param max_batch_rows: maximum number of rows for one request, or False to disable batching.
-        :param max_batch_bytes: approximate maximum number of bytes for one request.
+        :param max_batch_bytes: maximum number of bytes for one request, unless a single entity is larger.
+        :param workers: maximum number of batch requests sent concurrently.
+        :param fail_fast: flag to raise the first error; otherwise, send every batch and then raise DataPathBatchException.
+        :param keep_results: flag to keep the rows returned by the catalog; otherwise, the returned collection is empty.
         :return a collection of newly created entities.
 
         When performing retries, an exponential backoff delay is
         introduced after each failed attempt. The delay is
         backoff_factor**attempt_number seconds for attempts 0 through
         max_attempts-1.
+
+        With workers > 1, batches are sent concurrently and the results are returned in input order.
         """
         # empty entities will be accepted but results are therefore an empty entity set
         if not entities:
             return _ResultSet(self.path.uri, lambda ignore1, ignore2, ignore3: [])
 
-        # JSONEncoder does not handle general iterable objects, so we have to make sure its an acceptable collection
+        # entities are consumed lazily, so peek at the first entity of a possibly empty iterator
         if not hasattr(entities, '__iter__'):
             raise TypeError('entities is not iterable')
-        entities = entities if isinstance(entities, (list, tuple)) else list(entities)
+        entities = iter(entities)
+        first = next(entities, None)
+        if first is None:
+            return _ResultSet(self.path.uri, lambda ignore1, ignore2, ignore3: [])
+        entities = itertools.chain([first], entities)
 
         # test the first entity element to make sure that it looks like a dictionary
-        if not hasattr(entities[0], 'keys'):
+        if not hasattr(first, 'keys'):
             raise TypeError('entities[0] does not look like a dictionary -- does not have a "keys()" method')
 
         # Form the correlation keys and the targets
@@ -1081,7 +1494,7 @@ class _TableWrapper (object):
             target_cnames = {urlquote(str(t)) for t in targets}
         else:
             exclusions = correlation_cnames | _system_defaults
-            target_cnames = {urlquote(str(t)) for t in entities[0].keys() if urlquote(str(t)) not in exclusions}
+            target_cnames = {urlquote(str(t)) for t in first.keys() if urlquote(str(t)) not in exclusions}
 
         # test if there are any targets after excluding for correlation keys and system columns
         if not target_cnames:
@@ -1096,24 +1509,18 @@ class _TableWrapper (object):
         )
 
         # perform one batch request in a helper we can hand to retry helper
-        def request_func(batch):
-            return self._schema._catalog._wrapped_catalog.put(path, json=batch, headers={'Content-Type': 'application/json'})
-
-        # perform all requests synchronously so the caller can get exceptions
-        results = []
-        for batch in _generate_batches(
-            entities,
-            max_batch_rows=max_batch_rows,
-            max_batch_bytes=max_batch_bytes
-        ):
+        def request_func(body):
+            return self._schema._catalog._wrapped_catalog.put(path, data=body, headers={'Content-Type': 'application/json'})
+
+        def send_func(body):
             try:
                 resp = _request_with_retry(
-                    lambda: request_func(batch),
+                    lambda: request_func(body),
                     retry_codes=retry_codes,
                     backoff_factor=backoff_factor,
                     max_attempts=max_attempts
                 )
-                results.extend(resp.json())
+                return response_json(resp) if keep_results else []
             except HTTPError as e:
                 logger.debug(e.response.text)
                 if 400 <= e.response.status_code < 500:
@@ -1121,9 +1528,114 @@ class _TableWrapper (object):
                 else:
                     raise e
 
+        # perform all requests before returning so the caller can get exceptions
+        results = _send_batches(
+            send_func,
+            _generate_batches(entities, max_batch_rows=max_batch_rows, max_batch_bytes=max_batch_bytes),
+            workers=workers,
+            fail_fast=fail_fast
+        )
+
         result = _ResultSet(self.path.uri, lambda ignore1, ignore2, ignore3: results)
         return result
 
+    def upsert(self, entities, key=None, targets=None, defaults=set(), nondefaults=set(), add_system_defaults=True, retry_codes={408, 429, 500, 502, 503, 504}, backoff_factor=4, max_attempts=5, max_batch_rows=1000, max_batch_bytes=250*1024, workers=1, fail_fast=True, keep_results=True):
+        """Inserts entities into the table, and updates the existing rows for entities whose key values already exist.
+
+        The entities are first inserted in batches with on-conflict skip. The entities whose key values are not among
+        the rows created are then updated in batches through the `attributegroup` interface, correlated on the key.
+
+        :param entities: an iterable of entities (i.e., rows) to be inserted or updated in the table.
+        :param key: an iterable collection of the column names of a key of the table used to correlate entities with
+        existing rows. By default, the first key of the table whose columns are all in the first entity and none of
+        them assigned default values.
+        :param targets: an iterable collection of column names to be updated in existing rows. By default, the columns
+        in the first entity except the key, the defaults and the system columns.
+        :param defaults: optional, set of column names to be assigned the default expression value on insert.
+        :param nondefaults: optional, set of columns names to override implicit system defaults on insert.
+        :param add_system_defaults: flag to add system columns to the set of default columns on insert.
+        :param retry_codes: set of HTTP status codes for which retry should be considered.
+        :param backoff_factor: number of seconds for base of exponential retry backoff.
+        :param max_attempts: maximum number of requests attempts with retry.
+        :param max_batch_rows: maximum number of rows for one request, or False to disable batching.
+        :param max_batch_bytes: maximum number of bytes for one request, unless a single entity is larger.
+        :param workers: maximum number of batch requests sent concurrently.
+        :param fail_fast: flag to raise the first error; otherwise, send every batch and then raise DataPathBatchException.
+        :param keep_results: flag to keep the rows returned by the catalog; otherwise, the returned collection is empty.
+        :return a collection of the newly created entities, followed by the updated rows (with key and target columns).
+
+        All of the entities are held in memory, as a list, for the
+        duration of the upsert, since those skipped on insert are sent
+        again for the update; split very large inputs into several calls.
+
+        Insertion is retried as by `insert` with on_conflict_skip=True,
+        and update as by `update`. If insertion fails, no rows are
+        updated. Entities skipped on insert because they conflict on
+        another key of the table, and which match no existing row by
+        key, are neither inserted nor updated.
+        """
+        if not hasattr(entities, '__iter__'):
+            raise TypeError('entities is not iterable')
+        entities = entities if isinstance(entities, (list, tuple)) else list(entities)
+        if not entities:
+            return _ResultSet(self.path.uri, lambda ignore1, ignore2, ignore3: [])
+
+        # test the first entity element to make sure that it looks like a dictionary
+        if not hasattr(entities[0], 'keys'):
+            raise TypeError('entities[0] does not look like a dictionary -- does not have a "keys()" method')
+
+        # a key assigned defaults on insert would never conflict with existing rows
+        inserted_defaults = {str(c) for c in defaults}
+        if add_system_defaults:
+            inserted_defaults |= _system_defaults - {str(c) for c in nondefaults}
+        if key is None:
+            for candidate in self._wrapped_table.keys:
+                cnames = [c.name for c in candidate.unique_columns]
+                if all(cname in entities[0] and cname not in inserted_defaults for cname in cnames):
+                    key = cnames
+                    break
+            else:
+                raise ValueError('No key of table %s has all of its columns in entities[0] without defaults; specify '
+                                 'the "key" for the upsert.' % self._name)
+        else:
+            key = [str(c) for c in key]
+            if self._wrapped_table.key_by_columns(key, raise_nomatch=False) is None:
+                raise ValueError('Columns %s are not a key of table %s.' % (key, self._name))
+            if inserted_defaults.intersection(key):
+                raise ValueError('Key columns %s cannot be assigned defaults for the upsert.' % key)
+
+        if targets is None:
+            exclusions = set(key) | inserted_defaults | _system_defaults
+            targets = [cname for cname in entities[0].keys() if cname not in exclusions]
+
+        retry_options = dict(retry_codes=retry_codes, backoff_factor=backoff_factor, max_attempts=max_attempts)
+        batch_options = dict(max_batch_rows=max_batch_rows, max_batch_bytes=max_batch_bytes, workers=workers, fail_fast=fail_fast)
+
+        inserted = self.insert(
+            entities, defaults=defaults, nondefaults=nondefaults, add_system_defaults=add_system_defaults,
+            on_conflict_skip=True, keep_results=True, **retry_options, **batch_options
+        )
+
+        # entities not created by the insert were skipped for their existing key values, compared in canonical form
+        # since the catalog returns the values of the column types (e.g., an int8 sent as a string is returned as int)
+        key_specs = [ColumnSpec.fromtype(cname, self._wrapped_table.columns[cname].type) for cname in key]
+
+        def key_values(row):
+            return tuple(_canonical_key_value(row.get(spec.name), spec) for spec in key_specs)
+
+        created = {key_values(row) for row in inserted}
+        skipped = [entity for entity in entities if key_values(entity) not in created]
+        logger.debug("Inserted %d entities, updating %d skipped entities" % (len(created), len(skipped)))
+
+        if skipped and targets:
+            updated = self.update(skipped, correlation=key, targets=targets, keep_results=keep_results,
+                                  **retry_options, **batch_options)
+        else:
+            updated = []
+
+        results = list(inserted) + list(updated) if keep_results else []
+        return _ResultSet(self.path.uri, lambda ignore1, ignore2, ignore3: results)
+
     def delete(self):
         """Deletes the entity set referenced by the Table.
         """
@@ -1882,6 +2394,10 @@ class AggregateFunction (object):
         """Returns an (output) alias for this aggregate function instance."""
         return _AggregateFunctionAlias(self, alias_name)
 
+    def _result_spec(self, name):
+        """Returns the `ColumnSpec` of the output column of this function named 'name'."""
+        return ColumnSpec.fromtype(name, _column_type(self._arg))
+
 
 class Min (AggregateFunction):
     """Aggregate function for minimum non-NULL value."""
@@ -1900,36 +2416,61 @@ class Sum (AggregateFunction):
     def __init__(self, arg):
         super(Sum, self).__init__('sum', arg)
 
+    def _result_spec(self, name):
+        spec = super(Sum, self)._result_spec(name)
+        if spec.typename in {'int2', 'int4', 'int8', 'serial2', 'serial4', 'serial8'} and not spec.is_array:
+            return ColumnSpec(name, 'int8', False)
+        elif spec.typename in {'float4', 'float8'} and not spec.is_array:
+            return ColumnSpec(name, 'float8', False)
+        return spec
+
 
 class Avg (AggregateFunction):
     """Aggregate function for average of non-NULL values."""
     def __init__(self, arg):
         super(Avg, self).__init__('avg', arg)
 
+    def _result_spec(self, name):
+        return ColumnSpec(name, 'float8', False)
+
 
 class Cnt (AggregateFunction):
     """Aggregate function for count of non-NULL values."""
     def __init__(self, arg):
         super(Cnt, self).__init__('cnt', arg)
 
+    def _result_spec(self, name):
+        return ColumnSpec(name, 'int8', False)
+
 
 class CntD (AggregateFunction):
     """Aggregate function for count of distinct non-NULL values."""
     def __init__(self, arg):
         super(CntD, self).__init__('cnt_d', arg)
 
+    def _result_spec(self, name):
+        return ColumnSpec(name, 'int8', False)
+
 
 class Array (AggregateFunction):
     """Aggregate function for an array containing all values (including NULL)."""
     def __init__(self, arg):
         super(Array, self).__init__('array', arg)
 
+    def _result_spec(self, name):
+        spec = super(Array, self)._result_spec(name)
+        return ColumnSpec(name, None if spec.is_array else spec.typename, True)
+
 
 class ArrayD (AggregateFunction):
     """Aggregate function for an array containing distinct values (including NULL)."""
     def __init__(self, arg):
         super(ArrayD, self).__init__('array_d', arg)
 
+    def _result_spec(self, name):
+        spec = super(ArrayD, self)._result_spec(name)
+        return ColumnSpec(name, None if spec.is_array else spec.typename, True)
+
 
 class Bin (AggregateFunction):
     """Binning function."""
@@ -1954,6 +2495,9 @@ class Bin (AggregateFunction):
     def __str__(self):
         return "%s(%s;%s;%s;%s)" % (self._fn_name, self._arg, self.nbins, self.minval, self.maxval)
 
+    def _result_spec(self, name):
+        return ColumnSpec(name, None, False)
+
     @property
     def _instancename(self):
         return "%s(%s;%s;%s;%s)" % (self._fn_name, self._arg._instancename, self.nbins, self.minval, self.maxval)
@@ -5,7 +5,11 @@ import os
 import json
 import requests
 from multiprocessing import Queue
-from . import get_new_requests_session, urlquote_dcctx, ConcurrentUpdate, NotModified, DEFAULT_HEADERS, DEFAULT_SESSION_CONFIG
+from . import get_new_requests_session, get_shared_requests_session, SingleFlight, urlquote_dcctx, ConcurrentUpdate, NotModified, DEFAULT_HEADERS, DEFAULT_SESSION_CONFIG, \
+    DEFAULT_COMPRESSION_MIN_SIZE
+from .response_cache import ResponseCache
+from .utils.compress_utils import compress, is_compressible
+from .utils.json_utils import json_dumpb
 
 
 class DerivaClientContext (dict):
@@ -109,6 +113,9 @@ def _response_raise_for_status(self):
 class DerivaBinding (object):
     """This is a base-class for implementation purposes. Not useful for clients."""
 
+    # whether the service accepts Content-Encoding on request bodies, see _encode_body()
+    _compress_requests = False
+
     def __init__(self, scheme, server, credentials=None, caching=True, session_config=None):
         """Create HTTP(S) server binding.
 
@@ -116,7 +123,46 @@ class DerivaBinding (object):
              scheme: 'http' or 'https'
              server: server FQDN string
              credentials: credential secrets, e.g. cookie
-             caching: whether to retain a GET response cache
+             caching: whether to retain a GET response cache, or a
+               ResponseCache instance to use as that cache
+
+           Sessions: when session_config enables "shared_sessions",
+           the binding uses a process-wide requests session shared by
+           all bindings for the same server, credentials, and session
+           configuration, so that they reuse one warm connection pool.
+           Pool sizes follow the "pool_connections", "pool_maxsize",
+           and "pool_block" session_config values in either mode.
+
+           Response caching: when caching is True, a private bounded
+           ResponseCache with default limits is used. Pass a configured
+           ResponseCache instance to customize eviction limits or to
+           share one cache among several bindings. Pass a
+           DiskResponseCache instance to persist cached responses so
+           that conditional GET revalidation survives across
+           processes. Cache counters are available via
+           self.cache_stats().
+
+           Single-flight requests: when session_config enables
+           "single_flight", concurrent head() or get() calls from
+           several threads for the same URL with the same headers
+           share one in-flight request and its response object, rather
+           than each sending its own. Streaming GETs are never shared.
+
+           Compression: response bodies are decoded transparently
+           for every encoding listed in the Accept-Encoding header,
+           which may be overridden with the "accept_encoding"
+           session_config value. For services which support it,
+           setting the "request_compression" session_config value to
+           "gzip" or "zstd" compresses JSON and CSV request bodies of
+           at least "request_compression_min_size" bytes.
+
+           Instrumentation: every request sent through the binding's
+           session is reported as a RequestEvent to the observers
+           registered with self.add_request_observer(), as well as to
+           the process-wide observers registered with
+           deriva.core.add_request_observer(). With shared sessions,
+           observers are attached to the shared session and so also
+           see requests made by other bindings sharing it.
 
            Deriva Client Context: You MAY mutate self.dcctx to
            customize the context for this service endpoint prior to
@@ -142,11 +188,18 @@ class DerivaBinding (object):
         self._auth_uri = self._base_server_uri + "/authn/session"
 
         self._session = None
+        self._session_shared = False
+        self._request_observers = []
         self.session_config = DEFAULT_SESSION_CONFIG if not session_config else session_config
         self._get_new_session(self.session_config)
+        self._single_flight = SingleFlight() if self.session_config.get("single_flight", False) else None
 
-        self._caching = caching
-        self._cache = {}
+        # a ResponseCache instance enables caching even when empty, i.e. when len(caching) == 0
+        self._caching = caching is not None and caching is not False
+        if isinstance(caching, ResponseCache):
+            self._cache = caching
+        else:
+            self._cache = ResponseCache()
 
         self._response_raise_for_status = _response_raise_for_status
 
@@ -157,16 +210,47 @@ class DerivaBinding (object):
     def get_server_uri(self):
         return self._server_uri
 
-    def _get_new_session(self, session_config=None):
+    def _get_new_session(self, session_config=None, credentials=None, server=None):
         self._close_session()
-        self._session = get_new_requests_session(self._server_uri + '/',
-                                                 session_config if session_config else self.session_config)
-
-    def _pre_get(self, path, headers):
+        session_config = session_config if session_config else self.session_config
+        if session_config.get("shared_sessions", False):
+            self._session = get_shared_requests_session(
+                self._base_server_uri + '/',
+                session_config,
+                credentials,
+                init=lambda session: self._apply_credentials(session, credentials, server)
+            )
+            self._session_shared = True
+            for observer in self._request_observers:
+                if observer not in self._session.request_observers:
+                    self._session.request_observers.append(observer)
+        else:
+            self._session = get_new_requests_session(self._server_uri + '/', session_config)
+            self._session_shared = False
+            self._session.request_observers = self._request_observers
+
+    def add_request_observer(self, observer):
+        """Add an observer called with a RequestEvent for each request made by this binding."""
+        if observer not in self._request_observers:
+            self._request_observers.append(observer)
+        if self._session_shared and observer not in self._session.request_observers:
+            self._session.request_observers.append(observer)
+
+    def remove_request_observer(self, observer):
+        """Remove an observer previously added with add_request_observer()."""
+        self._request_observers[:] = [o for o in self._request_observers if o != observer]
+        if self._session_shared:
+            self._session.request_observers[:] = [o for o in self._session.request_observers if o != observer]
+
+    def cache_stats(self):
+        """Return a dict of response cache counters for this binding."""
+        return self._cache.stats()
+
+    def _pre_get(self, path, headers, cache=True):
         self.check_path(path)
         url = self._server_uri + path
         headers = headers.copy()
-        prev_response = self._cache.get(url)
+        prev_response = self._cache.get(url) if cache and self._caching else None
         if prev_response and 'etag' in prev_response.headers \
            and not ('if-none-match' in headers or 'if-match' in headers):
             headers['if-none-match'] = prev_response.headers['etag']
@@ -175,6 +259,12 @@ class DerivaBinding (object):
         headers['deriva-client-context'] = self.dcctx.merged(headers.get('deriva-client-context', {})).encoded()
         return url, headers, prev_response
 
+    def _send_shared(self, method, url, headers, send):
+        """Return send(), coalesced with identical in-flight requests if single-flight is enabled."""
+        if self._single_flight is None:
+            return send()
+        return self._single_flight.do((method, url, tuple(sorted(headers.items()))), send)
+
     def _pre_mutate(self, path, headers, guard_response=None):
         self.check_path(path)
         url = self._server_uri + path
@@ -184,6 +274,30 @@ class DerivaBinding (object):
         headers['deriva-client-context'] = self.dcctx.merged(headers.get('deriva-client-context', {})).encoded()
         return url, headers
 
+    def _encode_body(self, data, json_body, headers):
+        """Return (data, headers) for a request body given as data or as json_body.
+
+           JSON content is serialized once with the process-wide JSON
+           codec. JSON and CSV bodies are then compressed if request
+           compression is configured, the binding's service accepts
+           encoded request bodies, and the caller has not already
+           supplied a Content-Encoding.
+        """
+        content_type = next((v for k, v in headers.items() if k.lower() == 'content-type'), None)
+        if json_body is not None:
+            data = json_dumpb(json_body)
+            if content_type is None:
+                content_type = headers['Content-Type'] = 'application/json'
+        encoding = self.session_config.get("request_compression") if self._compress_requests else None
+        if not encoding or data is None or any(k.lower() == 'content-encoding' for k in headers) \
+                or not is_compressible(content_type):
+            return data, headers
+        if isinstance(data, (bytes, str)) \
+                and len(data) < self.session_config.get("request_compression_min_size", DEFAULT_COMPRESSION_MIN_SIZE):
+            return data, headers
+        headers['Content-Encoding'] = encoding
+        return compress(data, encoding), headers
+
     @staticmethod
     def check_path(path):
         if not path:
@@ -192,9 +306,10 @@ class DerivaBinding (object):
         if not path.startswith("/"):
             raise DerivaPathError("Malformed path error (not rooted with \"/\"): %s" % path)
 
-    @staticmethod
-    def _raise_for_status_304(r, p, raise_not_modified):
+    def _raise_for_status_304(self, r, p, raise_not_modified):
         if r.status_code == 304:
+            if p is not None:
+                self._cache.record_revalidated()
             if raise_not_modified:
                 raise NotModified(p or r)
             else:
@@ -216,15 +331,26 @@ class DerivaBinding (object):
         if not credentials:
             return
         assert self._session is not None
+        if self._session_shared:
+            # shared sessions are never mutated, so switch to the one keyed by these credentials
+            self._get_new_session(self.session_config, credentials, server)
+        else:
+            self._apply_credentials(self._session, credentials, server)
+
+    def _apply_credentials(self, session, credentials, server):
+        if not credentials:
+            return
         if 'bearer-token' in credentials:
-            self._session.headers.update({'Authorization': 'Bearer {token}'.format(token=credentials['bearer-token'])})
+            session.headers.update({'Authorization': 'Bearer {token}'.format(token=credentials['bearer-token'])})
         elif 'cookie' in credentials:
             cname, cval = credentials['cookie'].split('=', 1)
             # Fix for cookielib domain rewrite to *.local when no "." in hostname. In this case, don't set the domain.
             # Covers "localhost" and other dev/test scenarios. See "https://github.com/psf/requests/issues/5388"
-            self._session.cookies.set(cname, cval, domain="" if "." not in server else server, path='/')
+            session.cookies.set(cname, cval, domain="" if "." not in server else server, path='/')
         elif 'username' in credentials and 'password' in credentials:
-            self.post_authn_session(credentials)
+            headers = { 'deriva-client-context': self.dcctx.encoded() }
+            r = session.post(self._auth_uri, data=credentials, headers=headers)
+            _response_raise_for_status(r)
 
     def get_authn_session(self):
         headers = { 'deriva-client-context': self.dcctx.encoded() }
@@ -238,7 +364,7 @@ class DerivaBinding (object):
         _response_raise_for_status(r)
         return r
 
-    def head(self, path, headers=DEFAULT_HEADERS, raise_not_modified=False):
+    def head(self, path, headers=DEFAULT_HEADERS, raise_not_modified=False, cache=True):
         """Perform HEAD request, returning response object.
 
            Arguments:
@@ -246,6 +372,8 @@ class DerivaBinding (object):
              headers: headers to set in request
              raise_not_modified: raise HTTPError for 304 response
                status when true.
+             cache: whether to consult the response cache for
+               this request.
 
            May consult built-in cache and apply 'if-none-match'
            request header unless input headers already include
@@ -254,14 +382,14 @@ class DerivaBinding (object):
            may include content retrieved by GET on the same resource.
 
         """
-        url, headers, prev_response = self._pre_get(path, headers)
+        url, headers, prev_response = self._pre_get(path, headers, cache)
         return self._raise_for_status_304(
-            self._session.head(url, headers=headers),
+            self._send_shared('HEAD', url, headers, lambda: self._session.head(url, headers=headers)),
             prev_response,
             raise_not_modified
         )
         
-    def get(self, path, headers=DEFAULT_HEADERS, raise_not_modified=False, stream=False):
+    def get(self, path, headers=DEFAULT_HEADERS, raise_not_modified=False, stream=False, cache=True):
         """Perform GET request, returning response object.
 
            Arguments:
@@ -271,25 +399,29 @@ class DerivaBinding (object):
                status when true.
              stream: whether to defer content retrieval to 
                streaming access mode on response object.
+             cache: whether to consult and update the response
+               cache for this request.
 
            May consult built-in cache and apply 'if-none-match'
            request header unless input headers already include
            'if-none-match' or 'if-match'. On cache hit, returns cached
            response unless raise_not_modified=true.
 
-           Caching of new results is disabled when stream=True.
+           Caching of new results is disabled when stream=True or
+           cache=False.
 
         """
         if headers is None:
             headers = {}
-        url, headers, prev_response = self._pre_get(path, headers)
+        url, headers, prev_response = self._pre_get(path, headers, cache)
+        send = lambda: self._session.get(url, headers=headers)
         r = self._raise_for_status_304(
-            self._session.get(url, headers=headers),
+            send() if stream else self._send_shared('GET', url, headers, send),
             prev_response,
             raise_not_modified
         )
-        if self._caching and not stream:
-            self._cache[url] = r
+        if self._caching and cache and not stream and r is not prev_response:
+            self._cache.put(url, r)
         return r
 
     def post(self, path, data=None, json=None, headers=DEFAULT_HEADERS):
@@ -305,7 +437,8 @@ class DerivaBinding (object):
 
         """
         url, headers = self._pre_mutate(path, headers)
-        r = self._session.post(url, data=data, json=json, headers=headers)
+        data, headers = self._encode_body(data, json, headers)
+        r = self._session.post(url, data=data, headers=headers)
         return self._raise_for_status_412(r)
 
     def put(self, path, data=None, json=None, headers=DEFAULT_HEADERS, guard_response=None):
@@ -326,7 +459,8 @@ class DerivaBinding (object):
 
         """ 
         url, headers = self._pre_mutate(path, headers, guard_response)
-        r = self._session.put(url, data=data, json=json, headers=headers)
+        data, headers = self._encode_body(data, json, headers)
+        r = self._session.put(url, data=data, headers=headers)
         return self._raise_for_status_412(r)
    
     def delete(self, path, headers=DEFAULT_HEADERS, guard_response=None):
@@ -350,7 +484,9 @@ class DerivaBinding (object):
 
     def _close_session(self):
         if self._session is not None:
-            self._session.close()
+            # shared sessions belong to the process-wide registry
+            if not self._session_shared:
+                self._session.close()
             self._session = None
 
     def __del__(self):
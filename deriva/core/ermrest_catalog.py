@@ -1,17 +1,22 @@
 import os
-import io
 import re
 import logging
+import time
 import datetime
 import codecs
 import csv
-import json
+import shutil
+import threading
+import concurrent.futures
 import requests
 from typing import NamedTuple
 
 from . import urlquote, urlsplit, urlunsplit, datapath, DEFAULT_HEADERS, DEFAULT_CHUNK_SIZE, DEFAULT_SESSION_CONFIG, \
-    Megabyte, Kilobyte, get_transfer_summary
+    Megabyte, Kilobyte, get_transfer_summary, crockford_b32encode, crockford_b32decode
 from .deriva_binding import DerivaBinding, DerivaPathError
+from .utils.json_utils import json_loads, response_json
+from .utils.core_utils import topo_ranked
+from .utils.paging_utils import PageSizeController, as_page_size_controller
 from . import ermrest_model
 from .ermrest_model import nochange
 
@@ -146,8 +151,187 @@ class ErmrestCatalogMutationError(Exception):
 
 
 _clone_state_url = "tag:isrd.isi.edu,2018:clone-status"
+_sync_state_url = "tag:isrd.isi.edu,2024:sync-status"
+_sync_system_columns = frozenset(["RID", "RCT", "RCB", "RMT", "RMB"])
+_sync_delete_batch_size = 200
+_sync_magic_tables = frozenset([('public', 'ERMrest_Client'), ('public', 'ERMrest_Group')])
 
 DEFAULT_PAGE_SIZE = 100000
+DEFAULT_PAGE_STREAM_CHUNK_SIZE = Megabyte
+
+def _is_empty_content(destfile, content_type):
+    """Return True if the open destfile holds "empty" content of the given content type.
+
+    JSON and JSON-stream content is empty if it is a single empty
+    array or object. CSV content is empty if it has no rows after the
+    header line.
+    """
+    destfile.seek(0)
+    if content_type == "application/json" or content_type == "application/x-json-stream":
+        buf = destfile.read(16)
+        return buf == b"[]\n" or buf == b"{}\n"
+    elif content_type == "text/csv":
+        reader = csv.reader(codecs.iterdecode(destfile, 'utf-8'))
+        rowcount = 0
+        for row in reader:
+            rowcount += 1
+            if rowcount > 1:
+                break
+        return rowcount <= 1
+    return False
+
+def _query_runtime_exceeded(response):
+    """Return True if response reports that the ERMrest query run time limit was exceeded."""
+    return response is not None and response.status_code == 400 and "Query run time limit exceeded" in response.text
+
+def _stream_json_page(response, destfile, progress, sort_columns, stop_keys, stop_bytes):
+    """Stream a JSON-stream page from response to destfile in chunks, truncated after the first row whose sort key
+    is in stop_keys, if any.
+
+    Only whole lines are written, so at most one chunk and one partial row are held in memory at a time.
+    Returns (rows, nbytes, last_line, end_key) for the rows received, the bytes received, the last line written,
+    and the stop key which ended the page, if any.
+    """
+    rows = nbytes = 0
+    tail = b""
+    last_line = None
+    for chunk in response.iter_content(chunk_size=DEFAULT_PAGE_STREAM_CHUNK_SIZE):
+        nbytes += len(chunk)
+        buf = tail + chunk
+        pos = buf.rfind(b"\n") + 1
+        if not pos:
+            tail = buf
+            continue
+        buf, tail = buf[:pos], buf[pos:]
+        end_key = None
+        if stop_bytes and any(v in buf for v in stop_bytes):
+            buf, end_key = _truncate_json_stream(buf, sort_columns, stop_keys, stop_bytes)
+        rows += buf.count(b"\n")
+        destfile.write(buf)
+        progress.add(len(buf))
+        last_line = buf[buf.rfind(b"\n", 0, -1) + 1:]
+        if end_key is not None:
+            return rows, nbytes, last_line, end_key
+    if tail.strip():
+        end_key = None
+        if stop_bytes and any(v in tail for v in stop_bytes):
+            tail, end_key = _truncate_json_stream(tail, sort_columns, stop_keys, stop_bytes)
+        rows += 1
+        destfile.write(tail)
+        progress.add(len(tail))
+        return rows, nbytes, tail, end_key
+    return rows, nbytes, last_line, None
+
+
+def _truncate_json_stream(buf, sort_columns, stop_keys, stop_bytes):
+    """Return (buf, key) with buf truncated after the first row whose sort key is in stop_keys, if any."""
+    pos = 0
+    for line in buf.splitlines(keepends=True):
+        pos += len(line)
+        if any(v in line for v in stop_bytes):
+            row = json_loads(line)
+            key = tuple(str(row.get(k)) for k in sort_columns)
+            if key in stop_keys:
+                return buf[:pos], key
+    return buf, None
+
+
+def _missing_keys(src_keys, dst_keys):
+    """Yield the keys of dst_keys which are not in src_keys, merging two ascending iterables of keys.
+
+    Raises ValueError if either sequence is found out of ascending order, e.g. because the
+    servers collate keys differently than Python does.
+    """
+    src_iter = iter(src_keys)
+    src = next(src_iter, None)
+    prev_src = prev_dst = None
+    for dst in dst_keys:
+        if prev_dst is not None and dst <= prev_dst:
+            raise ValueError("destination keys are not in ascending order")
+        prev_dst = dst
+        while src is not None and src < dst:
+            prev_src, src = src, next(src_iter, None)
+            if src is not None and src <= prev_src:
+                raise ValueError("source keys are not in ascending order")
+        if src != dst:
+            yield dst
+
+
+def _fkey_tiers(depmap):
+    """Return a list of sets of tables ranked so that each table follows the tables it references.
+
+    :param depmap: Dictionary mapping each table to the set of tables it references.
+
+    As topo_ranked(), except that self-references are ignored and
+    tables on or behind a reference cycle are placed together in a
+    final tier with a warning rather than raising ValueError.
+    """
+    depmap = {table: set(requires) - {table} for table, requires in depmap.items()}
+    try:
+        return topo_ranked(depmap)
+    except ValueError:
+        pass
+    tiers, satisfied = [], set()
+    while depmap:
+        tier = {table for table, requires in depmap.items() if requires.issubset(satisfied)}
+        if not tier:
+            logging.warning("Foreign key cycle among tables %s; synchronizing them without ordering." % sorted(depmap))
+            tier = set(depmap)
+        tiers.append(tier)
+        satisfied.update(tier)
+        for table in tier:
+            del depmap[table]
+    return tiers
+
+
+def _run_tiers(tiers, func, workers):
+    """Call func(table) for each table of each tier in turn, concurrently within a tier, returning a dict of results.
+
+    After the first call which fails, calls not yet started are cancelled and the error is raised.
+    """
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for tier in tiers:
+            futures = {pool.submit(func, table): table for table in sorted(tier)}
+            done, pending = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+            for future in done:
+                results[futures[future]] = future.result()
+    return results
+
+
+class _PagedTransferCancelled (Exception):
+    pass
+
+
+class _PagedTransferProgress (object):
+    """Byte count and callback state shared by the workers of one paged transfer."""
+    def __init__(self, callback):
+        self.callback = callback
+        self.total = 0
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def add(self, nbytes):
+        with self._lock:
+            self.total += nbytes
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise _PagedTransferCancelled()
+
+    def report(self, progress=None):
+        """Report progress to the callback, raising _PagedTransferCancelled if it requests cancellation."""
+        if not self.callback:
+            return
+        with self._lock:
+            self.check_cancelled()
+            if not self.callback(progress=progress or "Downloading: %.2f MB transferred" %
+                                                      (float(self.total) / float(Megabyte))):
+                self.cancelled = True
+                raise _PagedTransferCancelled()
+
 
 class ResolveRidResult (NamedTuple):
     datapath: datapath.DataPath
@@ -163,8 +347,16 @@ class ErmrestCatalog(DerivaBinding):
        appropriate paths, headers, and/or content.
 
        Additional utility methods provided for accessing catalog metadata.
+
+       Set the model_cache attribute, on an instance or on the class
+       to affect all catalog bindings, to a ModelCache to reuse model
+       documents across getCatalogModel() and getPathBuilder() calls
+       and across processes. Snapshot bindings then build their
+       immutable model without any request after the first.
     """
     table_schemas = dict()
+    model_cache = None
+    _compress_requests = True
 
     @property
     def deriva_server(self):
@@ -366,8 +558,14 @@ class ErmrestCatalog(DerivaBinding):
         return ErmrestSnapshot(self._scheme, self._server, self._catalog_id, r.json()['snaptime'],
                                self._credentials, self._caching, self._session_config)
 
-    def getCatalogModel(self):
-        return ermrest_model.Model.fromcatalog(self)
+    def getCatalogModel(self, lazy=False):
+        """Return the catalog model, using the ModelCache in self.model_cache if one is set.
+
+        :param lazy: construct schemas and tables only when first accessed (default False)
+        """
+        if self.model_cache is not None:
+            return self.model_cache.get_model(self, lazy=lazy)
+        return ermrest_model.Model.fromcatalog(self, lazy=lazy)
 
     def getCatalogSchema(self):
         path = '/schema'
@@ -486,11 +684,13 @@ class ErmrestCatalog(DerivaBinding):
                   delete_if_empty = False,
                   paged = False,
                   page_size = DEFAULT_PAGE_SIZE,
-                  page_sort_columns = frozenset(["RID"])):
+                  page_sort_columns = frozenset(["RID"]),
+                  page_workers = 1):
         """
            Deprecated, call `get_as_file` instead.
         """
-        self.get_as_file(path, destfilename, headers, callback, delete_if_empty, paged, page_size, page_sort_columns)
+        self.get_as_file(path, destfilename, headers, callback, delete_if_empty, paged, page_size, page_sort_columns,
+                         page_workers)
 
     def get_as_file(self,
                     path,
@@ -500,7 +700,8 @@ class ErmrestCatalog(DerivaBinding):
                     delete_if_empty=False,
                     paged=False,
                     page_size=DEFAULT_PAGE_SIZE,
-                    page_sort_columns=frozenset(["RID"])):
+                    page_sort_columns=frozenset(["RID"]),
+                    page_workers=1):
         """
            Retrieve catalog data streamed to destination file.
            Caller is responsible to clean up file even on error, when the file may or may not exist.
@@ -508,13 +709,21 @@ class ErmrestCatalog(DerivaBinding):
            json/json-stream content, the presence of a single empty JSON object will be tested for. In the case of
            CSV content, the file will be parsed with CSV reader to determine that only a single header line and no row
            data is present.
+           If "paged" is True and "page_workers" is greater than one, a query sorted on a single RID column is split
+           into up to "page_workers" key ranges which are retrieved concurrently into temporary part files next to
+           the destination file, then concatenated in order. Each worker holds one page in memory at a time. Use an
+           ErmrestSnapshot binding to get a consistent result from a catalog that is being modified.
+           In paged mode, "page_size" may be a PageSizeController which adapts the page size to the observed page
+           latency and size. An integer "page_size" uses a controller which starts at, and never exceeds, that size:
+           pages are reduced when a query exceeds the server run time limit and grow back once pages are fast again.
         """
         self.check_path(path)
 
         # Only entity API supported with paged mode at this time, otherwise fallback. We fallback rather than raise an
         # exception in the case that the caller might be trying to perform an opportunistic paged request without
         # knowing a priori if paged support for the given query is available.
-        page_size = page_size if page_size > 0 else DEFAULT_PAGE_SIZE
+        if not isinstance(page_size, PageSizeController):
+            page_size = page_size if page_size > 0 else DEFAULT_PAGE_SIZE
         if not (path.startswith("/entity") or path.startswith("/attribute")) and paged:
             logging.warning("Paged data retrieval only supported for entity or attribute API queries.")
             paged = False
@@ -548,91 +757,28 @@ class ErmrestCatalog(DerivaBinding):
                                 return
                 destfile.flush()
             else:
-                first_page = True
-                first_line = None
-                last_record = None
+                progress = _PagedTransferProgress(callback)
+                page_size = as_page_size_controller(page_size)
                 usr = urlsplit(self._server_uri + path)
                 path = str(usr.path.split('@sort')[0])
-                while True:
-                    sort = "@sort(%s)%s" % (",".join(page_sort_columns or ["RID"]),
-                                            ("@after(%s)" % ",".join(last_record)) if last_record is not None else "")
-                    limit = "limit=%s" % int(page_size) if page_size > 0 else "none"
-                    query = re.sub(r"([^.]*)(limit=.*?)($|[&;])([^.]*)$", r"\1%s\3\4" % limit, usr.query, flags=re.I)
-                    url = urlunsplit((usr.scheme, usr.netloc, path + sort, query if query else limit, usr.fragment))
-
-                    # 1. Try to get a page worth of data, back-off page size if query run time errors are encountered
-                    with self._session.get(url, headers=headers) as r:
-                        if r.status_code == 400 and "Query run time limit exceeded" in r.text:
-                            if page_size == 1:
-                                self._response_raise_for_status(r)
-                            r.close()
-                            page_size //= 2
-                            page_size = 1 if page_size < 1 else page_size
-                            logging.warning("Query runtime exceeded while attempting to transfer rows from %s to file "
-                                            "[%s]. The page size is being reduced to %s and the query will be retried."
-                                            % (url, destfilename, page_size))
-                            if callback:
-                                if not callback(progress="Retrying query: %s" % url):
-                                    destfile.close()
-                                    return
-                            continue
-                        else:
-                            self._response_raise_for_status(r)
-
-                        # 2. Write the page to disk and check the last record processed in order to get the next page
-                        last_line = {}
-                        content_type = r.headers.get("Content-Type")
-                        logging.debug("Transferring data from [%s] to %s" % (url, destfilename))
-                        # CSV processing iterates over lines in the response, skipping the header line(s) in all but
-                        # the first page, and captures the last line of each page to determine the last record processed
-                        if content_type == "text/csv":
-                            skip = 1
-                            line_num = 0
-                            if first_page:
-                                lines = r.iter_lines(decode_unicode=True)
-                                reader = csv.reader(lines)
-                                first_line = next(reader)
-                                skip = reader.line_num
-                            for line in r.iter_lines():
-                                if not first_page:
-                                    line_num += 1
-                                    if line_num <= skip:
-                                        continue
-                                tline = line + b"\n"
-                                destfile.write(tline)
-                                total += len(tline)
-                                last_line = tline
-                            if last_line and last_line != first_line:
-                                reader = csv.DictReader([last_line.decode('utf-8')], first_line)
-                                last_line = next(reader)
-                            first_page = False
-                        # JSON-Stream processing writes the entire buffer to the destination file. The last line is
-                        # captured by reverse seeking in the buffer from right before the last b'\n' newline to the next
-                        # newline or buf[0], then calling readline from the current position
-                        elif content_type == "application/x-json-stream":
-                            buf = r.content
-                            if not buf:
-                                break
-                            destfile.write(buf)
-                            total += len(buf)
-                            b = io.BytesIO(buf)
-                            b.seek(-2, os.SEEK_END)
-                            while b.read(1) != b'\n':
-                                b.seek(-2, os.SEEK_CUR)
-                                if b.tell() == os.SEEK_SET:
-                                    break
-                            last_line = json.loads(b.readline().decode('utf-8'))
-
-                        # 3. Save the last record key and flush the destination file buffers to disk.
-                        if not last_line:
-                            break
-                        destfile.flush()
-                        last_record = [urlquote(str(last_line.get(key))) for key in page_sort_columns]
-                        if callback:
-                            if not callback(progress="Downloading: %.2f MB transferred" %
-                                                     (float(total) / float(Megabyte))):
-                                destfile.close()
-                                return
+                page_sort_columns = list(page_sort_columns or ["RID"])
+                split_keys = []
+                if (page_workers or 1) > 1:
+                    if len(page_sort_columns) == 1:
+                        split_keys = self._paged_split_keys(usr, path, headers, page_sort_columns[0], page_workers)
+                    else:
+                        logging.debug("Parallel paged data retrieval requires a single sort column, using one worker.")
+                try:
+                    if split_keys:
+                        content_type = self._get_paged_parallel(usr, path, headers, destfilename, destfile, page_size,
+                                                                page_sort_columns[0], split_keys, progress)
+                    else:
+                        content_type, _ = self._get_paged_range(usr, path, headers, destfile, page_size,
+                                                                page_sort_columns, progress)
+                except _PagedTransferCancelled:
+                    destfile.close()
+                    return
+                total = destfile.tell()
 
             elapsed = datetime.datetime.now() - start
             summary = get_transfer_summary(total, elapsed)
@@ -640,20 +786,7 @@ class ErmrestCatalog(DerivaBinding):
             # perform automatic file deletion on detected "empty" content, if requested
             delete_file = True if total == 0 else False
             if delete_if_empty and total > 0:
-                destfile.seek(0)
-                if content_type == "application/json" or content_type == "application/x-json-stream":
-                    buf = destfile.read(16)
-                    if buf == b"[]\n" or buf == b"{}\n":
-                        delete_file = True
-                elif content_type == "text/csv":
-                    reader = csv.reader(codecs.iterdecode(destfile, 'utf-8'))
-                    rowcount = 0
-                    for row in reader:
-                        rowcount += 1
-                        if rowcount > 1:
-                            break
-                    if rowcount <= 1:
-                        delete_file = True
+                delete_file = _is_empty_content(destfile, content_type)
 
             # automatically delete zero-length files or detected "empty" content
             if delete_file:
@@ -672,6 +805,188 @@ class ErmrestCatalog(DerivaBinding):
             if destfile:
                 destfile.close()
 
+    def _get_paged_range(self, usr, path, headers, destfile, page_size, page_sort_columns, progress,
+                         write_header=True, after=None, stop_keys=None):
+        """Transfer the rows of a paged query in sort key order to destfile.
+
+           Pages are requested with @sort(page_sort_columns) and @after() the key of the last row of the previous
+           page, beginning after the key values in "after" if given. The size of each page is chosen by the
+           PageSizeController "page_size", which is informed of the elapsed time and size of every page. When "stop_keys" is given, the transfer ends
+           after writing the first row whose key tuple is in stop_keys.
+
+           Returns (content_type, end_key) where end_key is the stop key which ended the transfer, if any.
+        """
+        last_record = [urlquote(v) for v in after] if after is not None else None
+        stop_bytes = [v.encode('utf-8') for key in stop_keys for v in key] if stop_keys else []
+        header = None
+        header_lines = 0
+        content_type = None
+        while True:
+            progress.check_cancelled()
+            sort = "@sort(%s)%s" % (",".join(page_sort_columns),
+                                    ("@after(%s)" % ",".join(last_record)) if last_record is not None else "")
+            size = page_size.size
+            limit = "limit=%d" % size
+            query = re.sub(r"([^.]*)(limit=.*?)($|[&;])([^.]*)$", r"\1%s\3\4" % limit, usr.query, flags=re.I)
+            url = urlunsplit((usr.scheme, usr.netloc, path + sort, query if query else limit, usr.fragment))
+
+            # 1. Try to get a page worth of data, back-off page size if query run time errors are encountered
+            page_start = time.perf_counter()
+            stream = headers.get("accept") == "application/x-json-stream"
+            with self._session.get(url, headers=headers, stream=stream) as r:
+                if _query_runtime_exceeded(r):
+                    try:
+                        reduced = page_size.failure(size)
+                    except ValueError:
+                        self._response_raise_for_status(r)
+                    r.close()
+                    logging.warning("Query runtime exceeded while attempting to transfer rows from %s to file "
+                                    "[%s]. The page size is being reduced to %s and the query will be retried."
+                                    % (url, destfile.name, reduced))
+                    progress.report("Retrying query: %s" % url)
+                    continue
+                else:
+                    self._response_raise_for_status(r)
+
+                # 2. Write the page to disk and check the last record processed in order to get the next page
+                last_row = None
+                end_key = None
+                rows = 0
+                nbytes = None
+                content_type = r.headers.get("Content-Type")
+                logging.debug("Transferring data from [%s] to %s" % (url, destfile.name))
+                # CSV processing iterates over lines in the response, writing the header line(s) only if requested
+                # and only once, and captures the last line of each page to determine the last record processed
+                if content_type == "text/csv":
+                    if header is None:
+                        reader = csv.reader(r.iter_lines(decode_unicode=True))
+                        header = next(reader, None)
+                        header_lines = reader.line_num
+                    for line_num, line in enumerate(r.iter_lines(), 1):
+                        tline = line + b"\n"
+                        if line_num <= header_lines:
+                            if write_header:
+                                destfile.write(tline)
+                                progress.add(len(tline))
+                            continue
+                        destfile.write(tline)
+                        progress.add(len(tline))
+                        last_row = tline
+                        rows += 1
+                        if stop_bytes and any(v in line for v in stop_bytes):
+                            row = dict(zip(header, next(csv.reader([line.decode('utf-8')]))))
+                            key = tuple(str(row.get(k)) for k in page_sort_columns)
+                            if key in stop_keys:
+                                end_key = key
+                                break
+                    write_header = False
+                    if last_row:
+                        last_row = next(csv.DictReader([last_row.decode('utf-8')], header))
+                # JSON-Stream processing streams the response to the destination file line by line, truncated
+                # after a stop key if one is present, and parses the last line to determine the last record processed
+                elif content_type == "application/x-json-stream":
+                    rows, nbytes, last_line, end_key = _stream_json_page(r, destfile, progress, page_sort_columns,
+                                                                         stop_keys, stop_bytes)
+                    if last_line:
+                        last_row = json_loads(last_line)
+
+                # 3. Adapt the page size, save the last record key and flush the destination file buffers to disk.
+                if end_key is None:
+                    page_size.observe(rows, time.perf_counter() - page_start,
+                                      nbytes if nbytes is not None else len(r.content))
+                if end_key is not None or not last_row:
+                    destfile.flush()
+                    return content_type, end_key
+                destfile.flush()
+                last_record = [urlquote(str(last_row.get(key))) for key in page_sort_columns]
+                progress.report()
+
+    def _paged_split_keys(self, usr, path, headers, sort_column, workers):
+        """Return up to workers-1 existing sort key values which split a paged query into ranges of similar size.
+
+           The first and last keys are found with single-row probes in each sort direction and decoded as RIDs. The
+           span between them is divided evenly and each division point is resolved to the next existing key with an
+           @after() probe. Returns an empty list if the keys are not RIDs or the query has fewer than two rows.
+        """
+        probe_headers = {k: v for k, v in headers.items() if k.lower() != 'accept'}
+        probe_headers['Accept'] = 'application/json'
+
+        def probe(sort, after=None):
+            url = urlunsplit((usr.scheme, usr.netloc, "%s@sort(%s)%s" % (
+                path, sort, ("@after(%s)" % urlquote(after)) if after is not None else ""), "limit=1", ""))
+            r = self._session.get(url, headers=probe_headers)
+            self._response_raise_for_status(r)
+            rows = response_json(r)
+            return str(rows[0].get(sort_column)) if rows else None
+
+        first, last = probe(sort_column), probe(sort_column + "::desc::")
+        if first is None or first == last:
+            return []
+        try:
+            lower, upper = sorted([crockford_b32decode(first), crockford_b32decode(last)])
+        except (TypeError, ValueError):
+            logging.debug("Sort column %s does not contain RIDs, using one worker." % sort_column)
+            return []
+        keys = []
+        for i in range(1, workers):
+            key = probe(sort_column, crockford_b32encode(lower + (upper - lower) * i // workers))
+            if key is not None and key not in keys:
+                keys.append(key)
+        return keys
+
+    def _get_paged_parallel(self, usr, path, headers, destfilename, destfile, page_size, sort_column, split_keys,
+                            progress):
+        """Transfer a paged query as concurrent key ranges into destfile, returning the content type.
+
+           One worker thread per range writes to its own part file, starting after one of split_keys (or at the
+           beginning) and ending at the next split key it encounters. Following these end keys from the first range
+           recovers the serial row order without assumptions about the server's collation. A range left out of
+           that chain only repeats rows of another range, e.g. when its split key row was deleted meanwhile.
+        """
+        starts = [None] + split_keys
+        stop_keys = {(key,) for key in split_keys}
+        parts = ["%s.part%d" % (destfilename, i) for i in range(len(starts))]
+
+        def fetch(i):
+            try:
+                with open(parts[i], 'w+b') as partfile:
+                    return self._get_paged_range(usr, path, headers, partfile, page_size, [sort_column], progress,
+                                                 write_header=(i == 0),
+                                                 after=[starts[i]] if starts[i] is not None else None,
+                                                 stop_keys=stop_keys - {(starts[i],)})
+            except BaseException:
+                progress.cancelled = True
+                raise
+
+        try:
+            logging.debug("Transferring %s in %d concurrent key ranges" % (path, len(starts)))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(starts)) as pool:
+                futures = [pool.submit(fetch, i) for i in range(len(starts))]
+                concurrent.futures.wait(futures)
+            errors = [f.exception() for f in futures if f.exception() is not None]
+            if errors:
+                raise next((e for e in errors if not isinstance(e, _PagedTransferCancelled)), errors[0])
+            results = [f.result() for f in futures]
+
+            index = {start: i for i, start in enumerate(starts)}
+            order = []
+            i = 0
+            while i is not None and i not in order:
+                order.append(i)
+                end_key = results[i][1]
+                i = index.get(end_key[0]) if end_key is not None else None
+            if len(order) < len(starts):
+                logging.debug("Skipping %d superseded key range(s) of %s" % (len(starts) - len(order), path))
+            for i in order:
+                with open(parts[i], 'rb') as partfile:
+                    shutil.copyfileobj(partfile, destfile, DEFAULT_CHUNK_SIZE)
+            destfile.flush()
+            return results[0][0]
+        finally:
+            for part in parts:
+                if os.path.exists(part):
+                    os.remove(part)
+
     def delete(self, path, headers=DEFAULT_HEADERS, guard_response=None):
         """Perform DELETE request, returning response object.
 
@@ -703,6 +1018,52 @@ class ErmrestCatalog(DerivaBinding):
         else:
             raise ValueError('Catalog deletion refused when really is %s.' % really)
 
+    def _clone_table_data(self, dst_catalog, tname_uri, page_size):
+        """Copy the rows of table tname_uri missing from dst_catalog in RID order, in pages of page_size rows.
+
+           Copying resumes after the greatest RID already present in the destination. Each page is inserted while
+           the following page is being fetched, so at most two pages are held in memory.
+        """
+        page_size = as_page_size_controller(page_size)
+
+        def fetch(last):
+            while True:
+                size = page_size.size
+                page_start = time.perf_counter()
+                try:
+                    r = self.get(
+                        "/entity/%s@sort(RID)%s?limit=%d" % (
+                            tname_uri,
+                            ("@after(%s)" % urlquote(last)) if last is not None else "",
+                            size
+                        ),
+                        cache=False
+                    )
+                except requests.HTTPError as e:
+                    if not _query_runtime_exceeded(e.response):
+                        raise
+                    try:
+                        page_size.failure(size)
+                    except ValueError:
+                        raise e
+                    continue
+                page = response_json(r)
+                page_size.observe(len(page), time.perf_counter() - page_start, len(r.content))
+                return page
+
+        # determine current position in (partial?) copy
+        r = dst_catalog.get("/entity/%s@sort(RID::desc::)?limit=1" % tname_uri, cache=False).json()
+        page = fetch(r[0]['RID'] if r else None)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as prefetch:
+            while page:
+                next_page = prefetch.submit(fetch, page[-1]['RID'])
+                try:
+                    dst_catalog.post("/entity/%s?nondefaults=RID,RCT,RCB" % tname_uri, json=page)
+                except BaseException:
+                    next_page.cancel()
+                    raise
+                page = next_page.result()
+
     def clone_catalog(self,
                       dst_catalog=None,
                       copy_data=True,
@@ -710,7 +1071,9 @@ class ErmrestCatalog(DerivaBinding):
                       copy_policy=True,
                       truncate_after=True,
                       exclude_schemas=None,
-                      dst_properties=None):
+                      dst_properties=None,
+                      page_size=10000,
+                      copy_workers=4):
         """Clone this catalog's content into dest_catalog, creating a new catalog if needed.
 
         :param dst_catalog: Destination catalog or None to request creation of new destination (default).
@@ -720,6 +1083,8 @@ class ErmrestCatalog(DerivaBinding):
         :param truncate_after: Truncate destination history after cloning when True (default).
         :param exclude_schemas: A list of schema names to exclude from the cloning process.
         :param dst_properties: A dictionary of custom catalog-creation properties.
+        :param page_size: Rows per page of copied table data, or a PageSizeController to adapt it (default 10000).
+        :param copy_workers: Number of tables whose data is copied, and of configuration changes sent, concurrently (default 4).
 
         When dst_catalog is provided, attempt an idempotent clone,
         assuming content MAY be partially cloned already using the
@@ -750,6 +1115,12 @@ class ErmrestCatalog(DerivaBinding):
         Truncation after cloning avoids retaining incremental
         snapshots which contain partial clones.
 
+        Table data is copied by up to copy_workers concurrent
+        workers. Within each table, the next page is fetched from the
+        source while the current page is being inserted into the
+        destination. Foreign keys are only added after all data is
+        copied, so tables may be loaded in any order.
+
         """
         src_model = self.getCatalogModel()
         session_config = self._session_config.copy() if self._session_config else DEFAULT_SESSION_CONFIG.copy()
@@ -926,58 +1297,38 @@ class ErmrestCatalog(DerivaBinding):
 
         # copy data in stage 2
         if copy_data:
-            page_size = 10000
-            for sname, tname in clone_states.keys():
+            def copy_table(sname, tname):
                 tname_uri = "%s:%s" % (urlquote(sname), urlquote(tname))
                 if clone_states[(sname, tname)] == 1:
-                    # determine current position in (partial?) copy
-                    r = dst_catalog.get("/entity/%s@sort(RID::desc::)?limit=1" % tname_uri).json()
-                    if r:
-                        last = r[0]['RID']
-                    else:
-                        last = None
-
-                    while True:
-                        page = self.get(
-                            "/entity/%s@sort(RID)%s?limit=%d" % (
-                                tname_uri,
-                                ("@after(%s)" % urlquote(last)) if last is not None else "",
-                                page_size
-                            )
-                        ).json()
-                        if page:
-                            dst_catalog.post("/entity/%s?nondefaults=RID,RCT,RCB" % tname_uri, json=page)
-                            last = page[-1]['RID']
-                        else:
-                            break
-
-                    # record our progress on catalog in case we fail part way through
-                    dst_catalog.put(
-                        "/schema/%s/table/%s/annotation/%s" % (
-                            urlquote(sname),
-                            urlquote(tname),
-                            urlquote(_clone_state_url),
-                        ),
-                        json=2
-                    )
+                    self._clone_table_data(dst_catalog, tname_uri, page_size)
                 elif clone_states[(sname, tname)] is None and (sname, tname) in {
                         ('public', 'ERMrest_Client'),
                         ('public', 'ERMrest_Group'),
                 }:
                     # special sync behavior for magic ermrest tables
                     # HACK: these are assumed small enough to join via local merge of arrays
-                    page = self.get("/entity/%s?limit=none" % tname_uri).json()
+                    page = response_json(self.get("/entity/%s?limit=none" % tname_uri, cache=False))
                     dst_catalog.post("/entity/%s?onconflict=skip" % tname_uri, json=page)
-
-                    # record our progress on catalog in case we fail part way through
-                    dst_catalog.put(
-                        "/schema/%s/table/%s/annotation/%s" % (
-                            urlquote(sname),
-                            urlquote(tname),
-                            urlquote(_clone_state_url),
-                        ),
-                        json=2
-                    )
+                else:
+                    return
+
+                # record our progress on catalog in case we fail part way through
+                dst_catalog.put(
+                    "/schema/%s/table/%s/annotation/%s" % (
+                        urlquote(sname),
+                        urlquote(tname),
+                        urlquote(_clone_state_url),
+                    ),
+                    json=2
+                )
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, copy_workers)) as pool:
+                futures = [pool.submit(copy_table, sname, tname) for sname, tname in clone_states.keys()]
+                done, pending = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+                for future in pending:
+                    future.cancel()
+            for future in done:
+                future.result()
 
         # apply stage 2 model in bulk only... we won't get here unless preceding succeeded
         new_fkeys = []
@@ -1063,7 +1414,7 @@ class ErmrestCatalog(DerivaBinding):
                         dst_fkey.acl_bindings.update(src_fkey.acl_bindings)
 
         # send all the config changes to the server
-        dst_model.apply()
+        dst_model.apply(workers=copy_workers)
 
         # truncate cloning history
         if truncate_after:
@@ -1072,6 +1423,184 @@ class ErmrestCatalog(DerivaBinding):
 
         return dst_catalog
 
+    def sync_catalog(self,
+                     dst_catalog,
+                     exclude_schemas=None,
+                     propagate_deletes=True,
+                     page_size=10000,
+                     copy_workers=4):
+        """Incrementally synchronize table data of dst_catalog with this catalog.
+
+        :param dst_catalog: Destination catalog previously created with clone_catalog().
+        :param exclude_schemas: A list of schema names to exclude from synchronization.
+        :param propagate_deletes: Delete destination rows whose RIDs no longer exist in the source when True (default).
+        :param page_size: Rows per page of copied table data, or a PageSizeController to adapt it (default 10000).
+        :param copy_workers: Number of tables of the same foreign key tier synchronized concurrently (default 4).
+        :return: A dict with the source "snaptime" now reflected in the destination and per-table "tables" counts
+          of "upserted" and "deleted" rows.
+
+        The source is read from its latest snapshot. Only rows whose
+        RMT is newer than the source snaptime recorded by the last
+        successful sync are transferred, and they are applied to the
+        destination as upserts: new rows are inserted preserving
+        their RID, RCT and RCB, and existing rows are updated in
+        place. Deletions are detected by a merge of the sorted RID
+        sets of the source and destination tables and applied in
+        batches.
+
+        Since the destination enforces its foreign keys, tables are
+        upserted in tiers following the foreign keys, referenced
+        tables first, and only tables of the same tier are
+        synchronized concurrently. Deletions follow all upserts, in
+        the reverse order, referencing tables first.
+
+        The source snaptime is recorded in the destination catalog
+        annotation "tag:isrd.isi.edu,2024:sync-status" only after
+        every table has been synchronized, so an interrupted sync is
+        simply repeated from the previous snaptime. Without such an
+        annotation, e.g. on the first sync of a clone, all rows are
+        transferred.
+
+        The destination model must already contain the source tables
+        and columns; tables missing from the destination are skipped
+        with a warning. Use clone_catalog() with the existing
+        destination to extend its model.
+        """
+        src_snapshot = self.latest_snapshot()
+        src_model = src_snapshot.getCatalogModel()
+        dst_model = dst_catalog.getCatalogModel()
+        exclude_schemas = [] if exclude_schemas is None else exclude_schemas
+        source = "%s/ermrest/catalog/%s" % (self._base_server_uri, urlquote(self._catalog_id))
+
+        state = dst_model.annotations.get(_sync_state_url)
+        since = state.get("snaptime") if isinstance(state, dict) and state.get("source") == source else None
+        if since is not None:
+            since = ermrest_model.snaptime_to_timestamptz(since)
+
+        tables = {}
+        for sname, schema in src_model.schemas.items():
+            if sname in exclude_schemas:
+                continue
+            for tname, table in schema.tables.items():
+                if table.kind != 'table' or (sname, tname) == ('public', 'ERMrest_RID_Lease'):
+                    continue
+                if sname not in dst_model.schemas or tname not in dst_model.schemas[sname].tables:
+                    logging.warning("Skipping sync of %s:%s which is not present in the destination." % (sname, tname))
+                    continue
+                columns = set(table.column_definitions.elements)
+                if not {"RID", "RMT"}.issubset(columns):
+                    logging.warning("Skipping sync of %s:%s which lacks system columns." % (sname, tname))
+                    continue
+                dst_columns = set(dst_model.schemas[sname].tables[tname].column_definitions.elements)
+                tables[(sname, tname)] = sorted((columns & dst_columns) - _sync_system_columns)
+
+        # the destination enforces its foreign keys, so parents are upserted before children and deleted after them
+        tiers = _fkey_tiers({
+            (sname, tname): {
+                (fkey.pk_table.schema.name, fkey.pk_table.name)
+                for fkey in dst_model.schemas[sname].tables[tname].foreign_keys
+            } & set(tables)
+            for sname, tname in tables
+        })
+
+        def tname_uri(table):
+            return "%s:%s" % (urlquote(table[0]), urlquote(table[1]))
+
+        def upsert_table(table):
+            if table in _sync_magic_tables:
+                # special sync behavior for magic ermrest tables, as in clone_catalog
+                page = response_json(src_snapshot.get("/entity/%s?limit=none" % tname_uri(table), cache=False))
+                dst_catalog.post("/entity/%s?onconflict=skip" % tname_uri(table), json=page)
+                return len(page)
+            return src_snapshot._sync_table_upserts(dst_catalog, tname_uri(table), tables[table], since, page_size)
+
+        def delete_table(table):
+            if table in _sync_magic_tables or not propagate_deletes:
+                return 0
+            return src_snapshot._sync_table_deletes(dst_catalog, tname_uri(table), page_size)
+
+        upserted = _run_tiers(tiers, upsert_table, copy_workers)
+        deleted = _run_tiers(reversed(tiers), delete_table, copy_workers)
+        results = {
+            "%s:%s" % table: {"upserted": upserted[table], "deleted": deleted[table]}
+            for table in tables
+        }
+
+        dst_catalog.put("/annotation/%s" % urlquote(_sync_state_url),
+                        json={"source": source, "snaptime": src_snapshot.snaptime})
+        return {"snaptime": src_snapshot.snaptime, "tables": results}
+
+    def _sync_table_upserts(self, dst_catalog, tname_uri, columns, since, page_size):
+        """Upsert rows of table tname_uri modified after timestamptz "since" (or all rows if None) into
+           dst_catalog, returning the number of rows upserted.
+        """
+        page_size = as_page_size_controller(page_size)
+        rmt_filter = "/RMT::gt::%s" % urlquote(since) if since is not None else ""
+        update_path = "/attributegroup/%s/RID;%s" % (tname_uri, ",".join(urlquote(c) for c in columns)) \
+            if columns else None
+
+        def fetch_pages(path):
+            last = None
+            while True:
+                size = page_size.size
+                page_start = time.perf_counter()
+                try:
+                    r = self.get("%s@sort(RID)%s?limit=%d" % (
+                        path, ("@after(%s)" % urlquote(last)) if last is not None else "", size), cache=False)
+                except requests.HTTPError as e:
+                    if not _query_runtime_exceeded(e.response):
+                        raise
+                    try:
+                        page_size.failure(size)
+                    except ValueError:
+                        raise e
+                    continue
+                page = response_json(r)
+                page_size.observe(len(page), time.perf_counter() - page_start, len(r.content))
+                if not page:
+                    return
+                yield page
+                last = page[-1]['RID']
+
+        upserted = 0
+        for page in fetch_pages("/entity/%s%s" % (tname_uri, rmt_filter)):
+            dst_catalog.post("/entity/%s?nondefaults=RID,RCT,RCB&onconflict=skip" % tname_uri, json=page)
+            if update_path:
+                dst_catalog.put(update_path, json=[{k: row.get(k) for k in ["RID"] + columns} for row in page])
+            upserted += len(page)
+        return upserted
+
+    def _sync_table_deletes(self, dst_catalog, tname_uri, page_size):
+        """Delete rows of table tname_uri from dst_catalog whose RIDs are no longer present in this catalog,
+           returning the number of rows deleted.
+        """
+        page_size = as_page_size_controller(page_size)
+
+        def rids(catalog):
+            last = None
+            while True:
+                page = response_json(catalog.get("/attribute/%s/RID@sort(RID)%s?limit=%d" % (
+                    tname_uri, ("@after(%s)" % urlquote(last)) if last is not None else "", page_size.size),
+                    cache=False))
+                if not page:
+                    return
+                for row in page:
+                    yield row['RID']
+                last = page[-1]['RID']
+
+        try:
+            missing = list(_missing_keys(rids(self), rids(dst_catalog)))
+        except ValueError as e:
+            logging.debug("Falling back to in-memory RID set comparison for %s: %s" % (tname_uri, e))
+            src_rids = set(rids(self))
+            missing = [rid for rid in rids(dst_catalog) if rid not in src_rids]
+        deleted = 0
+        for i in range(0, len(missing), _sync_delete_batch_size):
+            batch = missing[i:i + _sync_delete_batch_size]
+            dst_catalog.delete("/entity/%s/%s" % (tname_uri, ";".join("RID=%s" % urlquote(rid) for rid in batch)))
+            deleted += len(batch)
+        return deleted
+
 class ErmrestSnapshot(ErmrestCatalog):
     """Persistent handle for an ERMrest catalog snapshot.
 
@@ -6,8 +6,16 @@ import base64
 import hashlib
 import json
 import re
-from collections import OrderedDict
-from collections.abc import Iterable
+import time
+import logging
+import functools
+import weakref
+import heapq
+import itertools
+import concurrent.futures
+import requests
+from collections import OrderedDict, namedtuple
+from collections.abc import Iterable, MutableMapping
 from enum import Enum
 
 from . import AttrDict, tag, urlquote, stob, mmo
@@ -315,18 +323,347 @@ def equivalent(doc1, doc2, method=None):
         return True
     return doc1 == doc2
 
+class _LazyMap (MutableMapping):
+    """Name-keyed mapping of model elements constructed from their documents on first access.
+
+       Iteration order, membership, and length are known without
+       constructing any element.
+    """
+    def __init__(self, docs, constructor):
+        self._docs = dict(docs)
+        self._elements = dict.fromkeys(self._docs)
+        self._constructor = constructor
+
+    def __getitem__(self, name):
+        element = self._elements[name]
+        if element is None:
+            element = self._constructor(name, self._docs[name])
+            self._elements[name] = element
+            del self._docs[name]
+        return element
+
+    def __setitem__(self, name, element):
+        self._docs.pop(name, None)
+        self._elements[name] = element
+
+    def __delitem__(self, name):
+        del self._elements[name]
+        self._docs.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._elements
+
+    def __iter__(self):
+        return iter(self._elements)
+
+    def __len__(self):
+        return len(self._elements)
+
+    def __repr__(self):
+        return "<%s of %d, %d constructed>" % (type(self).__name__, len(self._elements), len(self._elements) - len(self._docs))
+
+def _model_of(node):
+    """Return the Model containing a Model, Schema, Table, Column, Key, or ForeignKey."""
+    while not isinstance(node, Model):
+        node = node.model if isinstance(node, Schema) else node.schema if isinstance(node, Table) else node.table
+    return node
+
+def _mutates_model(method):
+    """Decorator for a method which mutates a model.
+
+       A lazily constructed model is fully constructed before the
+       method, and the model's cached SchemaGraph is discarded after it.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        model = _model_of(self)
+        model._materialize()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            model._schema_graph = None
+    return wrapper
+
+DEFAULT_APPLY_WORKERS = 1
+DEFAULT_APPLY_RETRIES = 0
+DEFAULT_APPLY_RETRY_DELAY = 0.5
+_apply_retry_status = {409, 500, 502, 503, 504}
+
+class ModelChange (object):
+    """Configuration change of one model element, as planned by ApplyPlan.
+
+       :param node: the Model, Schema, Table, Column, Key, or ForeignKey to change
+       :param changes: dict of configuration fields (comment, annotations, acls, acl_bindings) to send
+    """
+    def __init__(self, node, changes):
+        self.node = node
+        self.changes = changes
+
+    def __repr__(self):
+        return "<%s %s %s>" % (type(self).__name__, self.node.uri_path, sorted(self.changes))
+
+    def requests(self):
+        """Return list of (uri_path, body) pairs of the PUT requests which make this change."""
+        if isinstance(self.node, Model):
+            # the catalog level has separate sub-resources
+            return [
+                ({'annotations': '/annotation', 'acls': '/acl'}[field], value)
+                for field, value in self.changes.items()
+            ]
+        return [(self.node.uri_path, self.changes)]
+
+    def prejson(self):
+        """Produce a representation of the change as generic Python data structures"""
+        return [
+            {"method": "PUT", "uri_path": uri_path, "json": body}
+            for uri_path, body in self.requests()
+        ]
+
+    def execute(self):
+        """Send the change to the catalog."""
+        if isinstance(self.node, Model):
+            for uri_path, body in self.requests():
+                self.node.catalog.put(uri_path, json=body).raise_for_status()
+        else:
+            # use alter method to reduce number of web requests and update local state
+            self.node.alter(**self.changes)
+
+class ApplyPlan (object):
+    """Configuration changes needed for a catalog to match a model subtree, planned before any is sent.
+
+       :param node: the Model, Schema, Table, Column, Key, or ForeignKey with the desired configuration
+       :param existing: an instance comparable to node with the current configuration, or None to plan all of it
+
+       The plan is a list of ModelChange instances in self.changes, in
+       model tree order. Tables and schemas whose whole configuration
+       has the same fingerprint in node and existing are skipped
+       without comparing their elements. Use prejson() to report the
+       plan (e.g. for a dry run) and execute() to send it.
+    """
+    def __init__(self, node, existing=None):
+        self.node = node
+        self.changes = []
+        _model_of(node)._materialize()
+        if existing is not None:
+            _model_of(existing)._materialize()
+        self._fingerprints = {}
+        self._plan(node, existing)
+        self._fingerprints = None
+
+    @classmethod
+    def fromchanges(cls, node, changes):
+        """Return a plan of the given ModelChange instances for node, without comparing configurations."""
+        plan = cls.__new__(cls)
+        plan.node = node
+        plan.changes = list(changes)
+        return plan
+
+    def __repr__(self):
+        return "<%s of %d changes>" % (type(self).__name__, len(self.changes))
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    def _fingerprint(self, node):
+        """Return digest of the whole configuration of a Model, Schema, or Table, memoized during planning."""
+        fingerprint = self._fingerprints.get(id(node))
+        if fingerprint is None:
+            if isinstance(node, Table):
+                doc = node.prejson()
+            else:
+                doc = {
+                    field: getattr(node, field, None)
+                    for field in ('acls', 'annotations', 'comment')
+                }
+                children = node.schemas if isinstance(node, Model) else node.tables
+                doc['children'] = [ (name, self._fingerprint(child)) for name, child in children.items() ]
+            fingerprint = hashlib.sha256(json.dumps(doc, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+            self._fingerprints[id(node)] = fingerprint
+        return fingerprint
+
+    def _plan(self, node, existing):
+        if existing is not None and isinstance(node, (Model, Schema, Table)) \
+           and self._fingerprint(node) == self._fingerprint(existing):
+            return
+        changes = node._config_changes(existing)
+        if changes:
+            self.changes.append(ModelChange(node, changes))
+        for child, existing_child in node._config_children(existing):
+            self._plan(child, existing_child)
+
+    def prejson(self):
+        """Produce a representation of the planned requests as generic Python data structures"""
+        return [ request for change in self.changes for request in change.prejson() ]
+
+    @staticmethod
+    def _execute_change(change, retries):
+        for attempt in range(retries + 1):
+            try:
+                return change.execute()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                response = getattr(e, 'response', None)
+                if attempt == retries or isinstance(e, requests.HTTPError) and (
+                        response is None or response.status_code not in _apply_retry_status):
+                    raise
+                logging.debug("Retrying %s after error: %s" % (change, e))
+                time.sleep(DEFAULT_APPLY_RETRY_DELAY * 2 ** attempt)
+
+    def execute(self, workers=DEFAULT_APPLY_WORKERS, retries=DEFAULT_APPLY_RETRIES):
+        """Send the planned changes to the catalog, returning self.
+
+        :param workers: Maximum number of changes sent concurrently.
+        :param retries: Maximum number of retries of a change after a connection error or a 409 or 5xx response.
+
+        After the first change which fails, changes not yet started
+        are cancelled and the error is raised.
+        """
+        if workers <= 1 or len(self.changes) <= 1:
+            for change in self.changes:
+                self._execute_change(change, retries)
+            return self
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [ pool.submit(self._execute_change, change, retries) for change in self.changes ]
+            done, pending = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+        for future in done:
+            future.result()
+        return self
+
+def _stored_container(doc, factory):
+    """Return a copy of a non-empty acls, acl_bindings, or annotations document, or None in place of an empty one."""
+    return factory(doc) if doc else None
+
+def _peek_container(container, factory):
+    """Return a stored container, or a new empty one in place of None without storing it."""
+    return factory() if container is None else container
+
+_container_view_writers = ('__setitem__', '__delitem__', '__ior__', 'setdefault', 'update', 'pop', 'popitem', 'clear')
+
+def _container_view_class(factory):
+    """Return a subclass of factory for empty views which are stored in their element on first modification."""
+    def writer(name):
+        def method(self, *args, **kwargs):
+            return getattr(factory, name)(self._attach(), *args, **kwargs)
+        method.__name__ = name
+        return method
+
+    def __init__(self, owner, slot):
+        factory.__init__(self)
+        object.__setattr__(self, '_owner', owner)
+        object.__setattr__(self, '_slot', slot)
+
+    def _attach(self):
+        owner = self._owner
+        if owner is None:
+            return self
+        container = getattr(owner, self._slot)
+        if container is None:
+            # this view becomes the stored container
+            setattr(owner, self._slot, self)
+            object.__setattr__(self, '_owner', None)
+            return self
+        # another view of the same attribute was modified first
+        return container
+
+    def __reduce_ex__(self, protocol):
+        return (factory, (dict(self),))
+
+    namespace = {name: writer(name) for name in _container_view_writers}
+    namespace.update({
+        '__slots__': ('_owner', '_slot'),
+        '__init__': __init__,
+        '_attach': _attach,
+        '__reduce_ex__': __reduce_ex__,
+    })
+    return type('_Empty%sView' % factory.__name__, (factory,), namespace)
+
+_container_view_classes = {}
+
+class _container_attribute (object):
+    """Descriptor for an acls, acl_bindings, or annotations attribute kept in a slot.
+
+       An element with empty configuration stores None in the slot.
+       Reading the attribute then returns a new empty view which is
+       not stored, and the view only becomes the element's container
+       when it is first modified, which saves memory in models with
+       many columns and constraints.
+    """
+    __slots__ = ('slot', 'factory', 'view')
+
+    def __init__(self, slot, factory):
+        self.slot = slot
+        self.factory = factory
+        self.view = _container_view_classes.setdefault(factory, _container_view_class(factory))
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        container = getattr(obj, self.slot)
+        if container is None:
+            return self.view(obj, self.slot)
+        return container
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+
 class Model (object):
     """Top-level catalog model.
+
+       With lazy=True, schemas and tables are constructed from the
+       model document only when first accessed, and foreign keys are
+       digested only when their referenced table or referring tables
+       are needed. This makes loading the model of a very large
+       catalog cheap when a client only touches a few tables, while
+       every access behaves as in a fully constructed model. The first
+       mutation of a lazily constructed model (e.g. create_table() or
+       alter()) constructs the rest of it.
     """
-    def __init__(self, catalog, model_doc):
+    def __init__(self, catalog, model_doc, lazy=False):
         self._catalog = catalog
         self._pseudo_fkeys = {}
+        self._lazy = lazy
+        self._schema_graph = None
         self.acls = AttrDict(model_doc.get('acls', {}))
         self.annotations = dict(model_doc.get('annotations', {}))
-        self.schemas = {
-            sname: Schema(self, sname, sdoc)
-            for sname, sdoc in model_doc.get('schemas', {}).items()
-        }
+        if lazy:
+            self._index_fkeys(model_doc)
+            self.schemas = _LazyMap(model_doc.get('schemas', {}), lambda sname, sdoc: Schema(self, sname, sdoc))
+        else:
+            self.schemas = {
+                sname: Schema(self, sname, sdoc)
+                for sname, sdoc in model_doc.get('schemas', {}).items()
+            }
+            self.digest_fkeys()
+
+    def _index_fkeys(self, model_doc):
+        """Index foreign key documents by referenced table and by constraint name for lazy construction."""
+        self._fkey_referrers = {}
+        self._fkey_tables = {}
+        for sname, sdoc in model_doc.get('schemas', {}).items():
+            for tname, tdoc in sdoc.get('tables', {}).items():
+                for fkdoc in tdoc.get('foreign_keys', []):
+                    pk = fkdoc['referenced_columns'][0]
+                    self._fkey_referrers.setdefault((pk['schema_name'], pk['table_name']), {})[(sname, tname)] = None
+                    for names in fkdoc.get('names', [])[0:1]:
+                        if names[0] == 'placeholder':
+                            self._fkey_tables[('', names[1])] = (sname, tname)
+                            self._fkey_tables[(sname, names[1])] = (sname, tname)
+                        else:
+                            self._fkey_tables[tuple(names)] = (sname, tname)
+
+    def _materialize(self):
+        """Finish construction of a lazily constructed model."""
+        if not self._lazy:
+            return
+        for schema in self.schemas.values():
+            for table in schema.tables.values():
+                table.referenced_by
+        self._lazy = False
+        self._fkey_referrers = self._fkey_tables = None
         self.digest_fkeys()
 
     def prejson(self, prune=True):
@@ -351,6 +688,19 @@ class Model (object):
                     except KeyError:
                         del referer.foreign_keys[fkey.name]
 
+    def schema_graph(self):
+        """Return the SchemaGraph of this model, building it on first use.
+
+        The graph is cached until the model is changed through one of
+        its create, alter, or drop methods. A lazily constructed model
+        is fully constructed to build the graph.
+        """
+        graph = self._schema_graph
+        if graph is None:
+            self._materialize()
+            graph = self._schema_graph = SchemaGraph(self)
+        return graph
+
     @property
     def catalog(self):
         return self._catalog
@@ -361,9 +711,12 @@ class Model (object):
         return "/schema"
 
     @classmethod
-    def fromcatalog(cls, catalog):
-        """Retrieve catalog config as a Model management object."""
-        return cls(catalog, catalog.get("/schema").json())
+    def fromcatalog(cls, catalog, lazy=False):
+        """Retrieve catalog config as a Model management object.
+
+        :param lazy: construct schemas and tables only when first accessed (default False)
+        """
+        return cls(catalog, catalog.get("/schema").json(), lazy=lazy)
 
     @classmethod
     def fromfile(cls, catalog, schema_file):
@@ -386,10 +739,12 @@ class Model (object):
         for schema in self.schemas.values():
             schema.clear(clear_comment=clear_comment, clear_annotations=clear_annotations, clear_acls=clear_acls, clear_acl_bindings=clear_acl_bindings)
 
-    def apply(self, existing=None):
+    def apply(self, existing=None, workers=DEFAULT_APPLY_WORKERS, retries=DEFAULT_APPLY_RETRIES):
         """Apply catalog configuration to catalog unless existing already matches.
 
         :param existing: An instance comparable to self.
+        :param workers: Maximum number of changes sent concurrently (default DEFAULT_APPLY_WORKERS).
+        :param retries: Maximum number of retries of a change after a transient failure (default DEFAULT_APPLY_RETRIES).
 
         The configuration in self will be applied recursively to the
         corresponding model nodes in schema.
@@ -400,16 +755,36 @@ class Model (object):
         under this Model tree are already met or need to be remotely
         applied.
 
+        All needed changes are planned before any is sent, as by
+        plan_apply(), and then sent concurrently. Returns the executed
+        ApplyPlan.
+        """
+        return self.plan_apply(existing).execute(workers=workers, retries=retries)
+
+    def plan_apply(self, existing=None):
+        """Return the ApplyPlan of changes which apply() would send, without sending any.
+
+        :param existing: An instance comparable to self, or None (default) to retrieve it from the catalog.
         """
         if existing is None:
             existing = self.fromcatalog(self.catalog)
-        if not equivalent(self.annotations, existing.annotations):
-            self.catalog.put('/annotation', json=self.annotations)
-        if not equivalent(self.acls, existing.acls, method='catalog_acls'):
-            self.catalog.put('/acl', json=self.acls)
+        return ApplyPlan(self, existing)
+
+    def _config_changes(self, existing):
+        """Return dict of configuration changes needed for existing to match self, or all configuration if existing is None."""
+        changes = {}
+        if existing is None or not equivalent(self.annotations, existing.annotations):
+            changes['annotations'] = self.annotations
+        if existing is None or not equivalent(self.acls, existing.acls, method='catalog_acls'):
+            changes['acls'] = self.acls
+        return changes
+
+    def _config_children(self, existing):
+        """Yield (child, existing child) pairs of configurable elements within self."""
         for sname, schema in self.schemas.items():
-            schema.apply(existing.schemas[sname])
+            yield schema, existing.schemas[sname] if existing else None
 
+    @_mutates_model
     def create_schema(self, schema_def):
         """Add a new schema to this model in the remote database based on schema_def.
 
@@ -450,6 +825,11 @@ class Model (object):
 
         """
         sname, cname = constraint_name_pair
+        if self._lazy:
+            # construct the table holding the constraint, which registers it
+            location = self._fkey_tables.get((sname.name if isinstance(sname, Schema) else (sname or ''), cname))
+            if location is not None:
+                self.schemas[location[0]].tables[location[1]]
         if isinstance(sname, Schema):
             if self.schemas[sname.name] is sname:
                 return sname._fkeys[cname]
@@ -627,10 +1007,13 @@ class Schema (object):
         self.annotations = dict(schema_doc.get('annotations', {}))
         self.comment = schema_doc.get('comment')
         self._fkeys = {}
-        self.tables = {
-            tname: Table(self, tname, tdoc)
-            for tname, tdoc in schema_doc.get('tables', {}).items()
-        }
+        if model._lazy:
+            self.tables = _LazyMap(schema_doc.get('tables', {}), lambda tname, tdoc: Table(self, tname, tdoc))
+        else:
+            self.tables = {
+                tname: Table(self, tname, tdoc)
+                for tname, tdoc in schema_doc.get('tables', {}).items()
+            }
 
     def __repr__(self):
         cls = type(self)
@@ -723,15 +1106,24 @@ class Schema (object):
         for table in self.tables.values():
             table.clear(clear_comment=clear_comment, clear_annotations=clear_annotations, clear_acls=clear_acls, clear_acl_bindings=clear_acl_bindings)
 
-    def apply(self, existing=None):
+    def apply(self, existing=None, workers=DEFAULT_APPLY_WORKERS, retries=DEFAULT_APPLY_RETRIES):
         """Apply configuration to corresponding schema in catalog unless existing already matches.
 
         :param existing: An instance comparable to self, or None to apply configuration unconditionally.
+        :param workers: Maximum number of changes sent concurrently (default DEFAULT_APPLY_WORKERS).
+        :param retries: Maximum number of retries of a change after a transient failure (default DEFAULT_APPLY_RETRIES).
 
         The state of self.comment, self.annotations, and self.acls
         will be applied to the server unless they match their
         corresponding state in existing.
+
+        Changes are planned as a whole by ApplyPlan before any is
+        sent. Returns the executed ApplyPlan.
         """
+        return ApplyPlan(self, existing).execute(workers=workers, retries=retries)
+
+    def _config_changes(self, existing):
+        """Return dict of configuration changes needed for existing to match self, or all configuration if existing is None."""
         changes = {}
         if existing is None or not equivalent(self.comment, existing.comment):
             changes['comment'] = self.comment
@@ -739,12 +1131,14 @@ class Schema (object):
             changes['annotations'] = self.annotations
         if existing is None or not equivalent(self.acls, existing.acls, method='acls'):
             changes['acls'] = self.acls
-        if changes:
-            # use alter method to reduce number of web requests
-            self.alter(**changes)
+        return changes
+
+    def _config_children(self, existing):
+        """Yield (child, existing child) pairs of configurable elements within self."""
         for tname, table in self.tables.items():
-            table.apply(existing.tables[tname] if existing else None)
+            yield table, existing.tables[tname] if existing else None
 
+    @_mutates_model
     def alter(self, schema_name=nochange, comment=nochange, acls=nochange, annotations=nochange, update_mappings=UpdateMappings.no_update):
         """Alter existing schema definition.
 
@@ -790,6 +1184,7 @@ class Schema (object):
 
         return self
 
+    @_mutates_model
     def create_table(self, table_def):
         """Add a new table to this schema in the remote database based on table_def.
 
@@ -811,6 +1206,7 @@ class Schema (object):
         self.model.digest_fkeys()
         return newtable
 
+    @_mutates_model
     def drop(self, cascade=False, update_mappings=UpdateMappings.no_update):
         """Remove this schema from the remote database.
 
@@ -853,13 +1249,18 @@ class Schema (object):
     
 
 class KeyedList (list):
-    """Keyed list."""
+    """Keyed list.
+
+       The version attribute is incremented whenever an element is
+       appended or deleted, so that derived indexes can detect changes.
+    """
     def __init__(self, l):
         list.__init__(self, l)
         self.elements = {
             e.name: e
             for e in l
         }
+        self.version = 0
 
     def __getitem__(self, idx):
         """Get element by key or by list index or slice."""
@@ -874,15 +1275,18 @@ class KeyedList (list):
             victim = list.__getitem__(self, idx)
             list.__delitem__(self, idx)
             del self.elements[victim.name]
+            self.version += 1
         elif isinstance(idx, slice):
             victims = [list.__getitem__(self, idx)]
             list.__delslice__(self, idx)
             for victim in victims:
                 del self.elements[victim.name]
+            self.version += 1
         else:
             victim = self.elements[idx]
             list.__delitem__(self, self.index(victim))
             del self.elements[victim.name]
+            self.version += 1
 
     def append(self, e):
         """Append element to list and record its key."""
@@ -890,6 +1294,7 @@ class KeyedList (list):
             raise ValueError('Element name %s already exists.' % (e.name,))
         list.append(self, e)
         self.elements[e.name] = e
+        self.version += 1
 
 class FindAssociationResult (object):
     """Wrapper for results of Table.find_associations()"""
@@ -903,14 +1308,23 @@ class FindAssociationResult (object):
 class Table (object):
     """Named table.
     """
+    __slots__ = (
+        'schema', 'name', '_acls', '_acl_bindings', '_annotations', 'comment', 'kind',
+        'column_definitions', 'keys', 'foreign_keys', '_referenced_by', '_constraint_indexes',
+    )
+
     default_key_column_search_order = ["Name", "name", "ID", "id"]
 
+    acls = _container_attribute('_acls', AttrDict)
+    acl_bindings = _container_attribute('_acl_bindings', AttrDict)
+    annotations = _container_attribute('_annotations', dict)
+
     def __init__(self, schema, tname, table_doc):
         self.schema = schema
         self.name = tname
-        self.acls = AttrDict(table_doc.get('acls', {}))
-        self.acl_bindings = AttrDict(table_doc.get('acl_bindings', {}))
-        self.annotations = dict(table_doc.get('annotations', {}))
+        self._acls = _stored_container(table_doc.get('acls'), AttrDict)
+        self._acl_bindings = _stored_container(table_doc.get('acl_bindings'), AttrDict)
+        self._annotations = _stored_container(table_doc.get('annotations'), dict)
         self.comment = table_doc.get('comment')
         self.kind = table_doc.get('kind')
         self.column_definitions = KeyedList([
@@ -925,7 +1339,17 @@ class Table (object):
             ForeignKey(self, fkdoc)
             for fkdoc in table_doc.get('foreign_keys', [])
         ])
-        self.referenced_by = KeyedList([])
+        model = schema.model
+        if model._lazy:
+            # referenced_by is found on demand via the model's fkey index
+            self._referenced_by = None
+            for fkey in list(self.foreign_keys):
+                pk = fkey._referenced_columns_doc[0]
+                if pk['schema_name'] not in model.schemas or pk['table_name'] not in model.schemas[pk['schema_name']].tables:
+                    del self.foreign_keys[fkey.name]
+        else:
+            self._referenced_by = KeyedList([])
+        self._constraint_indexes = {}
 
     def __repr__(self):
         cls = type(self)
@@ -942,6 +1366,22 @@ class Table (object):
         """Sugared access to self.column_definitions"""
         return self.column_definitions
 
+    @property
+    def referenced_by(self):
+        """Foreign keys of this or other tables which reference this table."""
+        if self._referenced_by is None:
+            self._referenced_by = KeyedList([])
+            model = self.schema.model
+            for sname, tname in model._fkey_referrers.get((self.schema.name, self.name), ()):
+                for fkey in list(model.schemas[sname].tables[tname].foreign_keys):
+                    if fkey._referenced_columns is None:
+                        pk = fkey._referenced_columns_doc[0]
+                        if (pk['schema_name'], pk['table_name']) == (self.schema.name, self.name):
+                            fkey._digest_lazily()
+                    elif fkey._pk_table is self:
+                        self._referenced_by.append(fkey)
+        return self._referenced_by
+
     @property
     def catalog(self):
         return self.schema.model.catalog
@@ -1712,9 +2152,9 @@ class Table (object):
         return {
             "schema_name": self.schema.name,
             "table_name": self.name,
-            "acls": self.acls,
-            "acl_bindings": self.acl_bindings,
-            "annotations": self.annotations,
+            "acls": _peek_container(self._acls, AttrDict),
+            "acl_bindings": _peek_container(self._acl_bindings, AttrDict),
+            "annotations": _peek_container(self._annotations, dict),
             "comment": self.comment,
 
             "column_definitions": [
@@ -1753,15 +2193,24 @@ class Table (object):
         for fkey in self.foreign_keys:
             fkey.clear(clear_comment=clear_comment, clear_annotations=clear_annotations, clear_acls=clear_acls, clear_acl_bindings=clear_acl_bindings)
 
-    def apply(self, existing=None):
+    def apply(self, existing=None, workers=DEFAULT_APPLY_WORKERS, retries=DEFAULT_APPLY_RETRIES):
         """Apply configuration to corresponding table in catalog unless existing already matches.
 
         :param existing: An instance comparable to self, or None to apply configuration unconditionally.
+        :param workers: Maximum number of changes sent concurrently (default DEFAULT_APPLY_WORKERS).
+        :param retries: Maximum number of retries of a change after a transient failure (default DEFAULT_APPLY_RETRIES).
 
         The state of self.comment, self.annotations, self.acls, and
         self.acl_bindings will be applied to the server unless they
         match their corresponding state in existing.
+
+        Changes are planned as a whole by ApplyPlan before any is
+        sent. Returns the executed ApplyPlan.
         """
+        return ApplyPlan(self, existing).execute(workers=workers, retries=retries)
+
+    def _config_changes(self, existing):
+        """Return dict of configuration changes needed for existing to match self, or all configuration if existing is None."""
         changes = {}
         if existing is None or not equivalent(self.comment, existing.comment):
             changes['comment'] = self.comment
@@ -1771,16 +2220,18 @@ class Table (object):
             changes['acls'] = self.acls
         if existing is None or not equivalent(self.acl_bindings, existing.acl_bindings, method='acl_bindings'):
             changes['acl_bindings'] = self.acl_bindings
-        if changes:
-            # use alter method to reduce number of web requests
-            self.alter(**changes)
+        return changes
+
+    def _config_children(self, existing):
+        """Yield (child, existing child) pairs of configurable elements within self."""
         for col in self.column_definitions:
-            col.apply(existing.column_definitions[col.name] if existing else None)
+            yield col, existing.column_definitions[col.name] if existing else None
         for key in self.keys:
-            key.apply(existing.keys[key.name_in_model(existing.schema.model)] if existing else None)
+            yield key, existing.keys[key.name_in_model(existing.schema.model)] if existing else None
         for fkey in self.foreign_keys:
-            fkey.apply(existing.foreign_keys[fkey.name_in_model(existing.schema.model)] if existing else None)
+            yield fkey, existing.foreign_keys[fkey.name_in_model(existing.schema.model)] if existing else None
 
+    @_mutates_model
     def alter(
             self,
             schema_name=nochange,
@@ -1873,6 +2324,7 @@ class Table (object):
             return self.column_definitions[column]
         raise ValueError('value %s does not name a defined column in this table' % (column,))
 
+    @_mutates_model
     def _create_table_part(self, subapi, registerfunc, constructor, doc):
         r = self.catalog.post(
             '%s/%s' % (self.uri_path, subapi),
@@ -1951,6 +2403,7 @@ class Table (object):
         fkeys = [ self.create_fkey(fkdef) for fkdef in fkdefs ]
         return cols, fkeys[0]
 
+    @_mutates_model
     def drop(self, cascade=False, update_mappings=UpdateMappings.no_update):
         """Remove this table from the remote database.
 
@@ -1975,6 +2428,22 @@ class Table (object):
             if update_mappings == UpdateMappings.immediate:
                 self.schema.model.apply()
 
+    def _constraint_index(self, name, constraints, fingerprint):
+        """Return dict mapping fingerprint(constraint) to list of matching constraints in list order.
+
+        The index is cached under name and rebuilt only after
+        constraints is changed, e.g. by create_key(), create_fkey(),
+        or drop() of a key, foreign key, or column.
+        """
+        cached = self._constraint_indexes.get(name)
+        if cached is not None and cached[0] is constraints and cached[1] == constraints.version:
+            return cached[2]
+        index = {}
+        for constraint in constraints:
+            index.setdefault(fingerprint(constraint), []).append(constraint)
+        self._constraint_indexes[name] = (constraints, constraints.version, index)
+        return index
+
     def key_by_columns(self, unique_columns, raise_nomatch=True):
         """Return key from self.keys with matching unique columns.
 
@@ -1982,9 +2451,10 @@ class Table (object):
         raise_nomatch: for True, raise KeyError on non-match, else return None
         """
         cset = { self._own_column(c) for c in unique_columns }
-        for key in self.keys:
-            if cset == { c for c in key.unique_columns }:
-                return key
+        index = self._constraint_index('keys', self.keys, lambda key: frozenset(key.unique_columns))
+        keys = index.get(frozenset(cset))
+        if keys:
+            return keys[0]
         if raise_nomatch:
             raise KeyError(cset)
 
@@ -1998,12 +2468,14 @@ class Table (object):
         cset = { self._own_column(c) for c in from_columns }
         if not cset:
             raise ValueError('from_columns must be non-empty')
-        to_table = None
-        for fkey in self.foreign_keys:
-            fkey_cset = set(fkey.foreign_key_columns)
-            if cset == fkey_cset or partial and cset.issubset(fkey_cset):
-                raise_nomatch = False
-                yield fkey
+        if partial:
+            fkeys = [ fkey for fkey in self.foreign_keys if cset.issubset(fkey.foreign_key_columns) ]
+        else:
+            index = self._constraint_index('fkeys', self.foreign_keys, lambda fkey: frozenset(fkey.foreign_key_columns))
+            fkeys = index.get(frozenset(cset), [])
+        for fkey in fkeys:
+            raise_nomatch = False
+            yield fkey
         if raise_nomatch:
             raise KeyError(cset)
 
@@ -2025,9 +2497,14 @@ class Table (object):
                 to_table = c.table
             elif to_table is not c.table:
                 raise ValueError('to-columns must all be part of same table')
-        for fkey in self.foreign_keys:
-            if colmap == fkey.column_map:
-                return fkey
+        if self.schema.model._lazy:
+            # digest referenced columns first, which may drop dangling fkeys
+            for fkey in list(self.foreign_keys):
+                fkey.referenced_columns
+        index = self._constraint_index('fkey_maps', self.foreign_keys, lambda fkey: frozenset(fkey.column_map.items()))
+        fkeys = index.get(frozenset(colmap.items()))
+        if fkeys:
+            return fkeys[0]
         if raise_nomatch:
             raise KeyError(from_to_map)
 
@@ -2073,6 +2550,27 @@ class Table (object):
         These tests ignore the five ERMrest system columns and any
         corresponding constraints.
 
+        Except in a lazily constructed model, answers are memoized in
+        the model's SchemaGraph.
+
+        """
+        criteria = (min_arity, max_arity, unqualified, pure, no_overlap)
+        if self.schema.model._lazy:
+            fkeys = self._association_fkeys(*criteria)
+        else:
+            fkeys = self.schema.model.schema_graph().association_fkeys(self, *criteria)
+        if not fkeys:
+            return False
+        # return (truthy) arity or fkeys
+        if return_fkeys:
+            return set(fkeys)
+        else:
+            return len(fkeys)
+
+    def _association_fkeys(self, min_arity, max_arity, unqualified, pure, no_overlap):
+        """Return frozenset of associated fkeys if self is a matching association, else None.
+
+        See is_association() for the meaning of the arguments.
         """
         if min_arity < 2:
             raise ValueError('An assocation cannot have arity < 2')
@@ -2095,7 +2593,7 @@ class Table (object):
 
         if not non_sys_key_colsets:
             # reject: not association
-            return False
+            return None
 
         # choose longest compound key (arbitrary choice with ties!)
         row_key = sorted(non_sys_key_colsets, key=lambda s: len(s), reverse=True)[0]
@@ -2108,31 +2606,27 @@ class Table (object):
 
         if len(covered_fkeys) < min_arity:
             # reject: not enough fkeys in association
-            return False
+            return None
         elif max_arity is not None and len(covered_fkeys) > max_arity:
             # reject: too many fkeys in association
-            return False
+            return None
 
         for fkey in covered_fkeys:
             fkcols = set(fkey.foreign_key_columns)
             if no_overlap and fkcols.intersection(covered_fkey_cols):
                 # reject: overlapping fkeys in association
-                return False
+                return None
             covered_fkey_cols.update(fkcols)
 
         if unqualified and row_key.difference(covered_fkey_cols):
             # reject: qualified association
-            return False
+            return None
 
         if pure and non_sys_cols.difference(row_key):
             # reject: impure association
-            return False
+            return None
 
-        # return (truthy) arity or fkeys
-        if return_fkeys:
-            return covered_fkeys
-        else:
-            return len(covered_fkeys)
+        return frozenset(covered_fkeys)
 
     def find_associations(self, min_arity=2, max_arity=2, unqualified=True, pure=True, no_overlap=True) -> Iterable[FindAssociationResult]:
         """Yield (iterable) Association objects linking to this table and meeting all criteria.
@@ -2279,15 +2773,170 @@ def find_tables_with_foreign_keys(target_tables: Iterable[Table], quantifier: Qu
             candidates.update(referring)
     return candidates
 
+class JoinEdge (namedtuple('JoinEdge', 'fkey outbound')):
+    """One hop of a join path through a SchemaGraph.
+
+       :param fkey: the ForeignKey joining the two tables
+       :param outbound: True to join from fkey.table to fkey.pk_table, False to join in reverse
+    """
+    __slots__ = ()
+
+    @property
+    def source(self):
+        """Table joined from."""
+        return self.fkey.table if self.outbound else self.fkey.pk_table
+
+    @property
+    def target(self):
+        """Table joined to."""
+        return self.fkey.pk_table if self.outbound else self.fkey.table
+
+class SchemaGraph (object):
+    """Graph of the tables of a model, joined by foreign keys.
+
+       :param model: the Model to index
+
+       Each foreign key is an edge which may be traversed outbound,
+       from the referring table to the referenced table, or inbound.
+       Join paths between tables are found by breadth-first search
+       over an adjacency index built once in linear time. Association
+       tests by Table.is_association() are memoized here.
+
+       Use Model.schema_graph() to get the current graph of a model,
+       which is rebuilt after the model is changed.
+    """
+    def __init__(self, model):
+        self.model = model
+        self._edges = {}
+        self._associations = {}
+        for schema in model.schemas.values():
+            for table in schema.tables.values():
+                self._edges.setdefault(table, [])
+                for fkey in table.foreign_keys:
+                    self._edges[table].append(JoinEdge(fkey, True))
+                    self._edges.setdefault(fkey.pk_table, []).append(JoinEdge(fkey, False))
+
+    def __repr__(self):
+        return "<%s of %d tables>" % (type(self).__name__, len(self._edges))
+
+    def __len__(self):
+        return len(self._edges)
+
+    def _check_table(self, table):
+        if table not in self._edges:
+            raise ValueError('Table %s is not part of the graph model.' % (table,))
+
+    def edges(self, table):
+        """Return list of JoinEdge instances from table, outbound foreign keys first."""
+        self._check_table(table)
+        return list(self._edges[table])
+
+    def association_fkeys(self, table, min_arity=2, max_arity=2, unqualified=True, pure=True, no_overlap=True):
+        """Return frozenset of associated fkeys if table is a matching association, else None.
+
+        See Table.is_association() for the meaning of the arguments.
+        """
+        cache_key = (table, min_arity, max_arity, unqualified, pure, no_overlap)
+        if cache_key not in self._associations:
+            self._associations[cache_key] = table._association_fkeys(min_arity, max_arity, unqualified, pure, no_overlap)
+        return self._associations[cache_key]
+
+    def _search(self, source, target, banned_tables=(), banned_edges=(), max_hops=None):
+        """Return shortest list of JoinEdges from source to target avoiding banned tables and edges, or None."""
+        if source is target:
+            return []
+        parents = {source: None}
+        frontier = [source]
+        hops = 0
+        while frontier and (max_hops is None or hops < max_hops):
+            hops += 1
+            next_frontier = []
+            for table in frontier:
+                for edge in self._edges[table]:
+                    child = edge.target
+                    if child in parents or child in banned_tables or edge in banned_edges:
+                        continue
+                    parents[child] = edge
+                    if child is target:
+                        path = []
+                        while edge is not None:
+                            path.append(edge)
+                            edge = parents[edge.source]
+                        path.reverse()
+                        return path
+                    next_frontier.append(child)
+            frontier = next_frontier
+        return None
+
+    def shortest_path(self, source, target, max_hops=None):
+        """Return a shortest join path from source to target table as a list of JoinEdges, or None.
+
+        :param source: the Table to join from
+        :param target: the Table to join to
+        :param max_hops: maximum number of joins in the path or None (default) for no limit
+
+        Ties between paths of equal length are broken by model order.
+        """
+        self._check_table(source)
+        self._check_table(target)
+        return self._search(source, target, max_hops=max_hops)
+
+    def shortest_paths(self, source, target, k=3, max_hops=None):
+        """Return list of up to k shortest join paths from source to target table, in order of length.
+
+        :param source: the Table to join from
+        :param target: the Table to join to
+        :param k: maximum number of paths to return
+        :param max_hops: maximum number of joins in each path or None (default) for no limit
+
+        Each path is a list of JoinEdges which visits no table twice.
+        Paths through different foreign keys between the same tables
+        are distinct. Uses Yen's algorithm, with one breadth-first
+        search per hop of each path found.
+        """
+        first = self.shortest_path(source, target, max_hops=max_hops)
+        if first is None or k < 1:
+            return []
+        paths = [first]
+        seen = {tuple(first)}
+        candidates = []
+        counter = itertools.count()
+        while len(paths) < k:
+            previous = paths[-1]
+            for i in range(len(previous)):
+                root = previous[0:i]
+                spur_table = previous[i].source
+                banned_edges = { path[i] for path in paths if len(path) > i and path[0:i] == root }
+                banned_tables = { edge.source for edge in root }
+                spur = self._search(
+                    spur_table, target, banned_tables, banned_edges,
+                    None if max_hops is None else max_hops - i
+                )
+                if spur is not None:
+                    path = root + spur
+                    if tuple(path) not in seen:
+                        seen.add(tuple(path))
+                        heapq.heappush(candidates, (len(path), next(counter), path))
+            if not candidates:
+                break
+            paths.append(heapq.heappop(candidates)[2])
+        return paths
+
 class Column (object):
     """Named column.
     """
+    __slots__ = ('table', 'name', '_acls', '_acl_bindings', '_annotations', 'comment', 'type', 'nullok', 'default')
+
+    acls = _container_attribute('_acls', AttrDict)
+    acl_bindings = _container_attribute('_acl_bindings', AttrDict)
+    annotations = _container_attribute('_annotations', dict)
+
     def __init__(self, table, column_doc):
         self.table = table
         self.name = column_doc['name']
-        self.acls = AttrDict(column_doc.get('acls', {}))
-        self.acl_bindings = AttrDict(column_doc.get('acl_bindings', {}))
-        self.annotations = dict(column_doc.get('annotations', {}))
+        self._acls = _stored_container(column_doc.get('acls'), AttrDict)
+        self._acl_bindings = _stored_container(column_doc.get('acl_bindings'), AttrDict)
+        self._annotations = _stored_container(column_doc.get('annotations'), dict)
         self.comment = column_doc.get('comment')
         self.type = make_type(column_doc['type'])
         self.nullok = bool(column_doc.get('nullok', True))
@@ -2325,9 +2974,9 @@ class Column (object):
         """Produce a representation of configuration as generic Python data structures"""
         return {
             "name": self.name,
-            "acls": self.acls,
-            "acl_bindings": self.acl_bindings,
-            "annotations": self.annotations,
+            "acls": _peek_container(self._acls, AttrDict),
+            "acl_bindings": _peek_container(self._acl_bindings, AttrDict),
+            "annotations": _peek_container(self._annotations, dict),
             "comment": self.comment,
             "type": self.type.prejson(prune),
             "nullok": self.nullok,
@@ -2368,15 +3017,24 @@ class Column (object):
         if clear_comment:
             self.comment = None
 
-    def apply(self, existing=None):
+    def apply(self, existing=None, workers=DEFAULT_APPLY_WORKERS, retries=DEFAULT_APPLY_RETRIES):
         """Apply configuration to corresponding column in catalog unless existing already matches.
 
         :param existing: An instance comparable to self, or None to apply configuration unconditionally.
+        :param workers: Maximum number of changes sent concurrently (default DEFAULT_APPLY_WORKERS).
+        :param retries: Maximum number of retries of a change after a transient failure (default DEFAULT_APPLY_RETRIES).
 
         The state of self.comment, self.annotations, self.acls, and
         self.acl_bindings will be applied to the server unless they
         match their corresponding state in existing.
+
+        Changes are planned as a whole by ApplyPlan before any is
+        sent. Returns the executed ApplyPlan.
         """
+        return ApplyPlan(self, existing).execute(workers=workers, retries=retries)
+
+    def _config_changes(self, existing):
+        """Return dict of configuration changes needed for existing to match self, or all configuration if existing is None."""
         changes = {}
         if existing is None or not equivalent(self.comment, existing.comment):
             changes['comment'] = self.comment
@@ -2386,10 +3044,13 @@ class Column (object):
             changes['acls'] = self.acls
         if existing is None or not equivalent(self.acl_bindings, existing.acl_bindings, method='acl_bindings'):
             changes['acl_bindings'] = self.acl_bindings
-        if changes:
-            # use alter method to reduce number of web requests
-            self.alter(**changes)
+        return changes
+
+    def _config_children(self, existing):
+        """Yield (child, existing child) pairs of configurable elements within self."""
+        return ()
 
+    @_mutates_model
     def alter(
             self,
             name=nochange,
@@ -2474,6 +3135,7 @@ class Column (object):
 
         return self
 
+    @_mutates_model
     def drop(self, cascade=False, update_mappings=UpdateMappings.no_update):
         """Remove this column from the remote database.
 
@@ -2557,9 +3219,13 @@ def _constraint_name_parts(constraint, doc):
 class Key (object):
     """Named key.
     """
+    __slots__ = ('table', '_annotations', 'comment', 'constraint_schema', 'constraint_name', 'unique_columns')
+
+    annotations = _container_attribute('_annotations', dict)
+
     def __init__(self, table, key_doc):
         self.table = table
-        self.annotations = dict(key_doc.get('annotations', {}))
+        self._annotations = _stored_container(key_doc.get('annotations'), dict)
         self.comment = key_doc.get('comment')
         try:
             self.constraint_schema, self.constraint_name = _constraint_name_parts(self, key_doc)
@@ -2623,7 +3289,7 @@ class Key (object):
     def prejson(self, prune=True):
         """Produce a representation of configuration as generic Python data structures"""
         return {
-            'annotations': self.annotations,
+            'annotations': _peek_container(self._annotations, dict),
             'comment': self.comment,
             'unique_columns': [
                 c.name
@@ -2675,24 +3341,36 @@ class Key (object):
         if clear_comment:
             self.comment = None
 
-    def apply(self, existing=None):
+    def apply(self, existing=None, workers=DEFAULT_APPLY_WORKERS, retries=DEFAULT_APPLY_RETRIES):
         """Apply configuration to corresponding key in catalog unless existing already matches.
 
         :param existing: An instance comparable to self, or None to apply configuration unconditionally.
+        :param workers: Maximum number of changes sent concurrently (default DEFAULT_APPLY_WORKERS).
+        :param retries: Maximum number of retries of a change after a transient failure (default DEFAULT_APPLY_RETRIES).
 
         The state of self.comment and self.annotations will be applied
         to the server unless they match their corresponding state in
         existing.
+
+        Changes are planned as a whole by ApplyPlan before any is
+        sent. Returns the executed ApplyPlan.
         """
+        return ApplyPlan(self, existing).execute(workers=workers, retries=retries)
+
+    def _config_changes(self, existing):
+        """Return dict of configuration changes needed for existing to match self, or all configuration if existing is None."""
         changes = {}
         if existing is None or not equivalent(self.comment, existing.comment):
             changes['comment'] = self.comment
         if existing is None or not equivalent(self.annotations, existing.annotations):
             changes['annotations'] = self.annotations
-        if changes:
-            # use alter method to reduce number of web requests
-            self.alter(**changes)
+        return changes
 
+    def _config_children(self, existing):
+        """Yield (child, existing child) pairs of configurable elements within self."""
+        return ()
+
+    @_mutates_model
     def alter(
             self,
             constraint_name=nochange,
@@ -2742,6 +3420,7 @@ class Key (object):
 
         return self
 
+    @_mutates_model
     def drop(self, cascade=False, update_mappings=UpdateMappings.no_update):
         """Remove this key from the remote database.
 
@@ -2773,12 +3452,21 @@ class Key (object):
 class ForeignKey (object):
     """Named foreign key.
     """
+    __slots__ = (
+        'table', '_pk_table', '_acls', '_acl_bindings', '_annotations', 'comment', 'on_delete', 'on_update',
+        'constraint_schema', 'constraint_name', 'foreign_key_columns', '_referenced_columns_doc', '_referenced_columns',
+    )
+
+    acls = _container_attribute('_acls', AttrDict)
+    acl_bindings = _container_attribute('_acl_bindings', AttrDict)
+    annotations = _container_attribute('_annotations', dict)
+
     def __init__(self, table, fkey_doc):
         self.table = table
-        self.pk_table = None
-        self.acls = AttrDict(fkey_doc.get('acls', {}))
-        self.acl_bindings = AttrDict(fkey_doc.get('acl_bindings', {}))
-        self.annotations = dict(fkey_doc.get('annotations', {}))
+        self._pk_table = None
+        self._acls = _stored_container(fkey_doc.get('acls'), AttrDict)
+        self._acl_bindings = _stored_container(fkey_doc.get('acl_bindings'), AttrDict)
+        self._annotations = _stored_container(fkey_doc.get('annotations'), dict)
         self.comment = fkey_doc.get('comment')
         self.on_delete = fkey_doc.get('on_delete')
         self.on_update = fkey_doc.get('on_update')
@@ -2795,7 +3483,7 @@ class ForeignKey (object):
             for coldoc in fkey_doc['foreign_key_columns']
         ])
         self._referenced_columns_doc = fkey_doc['referenced_columns']
-        self.referenced_columns = None
+        self._referenced_columns = None
 
     def __repr__(self):
         cls = type(self)
@@ -2807,18 +3495,42 @@ class ForeignKey (object):
             id(self),
         )
 
+    @property
+    def pk_table(self):
+        """The table referenced by this foreign key."""
+        if self._referenced_columns is None and self.table.schema.model._lazy:
+            self._digest_lazily()
+        return self._pk_table
+
+    @property
+    def referenced_columns(self):
+        """The columns of pk_table referenced by this foreign key."""
+        if self._referenced_columns is None and self.table.schema.model._lazy:
+            self._digest_lazily()
+        return self._referenced_columns
+
+    def _digest_lazily(self):
+        """Digest referenced columns on demand in a lazily constructed model, dropping a dangling foreign key."""
+        try:
+            self.digest_referenced_columns(self.table.schema.model)
+        except KeyError:
+            del self.table.foreign_keys[self.name]
+
     def digest_referenced_columns(self, model):
         """Finish construction deferred until model is known with all tables."""
-        if self.referenced_columns is None:
+        if self._referenced_columns is None:
             pk_sname = self._referenced_columns_doc[0]['schema_name']
             pk_tname = self._referenced_columns_doc[0]['table_name']
-            self.pk_table = model.schemas[pk_sname].tables[pk_tname]
-            self.referenced_columns = KeyedList([
-                self.pk_table.column_definitions[coldoc['column_name']]
+            pk_table = model.schemas[pk_sname].tables[pk_tname]
+            self._referenced_columns = KeyedList([
+                pk_table.column_definitions[coldoc['column_name']]
                 for coldoc in self._referenced_columns_doc
             ])
+            self._pk_table = pk_table
             self._referenced_columns_doc = None
-            self.pk_table.referenced_by.append(self)
+            if pk_table._referenced_by is not None:
+                # otherwise, pk_table.referenced_by will find this fkey when first accessed
+                pk_table._referenced_by.append(self)
             # HACK: clean up schema qualification for psuedo constraint
             # this may happen only with SQL views in the ermrest catalog
             if self.pk_table.kind != 'table' and self.constraint_name in self.table.schema._fkeys:
@@ -2881,9 +3593,9 @@ class ForeignKey (object):
     def prejson(self, prune=True):
         """Produce a representation of configuration as generic Python data structures"""
         return {
-            'acls': self.acls,
-            'acl_bindings': self.acl_bindings,
-            'annotations': self.annotations,
+            'acls': _peek_container(self._acls, AttrDict),
+            'acl_bindings': _peek_container(self._acl_bindings, AttrDict),
+            'annotations': _peek_container(self._annotations, dict),
             'comment': self.comment,
             'foreign_key_columns': [
                 c.prejson_colref()
@@ -2975,15 +3687,24 @@ class ForeignKey (object):
         if clear_comment:
             self.comment = None
 
-    def apply(self, existing=None):
+    def apply(self, existing=None, workers=DEFAULT_APPLY_WORKERS, retries=DEFAULT_APPLY_RETRIES):
         """Apply configuration to corresponding foreign key in catalog unless existing already matches.
 
         :param existing: An instance comparable to self, or None to apply configuration unconditionally.
+        :param workers: Maximum number of changes sent concurrently (default DEFAULT_APPLY_WORKERS).
+        :param retries: Maximum number of retries of a change after a transient failure (default DEFAULT_APPLY_RETRIES).
 
         The state of self.comment, self.annotations, self.acls, and
         self.acl_bindings will be applied to the server unless they
         match their corresponding state in existing.
+
+        Changes are planned as a whole by ApplyPlan before any is
+        sent. Returns the executed ApplyPlan.
         """
+        return ApplyPlan(self, existing).execute(workers=workers, retries=retries)
+
+    def _config_changes(self, existing):
+        """Return dict of configuration changes needed for existing to match self, or all configuration if existing is None."""
         changes = {}
         if existing is None or not equivalent(self.comment, existing.comment):
             changes['comment'] = self.comment
@@ -2993,10 +3714,13 @@ class ForeignKey (object):
             changes['acls'] = self.acls
         if existing is None or not equivalent(self.acl_bindings, existing.acl_bindings, method='acl_bindings'):
             changes['acl_bindings'] = self.acl_bindings
-        if changes:
-            # use alter method to reduce number of web requests
-            self.alter(**changes)
+        return changes
 
+    def _config_children(self, existing):
+        """Yield (child, existing child) pairs of configurable elements within self."""
+        return ()
+
+    @_mutates_model
     def alter(
             self,
             constraint_name=nochange,
@@ -3080,6 +3804,7 @@ class ForeignKey (object):
 
         return self
 
+    @_mutates_model
     def drop(self, update_mappings=UpdateMappings.no_update):
         """Remove this foreign key from the remote database.
 
@@ -3108,18 +3833,37 @@ class ForeignKey (object):
     @object_annotation(tag.foreign_key)
     def foreign_key(self): pass
 
+_interned_types = weakref.WeakValueDictionary()
+
+def _type_key(type_doc):
+    if type_doc.get('is_domain', False) or type_doc.get('is_array', False):
+        return (type_doc['typename'], bool(type_doc.get('is_domain', False)), _type_key(type_doc['base_type']))
+    return type_doc['typename']
+
 def make_type(type_doc):
-    """Create instance of Type, DomainType, or ArrayType as appropriate for type_doc."""
-    if type_doc.get('is_domain', False):
-        return DomainType(type_doc)
-    elif type_doc.get('is_array', False):
-        return ArrayType(type_doc)
-    else:
-        return Type(type_doc)
+    """Create instance of Type, DomainType, or ArrayType as appropriate for type_doc.
+
+       Type instances are never modified, so one instance is shared by
+       all columns with equivalent type_doc, for as long as any column
+       still refers to it.
+    """
+    key = _type_key(type_doc)
+    t = _interned_types.get(key)
+    if t is None:
+        if type_doc.get('is_domain', False):
+            t = DomainType(type_doc)
+        elif type_doc.get('is_array', False):
+            t = ArrayType(type_doc)
+        else:
+            t = Type(type_doc)
+        t = _interned_types.setdefault(key, t)
+    return t
 
 class Type (object):
     """Named type.
     """
+    __slots__ = ('typename', 'is_domain', 'is_array', '__weakref__')
+
     def __init__(self, type_doc):
         self.typename = type_doc['typename']
         self.is_domain = False
@@ -3150,6 +3894,8 @@ class Type (object):
 class DomainType (Type):
     """Named domain type.
     """
+    __slots__ = ('base_type',)
+
     def __init__(self, type_doc):
         super(DomainType, self).__init__(type_doc)
         self.is_domain = True
@@ -3170,6 +3916,8 @@ class DomainType (Type):
 class ArrayType (Type):
     """Named domain type.
     """
+    __slots__ = ('base_type',)
+
     def __init__(self, type_doc):
         super(ArrayType, self).__init__(type_doc)
         is_array = True
@@ -3242,3 +3990,7 @@ builtin_types.update(
         for typename in [ 'serial2', 'serial4', 'serial8' ]
     }
 )
+_interned_types.update({
+    _type_key(t.prejson()): t
+    for t in builtin_types.values()
+})
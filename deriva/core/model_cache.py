@@ -0,0 +1,162 @@
+"""Persistent cache of catalog model documents for fast Model construction.
+"""
+import os
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from . import DEFAULT_CONFIG_PATH, make_dirs, format_exception
+from .utils.json_utils import response_json
+from . import ermrest_model
+
+DEFAULT_MODEL_CACHE_DIR = os.path.join(DEFAULT_CONFIG_PATH, 'cache', 'models')
+DEFAULT_MODEL_CACHE_MAX_ENTRIES = 64
+MODEL_CACHE_FORMAT = 1
+
+
+class ModelCache (object):
+    """Cache of catalog /schema documents keyed by catalog URI and validated by ETag or snaptime.
+
+    A catalog snapshot binding (which has a snaptime) is immutable, so
+    a cached model document for it is used without any request. For
+    other catalog bindings, the cached document is revalidated with one
+    conditional GET of /schema, and a 304 Not Modified response means
+    the cached document is used instead of transferring and parsing
+    the whole model again.
+
+    Documents are stored as pickles, which load faster than JSON can
+    be parsed, in a process-wide in-memory tier and optionally written
+    through to files in a directory so that later processes can start
+    warm. A fresh Model is built from the document on every call,
+    since callers may mutate the returned Model.
+
+    The digested Model object graph itself is not cached: unpickling
+    it is slower than building it from the document.
+
+    As with DiskResponseCache, a cached model reflects the privileges
+    of the client which retrieved it, so a cache directory should not
+    be shared between different user identities. The directory is
+    created with owner-only permissions.
+    """
+
+    def __init__(self, path=DEFAULT_MODEL_CACHE_DIR, max_entries=DEFAULT_MODEL_CACHE_MAX_ENTRIES):
+        """Create a model cache.
+
+        :param path: Directory for cache files, or None to cache in memory only.
+        :param max_entries: Maximum number of documents retained in memory and on disk.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'revalidated': 0, 'misses': 0}
+        if path:
+            make_dirs(path, mode=0o700)
+
+    def stats(self):
+        """Return a dict of cache counters."""
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries))
+
+    def clear(self):
+        """Discard all cached documents, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            if self.path:
+                for fname in os.listdir(self.path):
+                    if fname.endswith('.pickle'):
+                        os.remove(os.path.join(self.path, fname))
+
+    def _filename(self, uri):
+        return os.path.join(self.path, hashlib.sha256(uri.encode('utf-8')).hexdigest() + '.pickle')
+
+    def _load(self, uri):
+        """Return (etag, blob) for uri, or None."""
+        with self._lock:
+            entry = self._entries.get(uri)
+            if entry is not None:
+                self._entries.move_to_end(uri)
+                return entry
+        if not self.path:
+            return None
+        try:
+            with open(self._filename(uri), 'rb') as f:
+                fmt, cached_uri, etag, blob = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.debug("Ignoring unreadable model cache entry for %s: %s" % (uri, format_exception(e)))
+            return None
+        if fmt != MODEL_CACHE_FORMAT or cached_uri != uri:
+            return None
+        self._remember(uri, (etag, blob))
+        return etag, blob
+
+    def _remember(self, uri, entry):
+        with self._lock:
+            self._entries[uri] = entry
+            self._entries.move_to_end(uri)
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _store(self, uri, etag, doc):
+        blob = pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(uri, (etag, blob))
+        if not self.path:
+            return
+        fname = self._filename(uri)
+        tmpname = "%s.%d.%d.tmp" % (fname, os.getpid(), threading.get_ident())
+        try:
+            with open(os.open(tmpname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                pickle.dump((MODEL_CACHE_FORMAT, uri, etag, blob), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, fname)
+            self._prune()
+        except OSError as e:
+            logging.warning("Unable to write model cache entry for %s: %s" % (uri, format_exception(e)))
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def _prune(self):
+        if self.max_entries is None:
+            return
+        files = [os.path.join(self.path, fname) for fname in os.listdir(self.path) if fname.endswith('.pickle')]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=lambda fname: os.path.getmtime(fname))
+        for fname in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+
+    def get_document(self, catalog):
+        """Return the model document of catalog, from the cache if it is still current."""
+        uri = catalog.get_server_uri()
+        entry = self._load(uri)
+        snaptime = getattr(catalog, 'snaptime', None)
+        if entry is not None and snaptime is not None:
+            with self._lock:
+                self._counters['hits'] += 1
+            return pickle.loads(entry[1])
+        headers = {'If-None-Match': entry[0]} if entry is not None and entry[0] else {}
+        r = catalog.get('/schema', headers=headers, cache=False)
+        if r.status_code == 304 and entry is not None:
+            with self._lock:
+                self._counters['revalidated'] += 1
+            return pickle.loads(entry[1])
+        with self._lock:
+            self._counters['misses'] += 1
+        doc = response_json(r)
+        etag = r.headers.get('etag')
+        if etag or snaptime is not None:
+            self._store(uri, etag, doc)
+        return doc
+
+    def get_model(self, catalog, lazy=False):
+        """Return a new Model of catalog built from its (possibly cached) model document.
+
+        :param lazy: construct schemas and tables only when first accessed (default False)
+        """
+        return ermrest_model.Model(catalog, self.get_document(catalog), lazy=lazy)
@@ -0,0 +1,341 @@
+"""Structural differences between catalog models, as patches which can be applied to another catalog.
+
+diff(old, new) compares two ermrest_model.Model instances (e.g. of two
+catalogs, or of two snapshots of one catalog) and returns a ModelPatch:
+an ordered list of typed ModelOp operations which would transform a
+catalog like old into one like new. A patch may be serialized with
+prejson(), restored with ModelPatch.fromjson(), and applied to a third
+catalog's model with apply().
+
+Model elements are matched by name, except that keys are matched by
+their set of unique columns and foreign keys by their column mapping,
+so differing constraint names alone are not reported. A renamed
+schema, table, or column is reported as a drop and a create.
+
+Operations and their targets:
+
+  create_schema, drop_schema                 (schema,)
+  create_table, drop_table                   (schema, table)
+  create_column, drop_column, alter_column   (schema, table, 'column', column)
+  create_key, drop_key                       (schema, table, 'key', (column, ...))
+  create_fkey, drop_fkey, alter_fkey         (schema, table, 'foreign_key', (pk_schema, pk_table, ((column, pk_column), ...)))
+  set_comment                                any target except the model ()
+  set_annotation, delete_annotation          any target
+  set_acl, delete_acl                        any target except keys
+  set_acl_binding, delete_acl_binding        tables, columns, and foreign keys
+"""
+from collections import namedtuple
+
+from .ermrest_model import Model, Schema, Table, Column, Key, ForeignKey, ModelChange, ApplyPlan, equivalent, \
+    make_type, DEFAULT_APPLY_WORKERS
+
+_config_fields = {
+    Model: ('annotations', 'acls'),
+    Schema: ('comment', 'annotations', 'acls'),
+    Table: ('comment', 'annotations', 'acls', 'acl_bindings'),
+    Column: ('comment', 'annotations', 'acls', 'acl_bindings'),
+    Key: ('comment', 'annotations'),
+    ForeignKey: ('comment', 'annotations', 'acls', 'acl_bindings'),
+}
+
+_mapping_ops = {
+    'annotations': ('set_annotation', 'delete_annotation'),
+    'acls': ('set_acl', 'delete_acl'),
+    'acl_bindings': ('set_acl_binding', 'delete_acl_binding'),
+}
+
+
+def _freeze(value):
+    """Convert lists (e.g. from a JSON document) to tuples, recursively."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class ModelOp (namedtuple('ModelOp', 'op target value')):
+    """One operation of a ModelPatch.
+
+    :param op: the operation name, e.g. 'create_table' or 'set_annotation'
+    :param target: tuple addressing the model element, see resolve()
+    :param value: definition document, changed fields, or {'name': ..., 'value': ...} for the operation
+    """
+    __slots__ = ()
+
+    def prejson(self):
+        """Produce a representation of the operation as generic Python data structures"""
+        return {'op': self.op, 'target': self.target, 'value': self.value}
+
+    @classmethod
+    def fromjson(cls, doc):
+        """Restore an operation from its prejson() representation."""
+        return cls(doc['op'], _freeze(doc['target']), doc.get('value'))
+
+
+def target_of(node):
+    """Return the target tuple addressing a model element."""
+    if isinstance(node, Model):
+        return ()
+    elif isinstance(node, Schema):
+        return (node.name,)
+    elif isinstance(node, Table):
+        return (node.schema.name, node.name)
+    elif isinstance(node, Column):
+        return (node.table.schema.name, node.table.name, 'column', node.name)
+    elif isinstance(node, Key):
+        return (node.table.schema.name, node.table.name, 'key', _key_ident(node))
+    elif isinstance(node, ForeignKey):
+        return (node.table.schema.name, node.table.name, 'foreign_key', _fkey_ident(node))
+    raise TypeError('Unexpected model element %r' % (node,))
+
+
+def _key_ident(key):
+    return tuple(sorted(c.name for c in key.unique_columns))
+
+
+def _fkey_ident(fkey):
+    return (
+        fkey.pk_table.schema.name,
+        fkey.pk_table.name,
+        tuple(sorted((from_col.name, to_col.name) for from_col, to_col in fkey.column_map.items())),
+    )
+
+
+def resolve(model, target):
+    """Return the element of model addressed by target, raising KeyError if there is none."""
+    if not target:
+        return model
+    schema = model.schemas[target[0]]
+    if len(target) == 1:
+        return schema
+    table = schema.tables[target[1]]
+    if len(target) == 2:
+        return table
+    kind, ident = target[2], target[3]
+    if kind == 'column':
+        return table.columns[ident]
+    elif kind == 'key':
+        return table.key_by_columns(ident)
+    elif kind == 'foreign_key':
+        pk_sname, pk_tname, pairs = ident
+        pk_table = model.schemas[pk_sname].tables[pk_tname]
+        return table.fkey_by_column_map({from_col: pk_table.columns[to_col] for from_col, to_col in pairs})
+    raise ValueError('Unexpected element kind %r in target %r' % (kind, target))
+
+
+def _equivalent_config(field, old, new):
+    if field == 'acls':
+        if isinstance(old, list) and isinstance(new, list):
+            return sorted(old) == sorted(new)
+        return old == new
+    elif field == 'acl_bindings':
+        return equivalent({'b': old}, {'b': new}, method='acl_bindings')
+    return equivalent(old, new)
+
+
+def _diff_config(old, new, ops):
+    """Append operations changing the configuration of element old to match element new."""
+    target = target_of(new)
+    for field in _config_fields[type(new)]:
+        old_value, new_value = getattr(old, field), getattr(new, field)
+        if field == 'comment':
+            if old_value != new_value:
+                ops.append(ModelOp('set_comment', target, new_value))
+            continue
+        set_op, delete_op = _mapping_ops[field]
+        for name, value in new_value.items():
+            if name not in old_value or not _equivalent_config(field, old_value[name], value):
+                ops.append(ModelOp(set_op, target, {'name': name, 'value': value}))
+        for name in old_value:
+            if name not in new_value:
+                ops.append(ModelOp(delete_op, target, {'name': name}))
+
+
+def diff(old, new):
+    """Return the ModelPatch which transforms a catalog with model old into one with model new.
+
+    The running time is linear in the combined size of the two models.
+    """
+    drops, creates, fkey_creates, config = [], [], [], []
+    _diff_config(old, new, config)
+
+    for sname, old_schema in old.schemas.items():
+        if sname not in new.schemas:
+            for old_table in old_schema.tables.values():
+                drops.extend(ModelOp('drop_fkey', target_of(fkey), None) for fkey in old_table.foreign_keys)
+    for sname, new_schema in new.schemas.items():
+        old_schema = old.schemas.get(sname)
+        if old_schema is None:
+            doc = new_schema.prejson()
+            del doc['tables']
+            creates.append(ModelOp('create_schema', (sname,), doc))
+        else:
+            _diff_config(old_schema, new_schema, config)
+            for tname, old_table in old_schema.tables.items():
+                if tname not in new_schema.tables:
+                    drops.extend(ModelOp('drop_fkey', target_of(fkey), None) for fkey in old_table.foreign_keys)
+        for tname, new_table in new_schema.tables.items():
+            old_table = old_schema.tables.get(tname) if old_schema is not None else None
+            if old_table is None:
+                doc = new_table.prejson()
+                doc.update(kind=new_table.kind, foreign_keys=[])
+                creates.append(ModelOp('create_table', (sname, tname), doc))
+                fkey_creates.extend(ModelOp('create_fkey', target_of(fkey), fkey.prejson()) for fkey in new_table.foreign_keys)
+            else:
+                _diff_table(old_table, new_table, drops, creates, fkey_creates, config)
+
+    # drop constraints before the columns, tables, and schemas they depend on
+    kind_order = {'drop_fkey': 0, 'drop_key': 1, 'drop_column': 2, 'drop_table': 3, 'drop_schema': 4}
+    for sname, old_schema in old.schemas.items():
+        if sname not in new.schemas:
+            drops.extend(ModelOp('drop_table', (sname, tname), None) for tname in old_schema.tables)
+            drops.append(ModelOp('drop_schema', (sname,), None))
+        else:
+            drops.extend(
+                ModelOp('drop_table', (sname, tname), None)
+                for tname in old_schema.tables
+                if tname not in new.schemas[sname].tables
+            )
+    drops.sort(key=lambda op: kind_order[op.op])
+    return ModelPatch(drops + creates + fkey_creates + config)
+
+
+def _diff_table(old_table, new_table, drops, creates, fkey_creates, config):
+    target = target_of(new_table)
+    _diff_config(old_table, new_table, config)
+
+    for cname, new_col in new_table.columns.elements.items():
+        old_col = old_table.columns.elements.get(cname)
+        if old_col is None:
+            creates.append(ModelOp('create_column', target_of(new_col), new_col.prejson()))
+            continue
+        changes = {}
+        if not equivalent(old_col.type.prejson(), new_col.type.prejson()):
+            changes['type'] = new_col.type.prejson()
+        if old_col.nullok != new_col.nullok:
+            changes['nullok'] = new_col.nullok
+        if not equivalent(old_col.default, new_col.default):
+            changes['default'] = new_col.default
+        if changes:
+            creates.append(ModelOp('alter_column', target_of(new_col), changes))
+        _diff_config(old_col, new_col, config)
+    for cname in old_table.columns.elements:
+        if cname not in new_table.columns.elements:
+            drops.append(ModelOp('drop_column', target + ('column', cname), None))
+
+    old_keys = { _key_ident(key): key for key in old_table.keys }
+    for new_key in new_table.keys:
+        old_key = old_keys.pop(_key_ident(new_key), None)
+        if old_key is None:
+            creates.append(ModelOp('create_key', target_of(new_key), new_key.prejson()))
+        else:
+            _diff_config(old_key, new_key, config)
+    drops.extend(ModelOp('drop_key', target + ('key', ident), None) for ident in old_keys)
+
+    old_fkeys = { _fkey_ident(fkey): fkey for fkey in old_table.foreign_keys }
+    for new_fkey in new_table.foreign_keys:
+        old_fkey = old_fkeys.pop(_fkey_ident(new_fkey), None)
+        if old_fkey is None:
+            fkey_creates.append(ModelOp('create_fkey', target_of(new_fkey), new_fkey.prejson()))
+            continue
+        changes = {
+            action: getattr(new_fkey, action)
+            for action in ('on_update', 'on_delete')
+            if getattr(old_fkey, action) != getattr(new_fkey, action)
+        }
+        if changes:
+            fkey_creates.append(ModelOp('alter_fkey', target_of(new_fkey), changes))
+        _diff_config(old_fkey, new_fkey, config)
+    drops.extend(ModelOp('drop_fkey', target + ('foreign_key', ident), None) for ident in old_fkeys)
+
+
+class ModelPatch (object):
+    """Ordered list of ModelOp operations in self.ops, as produced by diff().
+
+    Operations are ordered so that they may be applied in sequence:
+    foreign key, key, column, table, and schema drops; then schema,
+    table, column, and key creation and column alteration; then
+    foreign key creation and alteration; and finally configuration
+    changes.
+    """
+
+    def __init__(self, ops=None):
+        self.ops = list(ops or [])
+
+    def __repr__(self):
+        return "<%s of %d operations>" % (type(self).__name__, len(self.ops))
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __iter__(self):
+        return iter(self.ops)
+
+    def __bool__(self):
+        return bool(self.ops)
+
+    def prejson(self):
+        """Produce a representation of the patch as generic Python data structures"""
+        return [op.prejson() for op in self.ops]
+
+    @classmethod
+    def fromjson(cls, doc):
+        """Restore a patch from its prejson() representation."""
+        return cls(ModelOp.fromjson(op) for op in doc)
+
+    def apply(self, model, workers=DEFAULT_APPLY_WORKERS):
+        """Apply the patch to the catalog of model, updating model to match.
+
+        :param model: an ermrest_model.Model bound to the catalog to change
+        :param workers: Maximum number of configuration changes sent concurrently.
+
+        Structural operations are sent one at a time in order.
+        Configuration operations are made to the local model and then
+        sent concurrently, one request per changed element.
+        """
+        mapping_fields = {
+            op_name: field
+            for field, op_names in _mapping_ops.items()
+            for op_name in op_names
+        }
+        configured = {}
+        for op in self.ops:
+            if op.op == 'create_schema':
+                model.create_schema(op.value)
+            elif op.op == 'create_table':
+                model.schemas[op.target[0]].create_table(op.value)
+            elif op.op == 'create_column':
+                resolve(model, op.target[0:2]).create_column(op.value)
+            elif op.op == 'create_key':
+                resolve(model, op.target[0:2]).create_key(op.value)
+            elif op.op == 'create_fkey':
+                resolve(model, op.target[0:2]).create_fkey(op.value)
+            elif op.op == 'alter_column':
+                changes = dict(op.value)
+                if 'type' in changes:
+                    changes['type'] = make_type(changes['type'])
+                resolve(model, op.target).alter(**changes)
+            elif op.op == 'alter_fkey':
+                resolve(model, op.target).alter(**op.value)
+            elif op.op.startswith('drop_'):
+                resolve(model, op.target).drop()
+            elif op.op == 'set_comment':
+                node = resolve(model, op.target)
+                node.comment = op.value
+                configured.setdefault(id(node), (node, set()))[1].add('comment')
+            elif op.op in mapping_fields:
+                node = resolve(model, op.target)
+                field = mapping_fields[op.op]
+                container = getattr(node, field)
+                if op.op.startswith('set_'):
+                    container[op.value['name']] = op.value['value']
+                else:
+                    container.pop(op.value['name'], None)
+                configured.setdefault(id(node), (node, set()))[1].add(field)
+            else:
+                raise ValueError('Unexpected model patch operation %r' % (op.op,))
+        # send the whole new value of each changed configuration field, as Model.apply() would
+        ApplyPlan.fromchanges(model, [
+            ModelChange(node, {field: getattr(node, field) for field in fields})
+            for node, fields in configured.values()
+        ]).execute(workers=workers)
+        return model
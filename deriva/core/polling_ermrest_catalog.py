@@ -226,7 +226,7 @@ class PollingErmrestCatalog(ErmrestCatalog):
         try:
             before = self.get(query_datapath, raise_not_modified=True)
         except NotModified as e:
-            before = self._cache[self._server_uri + query_datapath]
+            before = e.args[0]
 
         if idle_etag is not None:
             if before.headers['etag'] == idle_etag:
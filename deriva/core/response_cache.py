@@ -0,0 +1,398 @@
+"""Bounded response caches for DerivaBinding GET/HEAD revalidation.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import closing
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from . import Megabyte, DEFAULT_CONFIG_PATH, make_dirs, format_exception
+
+DEFAULT_CACHE_MAX_ENTRIES = 1000
+DEFAULT_CACHE_MAX_BYTES = Megabyte * 64
+DEFAULT_DISK_CACHE_FILE = os.path.join(DEFAULT_CONFIG_PATH, 'cache', 'responses.sqlite')
+DEFAULT_DISK_CACHE_MAX_BYTES = Megabyte * 512
+
+
+def response_size(response):
+    """Return approximate number of bytes retained by a cached response.
+
+    Only the body (if already consumed) and header values are counted,
+    which dominate the footprint of cached ERMrest responses.
+    """
+    nbytes = 0
+    content = getattr(response, '_content', None)
+    if isinstance(content, (bytes, bytearray)):
+        nbytes += len(content)
+    for k, v in response.headers.items():
+        nbytes += len(k) + len(v)
+    return nbytes
+
+
+def build_response(url, status_code, reason, headers, content):
+    """Return a requests.Response populated from already retrieved message parts.
+
+    This allows content retrieved by other means (e.g. a persistent
+    cache or a non-requests HTTP client) to be handled like any other
+    response by DerivaBinding and its callers.
+    """
+    r = requests.Response()
+    r.status_code = status_code
+    r.reason = reason
+    r.url = url
+    r.headers = CaseInsensitiveDict(headers)
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    r._content = content
+    r._content_consumed = True
+    return r
+
+
+class ResponseCache (object):
+    """Thread-safe, bounded cache of response objects keyed by URL.
+
+    Entries are evicted in least-recently-used order whenever either
+    the max_entries or max_bytes budget would be exceeded. When ttl is
+    set, entries older than ttl seconds are discarded on lookup and
+    count as evictions.
+
+    The cache only retains responses with an ETag, since those are the
+    only ones usable for conditional revalidation by DerivaBinding.
+
+    Counters are available via stats():
+
+    - `hits`: lookups which found a usable entry
+    - `misses`: lookups which found no usable entry
+    - `revalidated`: 304 Not Modified responses answered from the cache
+    - `stores`: responses added or replaced
+    - `evictions`: entries dropped for budget or ttl reasons
+    - `rejected`: responses too large to ever fit in max_bytes
+
+    """
+    def __init__(self, max_entries=DEFAULT_CACHE_MAX_ENTRIES, max_bytes=DEFAULT_CACHE_MAX_BYTES, ttl=None):
+        """Create an empty response cache.
+
+        :param max_entries: Maximum number of retained responses or None for no limit.
+        :param max_bytes: Maximum approximate bytes of retained responses or None for no limit.
+        :param ttl: Maximum age in seconds of retained responses or None for no limit.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # url -> (response, nbytes, stored_at)
+        self._nbytes = 0
+        self._counters = dict.fromkeys(['hits', 'misses', 'revalidated', 'stores', 'evictions', 'rejected'], 0)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, url):
+        with self._lock:
+            return url in self._entries
+
+    def __getitem__(self, url):
+        with self._lock:
+            return self._entries[url][0]
+
+    @property
+    def nbytes(self):
+        """Approximate number of bytes currently retained."""
+        return self._nbytes
+
+    def _discard(self, url):
+        _, nbytes, _ = self._entries.pop(url)
+        self._nbytes -= nbytes
+
+    def _evict(self, url):
+        self._discard(url)
+        self._counters['evictions'] += 1
+
+    def _lookup(self, url):
+        # caller must hold self._lock
+        entry = self._entries.get(url)
+        if entry is not None and self.ttl is not None and (time.monotonic() - entry[2]) > self.ttl:
+            self._evict(url)
+            entry = None
+        if entry is None:
+            return None
+        self._entries.move_to_end(url)
+        return entry[0]
+
+    def _store(self, url, response, nbytes, stored_at=None):
+        # caller must hold self._lock; stored_at is a time.monotonic() value, by default now
+        if url in self._entries:
+            self._discard(url)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return False
+        self._entries[url] = (response, nbytes, time.monotonic() if stored_at is None else stored_at)
+        self._nbytes += nbytes
+        while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self._nbytes > self.max_bytes)):
+            self._evict(next(iter(self._entries)))
+        return True
+
+    def get(self, url):
+        """Return cached response for url or None, updating recency and counters."""
+        with self._lock:
+            response = self._lookup(url)
+            self._counters['hits' if response is not None else 'misses'] += 1
+            return response
+
+    def put(self, url, response):
+        """Store response for url, evicting older entries as needed to stay within budget."""
+        if 'etag' not in response.headers:
+            self.pop(url)
+            return
+        nbytes = response_size(response)
+        with self._lock:
+            self._counters['stores' if self._store(url, response, nbytes) else 'rejected'] += 1
+
+    def pop(self, url):
+        """Remove and return cached response for url or None if absent."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            self._discard(url)
+            return entry[0]
+
+    def record_revalidated(self):
+        """Count one 304 Not Modified response answered from this cache."""
+        with self._lock:
+            self._counters['revalidated'] += 1
+
+    def clear(self):
+        """Remove all entries without resetting counters."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        """Return a dict of counters and current occupancy."""
+        with self._lock:
+            s = dict(self._counters)
+            s.update({'entries': len(self._entries), 'bytes': self._nbytes})
+            return s
+
+
+class DiskResponseCache (ResponseCache):
+    """Response cache persisted to a SQLite database shared across processes.
+
+    Responses are kept in an in-memory ResponseCache tier for fast
+    repeated access within a process, and written through to a
+    SQLite file so that conditional GET revalidation also works for
+    later or concurrent processes using the same file.
+
+    The database uses write-ahead logging and busy timeouts so that
+    many processes may read and write it concurrently. After each
+    store, least-recently-accessed rows are deleted until the total
+    body size is within max_disk_bytes.
+
+    Entries are keyed by URL only. Since a cached body may reflect
+    the privileges of the client which retrieved it, a cache file
+    should not be shared between different user identities. The
+    default file lives under the user's ~/.deriva directory and is
+    created with owner-only permissions.
+
+    Disk lookups which find an entry are additionally counted as
+    `disk_hits` in stats().
+
+    """
+    _schema = """
+CREATE TABLE IF NOT EXISTS responses (
+  url text PRIMARY KEY,
+  status integer NOT NULL,
+  reason text,
+  headers text NOT NULL,
+  body blob NOT NULL,
+  nbytes integer NOT NULL,
+  stored real NOT NULL,
+  accessed real NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_idx ON responses (accessed);
+"""
+
+    def __init__(self,
+                 path=DEFAULT_DISK_CACHE_FILE,
+                 max_disk_bytes=DEFAULT_DISK_CACHE_MAX_BYTES,
+                 max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+                 max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                 ttl=None,
+                 timeout=30):
+        """Open (creating if needed) a persistent response cache.
+
+        :param path: Filename of the SQLite cache database.
+        :param max_disk_bytes: Maximum approximate bytes retained on disk or None for no limit.
+        :param max_entries: Maximum number of responses retained in memory or None for no limit.
+        :param max_bytes: Maximum approximate bytes retained in memory or None for no limit.
+        :param ttl: Maximum age in seconds of retained responses (in memory or on disk) or None for no limit.
+        :param timeout: Seconds to wait on a locked database before giving up on an operation.
+        """
+        super(DiskResponseCache, self).__init__(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        self.path = path
+        self.max_disk_bytes = max_disk_bytes
+        self.timeout = timeout
+        self._counters['disk_hits'] = 0
+        make_dirs(os.path.dirname(os.path.abspath(path)), mode=0o700)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self._schema)
+        os.chmod(path, 0o600)
+
+    def _connect(self):
+        # a short-lived connection per operation keeps us safe across threads and forks
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _disk_get(self, url):
+        # returns (response, age in seconds) or None
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT status, reason, headers, body, stored FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            status, reason, headers, body, stored = row
+            if self.ttl is not None and (now - stored) > self.ttl:
+                conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                with self._lock:
+                    self._counters['evictions'] += 1
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE url = ?", (now, url))
+        return build_response(url, status, reason, json.loads(headers), bytes(body)), max(0.0, now - stored)
+
+    @staticmethod
+    def _stored_headers(response):
+        # the stored body is already decoded, so its transfer encoding and length no longer apply
+        return {
+            k: v for k, v in response.headers.items()
+            if k.lower() not in ('content-encoding', 'content-length')
+        }
+
+    def _disk_put(self, url, response, nbytes):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (url, status, reason, headers, body, nbytes, stored, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, response.status_code, response.reason, json.dumps(self._stored_headers(response)),
+                 response.content, nbytes, now, now)
+            )
+            if self.max_disk_bytes is not None:
+                # keep the most recently accessed rows whose running total fits the budget
+                cur = conn.execute(
+                    "DELETE FROM responses WHERE url IN ("
+                    " SELECT url FROM ("
+                    "  SELECT url, sum(nbytes) OVER (ORDER BY accessed DESC, url) AS running FROM responses"
+                    " ) s WHERE running > ?"
+                    ")",
+                    (self.max_disk_bytes,)
+                )
+                if cur.rowcount > 0:
+                    with self._lock:
+                        self._counters['evictions'] += cur.rowcount
+
+    def _disk_delete(self, url=None):
+        with closing(self._connect()) as conn:
+            if url is None:
+                conn.execute("DELETE FROM responses")
+            else:
+                conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT count(*) FROM responses").fetchone()[0]
+
+    def __contains__(self, url):
+        with self._lock:
+            if url in self._entries:
+                return True
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM responses WHERE url = ?", (url,)).fetchone() is not None
+
+    def __getitem__(self, url):
+        with self._lock:
+            response = self._lookup(url)
+        if response is None:
+            entry = self._disk_get(url)
+            if entry is None:
+                raise KeyError(url)
+            response = entry[0]
+        return response
+
+    def get(self, url):
+        """Return cached response for url or None, consulting memory then disk."""
+        with self._lock:
+            response = self._lookup(url)
+        if response is None:
+            try:
+                entry = self._disk_get(url)
+            except sqlite3.Error as e:
+                logging.warning("Unable to read response cache %s. %s" % (self.path, format_exception(e)))
+                entry = None
+            if entry is not None:
+                response, age = entry
+                with self._lock:
+                    self._counters['disk_hits'] += 1
+                    # the entry keeps its remaining time to live in memory
+                    self._store(url, response, response_size(response), time.monotonic() - age)
+        with self._lock:
+            self._counters['hits' if response is not None else 'misses'] += 1
+        return response
+
+    def put(self, url, response):
+        """Store response for url in memory and on disk."""
+        if 'etag' not in response.headers:
+            self.pop(url)
+            return
+        nbytes = response_size(response)
+        if self.max_disk_bytes is not None and nbytes > self.max_disk_bytes:
+            with self._lock:
+                self._store(url, response, nbytes)
+                self._counters['rejected'] += 1
+            return
+        try:
+            self._disk_put(url, response, nbytes)
+        except sqlite3.Error as e:
+            logging.warning("Unable to update response cache %s. %s" % (self.path, format_exception(e)))
+        with self._lock:
+            self._store(url, response, nbytes)
+            self._counters['stores'] += 1
+
+    def pop(self, url):
+        """Remove and return cached response for url or None if absent."""
+        response = super(DiskResponseCache, self).pop(url)
+        if response is None:
+            try:
+                entry = self._disk_get(url)
+            except sqlite3.Error:
+                entry = None
+            response = entry[0] if entry is not None else None
+        try:
+            self._disk_delete(url)
+        except sqlite3.Error as e:
+            logging.warning("Unable to update response cache %s. %s" % (self.path, format_exception(e)))
+        return response
+
+    def clear(self):
+        """Remove all entries from memory and disk without resetting counters."""
+        super(DiskResponseCache, self).clear()
+        self._disk_delete()
+
+    def stats(self):
+        """Return a dict of counters, in-memory occupancy, and on-disk occupancy."""
+        s = super(DiskResponseCache, self).stats()
+        with closing(self._connect()) as conn:
+            entries, nbytes = conn.execute("SELECT count(*), coalesce(sum(nbytes), 0) FROM responses").fetchone()
+        s.update({'disk_entries': entries, 'disk_bytes': nbytes})
+        return s
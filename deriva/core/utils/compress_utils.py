@@ -0,0 +1,80 @@
+"""Content-encoding helpers for compressed request bodies.
+
+Request bodies are compressed incrementally, one chunk at a time, so that
+file-like sources are never read into memory whole. The compressed
+result is returned as bytes rather than a generator so that the request
+keeps a Content-Length and can be replayed by the transport on retry.
+
+The "gzip" encoding is always available. The "zstd" encoding requires
+the optional "zstandard" package, which is imported on first use.
+"""
+import zlib
+import importlib
+
+from .core_utils import Megabyte
+
+DEFAULT_COMPRESSION_CHUNK_SIZE = Megabyte
+COMPRESSIBLE_CONTENT_TYPES = frozenset(["application/json", "application/x-json-stream", "text/csv"])
+SUPPORTED_CONTENT_ENCODINGS = ("gzip", "zstd")
+
+_zstandard = None
+
+
+def _import_zstandard():
+    global _zstandard
+    if _zstandard is None:
+        try:
+            _zstandard = importlib.import_module("zstandard")
+        except ImportError as e:
+            raise ImportError("Unable to find required module. Ensure that the Python package \"zstandard\" is "
+                              "installed.", e)
+    return _zstandard
+
+
+def is_compressible(content_type):
+    """Return True if a body of content_type is worth compressing."""
+    if not content_type:
+        return False
+    return content_type.split(';', 1)[0].strip().lower() in COMPRESSIBLE_CONTENT_TYPES
+
+
+def get_compressor(encoding, level=None):
+    """Return an incremental compressor object with compress() and flush() methods for encoding."""
+    if encoding == "gzip":
+        return zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if encoding == "zstd":
+        zstd = _import_zstandard()
+        return zstd.ZstdCompressor(level=3 if level is None else level).compressobj()
+    raise ValueError("Unsupported content encoding: %s. Supported encodings: %s" %
+                     (encoding, ", ".join(SUPPORTED_CONTENT_ENCODINGS)))
+
+
+def iter_chunks(data, chunk_size=DEFAULT_COMPRESSION_CHUNK_SIZE):
+    """Yield successive byte chunks of data, which may be bytes, str, or a binary or text file-like object."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        for pos in range(0, len(view), chunk_size):
+            yield view[pos:pos + chunk_size]
+        return
+    while True:
+        buf = data.read(chunk_size)
+        if not buf:
+            break
+        yield buf.encode('utf-8') if isinstance(buf, str) else buf
+
+
+def compress(data, encoding, level=None, chunk_size=DEFAULT_COMPRESSION_CHUNK_SIZE):
+    """Compress data incrementally with the given content encoding, returning the compressed bytes.
+
+    :param data: bytes, str, or a file-like object to read from
+    :param encoding: "gzip" or "zstd"
+    :param level: optional compression level, otherwise the encoder default
+    :param chunk_size: size of the chunks fed to the compressor
+    :return: the encoded body as bytes
+    """
+    compressor = get_compressor(encoding, level)
+    parts = [compressor.compress(chunk) for chunk in iter_chunks(data, chunk_size)]
+    parts.append(compressor.flush())
+    return b''.join(parts)
@@ -6,11 +6,14 @@ import errno
 import json
 import math
 import datetime
+import atexit
+import hashlib
 import platform
 import logging
+import threading
 import requests
 import portalocker
-from requests.adapters import HTTPAdapter
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE, DEFAULT_POOLBLOCK
 from urllib3.util.retry import Retry
 from collections import OrderedDict
 from urllib.parse import quote as _urlquote, unquote as urlunquote
@@ -18,6 +21,7 @@ from urllib.parse import urlparse, urlsplit, urlunsplit, urljoin
 from http.cookiejar import MozillaCookieJar
 from typing import Any, Union
 from collections.abc import Iterable
+from .request_metrics import ObservedSession
 
 Kilobyte = 1024
 Megabyte = Kilobyte ** 2
@@ -33,6 +37,9 @@ DEFAULT_MAX_CHUNK_LIMIT = 10000
 # A practical default limit for single request body payload size, similar to AWS S3 recommendation for payload sizes.
 DEFAULT_MAX_REQUEST_SIZE = Megabyte * 100
 
+# Request bodies smaller than this are sent uncompressed even when request compression is enabled.
+DEFAULT_COMPRESSION_MIN_SIZE = Kilobyte * 16
+
 DEFAULT_HEADERS = {}
 DEFAULT_CONFIG_PATH = os.path.join(os.path.expanduser('~'), '.deriva')
 DEFAULT_CREDENTIAL_FILE = os.path.join(DEFAULT_CONFIG_PATH, 'credential.json')
@@ -50,7 +57,15 @@ DEFAULT_SESSION_CONFIG = {
     "cookie_jar": DEFAULT_COOKIE_JAR_FILE,
     "max_request_size": DEFAULT_MAX_REQUEST_SIZE,
     "max_chunk_limit": DEFAULT_MAX_CHUNK_LIMIT,
-    "bypass_cert_verify_host_list": ["localhost"]
+    "bypass_cert_verify_host_list": ["localhost"],
+    "pool_connections": DEFAULT_POOLSIZE,
+    "pool_maxsize": DEFAULT_POOLSIZE,
+    "pool_block": DEFAULT_POOLBLOCK,
+    "shared_sessions": False,
+    "single_flight": False,
+    "request_compression": None,
+    "request_compression_min_size": DEFAULT_COMPRESSION_MIN_SIZE,
+    "accept_encoding": None
 }
 OAUTH2_SCOPES_KEY = "oauth2_scopes"
 DEFAULT_CONFIG = {
@@ -192,7 +207,7 @@ class TimeoutHTTPAdapter(HTTPAdapter):
 
 
 def get_new_requests_session(url=None, session_config=DEFAULT_SESSION_CONFIG):
-    session = requests.session()
+    session = ObservedSession()
     retries = Retry(connect=session_config['retry_connect'],
                     read=session_config['retry_read'],
                     backoff_factor=session_config['retry_backoff_factor'],
@@ -201,9 +216,16 @@ def get_new_requests_session(url=None, session_config=DEFAULT_SESSION_CONFIG):
                     # Passing False to method_whitelist means allow all methods
                     not session_config.get("allow_retry_on_all_methods", False) else False,
                     raise_on_status=True)
-    adapter = TimeoutHTTPAdapter(timeout=session_config.get("timeout", DEFAULT_REQUESTS_TIMEOUT), max_retries=retries)
+    adapter = TimeoutHTTPAdapter(timeout=session_config.get("timeout", DEFAULT_REQUESTS_TIMEOUT),
+                                 max_retries=retries,
+                                 pool_connections=session_config.get("pool_connections", DEFAULT_POOLSIZE),
+                                 pool_maxsize=session_config.get("pool_maxsize", DEFAULT_POOLSIZE),
+                                 pool_block=session_config.get("pool_block", DEFAULT_POOLBLOCK))
     session.mount('http://', adapter)
     session.mount('https://', adapter)
+    if session_config.get("accept_encoding"):
+        # override the default set of response encodings, which are decoded transparently while streaming
+        session.headers['Accept-Encoding'] = session_config["accept_encoding"]
 
     if url:
         # allow whitelisted hosts to bypass SSL cert verification
@@ -215,6 +237,129 @@ def get_new_requests_session(url=None, session_config=DEFAULT_SESSION_CONFIG):
     return session
 
 
+class SessionRegistry (object):
+    """Thread-safe registry of requests sessions shared process-wide.
+
+       Sessions are keyed by (scheme, host, credential, session_config)
+       so that every client of the same server with the same identity
+       and transport configuration reuses one connection pool and its
+       warm keep-alive connections.
+
+       Shared sessions are owned by the registry. Clients MUST NOT
+       close them or mutate their authentication state; they are
+       closed by close_all(), which also runs at interpreter exit.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._key_locks = {}
+
+    @staticmethod
+    def _fingerprint(obj):
+        if not obj:
+            return None
+        return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _key(self, url, session_config, credentials):
+        upr = urlparse(url)
+        return upr.scheme, upr.netloc.lower(), self._fingerprint(credentials), self._fingerprint(session_config)
+
+    def get(self, url, session_config=DEFAULT_SESSION_CONFIG, credentials=None, init=None):
+        """Return the shared session for url, creating it if needed.
+
+           Arguments:
+             url: any URL on the target server
+             session_config: transport configuration for a new session
+             credentials: credential secrets distinguishing identities
+             init: optional function called once with a new session,
+               e.g. to apply credentials, before it is shared
+        """
+        key = self._key(url, session_config, credentials)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                return session
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # initialize outside the registry lock since init may perform requests
+        with key_lock:
+            with self._lock:
+                session = self._sessions.get(key)
+            if session is None:
+                session = get_new_requests_session(url, session_config)
+                if init is not None:
+                    init(session)
+                with self._lock:
+                    self._sessions[key] = session
+            return session
+
+    def close_all(self):
+        """Close and forget all shared sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._key_locks.clear()
+        for session in sessions:
+            session.close()
+
+
+session_registry = SessionRegistry()
+atexit.register(session_registry.close_all)
+
+
+def get_shared_requests_session(url, session_config=DEFAULT_SESSION_CONFIG, credentials=None, init=None):
+    """Return a process-wide shared session for url, see SessionRegistry.get()."""
+    return session_registry.get(url, session_config, credentials, init)
+
+
+class SingleFlight (object):
+    """Coalesce concurrent calls with the same key into one execution.
+
+       The first caller for a key runs the function, while concurrent
+       callers with an equal key block until it finishes and then
+       receive its result or re-raise its exception. Calls starting
+       after the first one has finished run the function again, so no
+       result is retained.
+    """
+    class _Call (object):
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = dict()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Return fn(), or the outcome of an in-flight call made with an equal key."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = self._Call()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
 def make_dirs(path, mode=0o777):
     if not os.path.isdir(path):
         try:
@@ -0,0 +1,145 @@
+"""Pluggable JSON codec used on the hot paths of the client.
+
+The fastest available implementation is selected at import time, in
+order of preference "orjson", "ujson", and then the standard library
+"json" module. The selection may be forced by setting the
+DERIVA_JSON_CODEC environment variable to one of those names, or at
+runtime with set_json_codec().
+
+All codecs produce compact, UTF-8 encoded JSON. Values which the fast
+codecs cannot represent (e.g. integers wider than 64 bits) are encoded
+by falling back to the standard library, and every codec rejects
+non-finite floats (NaN and infinities) with ValueError, so the choice
+of codec never changes which documents can be sent.
+"""
+import os
+import json
+import math
+import logging
+import importlib
+
+JSON_CODEC_PREFERENCE = ("orjson", "ujson", "json")
+
+
+class JSONCodec (object):
+    """A JSON implementation exposing loads(), dumps() returning str, and dumpb() returning bytes."""
+
+    def __init__(self, name):
+        self.name = name
+        if name == "json":
+            self._loads = json.loads
+            self._dumpb = self._std_dumpb
+        elif name == "orjson":
+            orjson = importlib.import_module("orjson")
+            self._loads = orjson.loads
+            self._dumpb = lambda obj: self._orjson_dumpb(orjson.dumps, obj)
+        elif name == "ujson":
+            ujson = importlib.import_module("ujson")
+            self._loads = ujson.loads
+            # non-finite floats raise OverflowError, and so fall back to the standard library which rejects them
+            self._dumpb = lambda obj: ujson.dumps(
+                obj, ensure_ascii=False, escape_forward_slashes=False, allow_nan=False).encode('utf-8')
+        else:
+            raise ValueError("Unsupported JSON codec: %s. Supported codecs: %s" %
+                             (name, ", ".join(JSON_CODEC_PREFERENCE)))
+
+    def __repr__(self):
+        return "<JSONCodec %s>" % self.name
+
+    @staticmethod
+    def _std_dumpb(obj):
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+    @staticmethod
+    def _orjson_dumpb(dumps, obj):
+        encoded = dumps(obj)
+        # orjson silently encodes non-finite floats as null, so only documents with nulls need checking
+        if b'null' in encoded and _has_nonfinite(obj):
+            raise ValueError("Out of range float values are not JSON compliant")
+        return encoded
+
+    def loads(self, s):
+        """Decode a JSON document from str, bytes, or bytearray."""
+        return self._loads(s)
+
+    def dumpb(self, obj):
+        """Encode obj as compact UTF-8 JSON bytes."""
+        try:
+            return self._dumpb(obj)
+        except (TypeError, OverflowError):
+            if self._dumpb is self._std_dumpb:
+                raise
+            return self._std_dumpb(obj)
+
+    def dumps(self, obj):
+        """Encode obj as a compact JSON str."""
+        return self.dumpb(obj).decode('utf-8')
+
+
+def _has_nonfinite(obj):
+    """Return True if obj is or contains a NaN or infinite float."""
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, float):
+            if not math.isfinite(obj):
+                return True
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return False
+
+
+def _default_codec():
+    preferred = os.getenv("DERIVA_JSON_CODEC")
+    for name in ((preferred,) if preferred else JSON_CODEC_PREFERENCE):
+        try:
+            return JSONCodec(name)
+        except ImportError:
+            continue
+        except ValueError as e:
+            logging.warning("%s; using the default codec." % e)
+            break
+    for name in JSON_CODEC_PREFERENCE:
+        try:
+            return JSONCodec(name)
+        except ImportError:
+            continue
+
+
+json_codec = _default_codec()
+
+
+def set_json_codec(name):
+    """Select the process-wide JSON codec by name, returning the new codec.
+
+    Raises ImportError if the named implementation is not installed.
+    """
+    global json_codec
+    json_codec = JSONCodec(name)
+    return json_codec
+
+
+def json_loads(s):
+    """Decode a JSON document from str or bytes with the process-wide codec."""
+    return json_codec.loads(s)
+
+
+def json_dumps(obj):
+    """Encode obj as a compact JSON str with the process-wide codec."""
+    return json_codec.dumps(obj)
+
+
+def json_dumpb(obj):
+    """Encode obj as compact UTF-8 JSON bytes with the process-wide codec."""
+    return json_codec.dumpb(obj)
+
+
+def response_json(response):
+    """Decode the JSON body of a requests.Response with the process-wide codec.
+
+    Equivalent to response.json() for UTF-8 content, which is what
+    DERIVA services produce, without the character set detection.
+    """
+    return json_codec.loads(response.content)
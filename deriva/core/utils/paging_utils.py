@@ -0,0 +1,157 @@
+"""Adaptive page sizing for paged catalog reads and writes.
+
+A PageSizeController chooses the number of rows to request (or send) in
+the next page of a paged transfer. After each page it is told how long
+the page took and how many bytes it carried, and it moves the page size
+toward the size expected to hit its latency and byte targets: growing by
+at most a bounded factor per page while pages are fast and small, and
+shrinking multiplicatively when a page is too slow, too large, or fails
+outright (e.g. "Query run time limit exceeded"). A transient slowdown
+therefore costs a few small pages instead of the rest of the transfer.
+
+Learned page sizes may be persisted between runs with PageSizeHistory.
+"""
+import os
+import json
+import logging
+import threading
+
+from .core_utils import Megabyte
+
+DEFAULT_PAGE_TARGET_SECONDS = 15.0
+DEFAULT_PAGE_TARGET_BYTES = Megabyte * 64
+DEFAULT_PAGE_MAX_GROWTH = 2.0
+DEFAULT_PAGE_DECREASE = 0.5
+
+
+class PageSizeController (object):
+    """Latency- and byte-targeting AIMD page size controller.
+
+    :param initial: the starting page size in rows
+    :param min_size: the smallest page size that will ever be chosen
+    :param max_size: the largest page size that will ever be chosen, or None for no upper bound
+    :param target_seconds: the desired elapsed time of a single page
+    :param target_bytes: the desired payload size of a single page
+    :param max_growth: the largest factor by which the page size may grow after one page
+    :param decrease: the factor applied to the page size after a failed or over-target page
+
+    The controller is safe to share between threads transferring pages of the same table.
+    """
+
+    def __init__(self,
+                 initial,
+                 min_size=1,
+                 max_size=None,
+                 target_seconds=DEFAULT_PAGE_TARGET_SECONDS,
+                 target_bytes=DEFAULT_PAGE_TARGET_BYTES,
+                 max_growth=DEFAULT_PAGE_MAX_GROWTH,
+                 decrease=DEFAULT_PAGE_DECREASE):
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1")
+        if max_growth < 1:
+            raise ValueError("max_growth must be at least 1")
+        self.min_size = max(1, int(min_size))
+        self.max_size = int(max_size) if max_size else None
+        self.target_seconds = target_seconds
+        self.target_bytes = target_bytes
+        self.max_growth = max_growth
+        self.decrease = decrease
+        self._size = self._clamp(initial)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<PageSizeController size=%d min=%d max=%s>" % (self._size, self.min_size, self.max_size)
+
+    def _clamp(self, size):
+        size = max(self.min_size, int(size))
+        return min(self.max_size, size) if self.max_size else size
+
+    @property
+    def size(self):
+        """The page size to use for the next page."""
+        return self._size
+
+    def observe(self, rows, elapsed, nbytes=None):
+        """Record a successful page of "rows" rows which took "elapsed" seconds and carried "nbytes" bytes.
+
+        Returns the page size to use for the next page.
+        """
+        with self._lock:
+            if rows <= 0:
+                return self._size
+            over = (self.target_seconds and elapsed > self.target_seconds) or \
+                   (self.target_bytes and nbytes and nbytes > self.target_bytes)
+            if over:
+                self._size = self._clamp(min(self._size, rows) * self.decrease)
+                return self._size
+            if rows < self._size:
+                # a short page carries no information about how much larger a page could be
+                return self._size
+            estimates = [rows * self.max_growth]
+            if self.target_seconds and elapsed > 0:
+                estimates.append(rows * self.target_seconds / elapsed)
+            if self.target_bytes and nbytes:
+                estimates.append(rows * self.target_bytes / nbytes)
+            self._size = max(self._size, self._clamp(min(estimates)))
+            return self._size
+
+    def failure(self, rows=None):
+        """Record a failed page of "rows" rows (default the current size), returning the reduced page size.
+
+        Raises ValueError if the page size is already at the minimum and cannot be reduced.
+        """
+        with self._lock:
+            rows = self._size if rows is None else rows
+            if rows <= self.min_size:
+                raise ValueError("Page size cannot be reduced below %d" % self.min_size)
+            self._size = self._clamp(min(self._size, rows) * self.decrease)
+            return self._size
+
+
+def as_page_size_controller(page_size, **kwargs):
+    """Return page_size if it is a PageSizeController, otherwise a new controller which starts at (and by default
+    never exceeds) the integer page_size."""
+    if isinstance(page_size, PageSizeController):
+        return page_size
+    kwargs.setdefault("max_size", page_size)
+    return PageSizeController(page_size, **kwargs)
+
+
+class PageSizeHistory (object):
+    """Persist learned page sizes in a JSON file, keyed by an arbitrary string such as a table or query path.
+
+    :param path: the file to load from and save to, which need not exist yet
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sizes = dict()
+        self._lock = threading.Lock()
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    self.sizes.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logging.warning("Unable to load page size history from %s: %s" % (path, e))
+
+    def controller(self, key, default, **kwargs):
+        """Return a PageSizeController for key, starting at the stored size for key or else at default.
+
+        Other keyword arguments are passed to the controller. Unless a max_size is given, the page size is only
+        bounded by the controller's latency and byte targets, so that it may grow beyond default across runs.
+        """
+        with self._lock:
+            initial = self.sizes.get(key, default)
+        return PageSizeController(initial, **kwargs)
+
+    def record(self, key, controller):
+        """Remember the current size of controller under key."""
+        with self._lock:
+            self.sizes[key] = controller.size
+
+    def save(self):
+        """Write the stored page sizes to the history file."""
+        with self._lock:
+            sizes = dict(self.sizes)
+        with open(self.path, "w") as f:
+            json.dump(sizes, f, indent=2, sort_keys=True)
@@ -0,0 +1,363 @@
+"""Instrumentation of DERIVA HTTP traffic.
+
+Every session created by get_new_requests_session() is an
+ObservedSession, which reports one RequestEvent for each HTTP exchange
+to the process-wide observers registered with add_request_observer()
+and to the observers in its own request_observers list. An observer is
+any callable taking a single RequestEvent argument. Observers are
+called synchronously on the thread which issued the request, so they
+should be cheap; exceptions raised by an observer are logged and
+otherwise ignored.
+
+RequestMetrics is a built-in observer which aggregates events by
+method, path template, and status, and renders the aggregate as
+Prometheus text exposition format or as a JSON summary.
+"""
+import io
+import sys
+import json
+import time
+import atexit
+import logging
+import datetime
+import threading
+import requests
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit, unquote as urlunquote
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_observers = []
+_observers_lock = threading.Lock()
+
+
+class RequestEvent (NamedTuple):
+    """Description of one HTTP request made to a DERIVA service.
+
+       :var method: the HTTP method
+       :var url: the full request URL
+       :var path: the normalized path template, e.g. "/ermrest/catalog/{catalog}/entity"
+       :var status: the response status code, or None if no response was received
+       :var latency: elapsed time in seconds
+       :var request_bytes: size of the request body, or None if unknown
+       :var response_bytes: size of the response body, or None if unknown
+       :var retries: number of retries performed by the transport, or None if unknown
+       :var cid: the deriva-client-context "cid" value, if any
+       :var action: the deriva-client-context "action" value, if any
+       :var error: the exception class name when the request failed without a response
+    """
+    method: str
+    url: str
+    path: str
+    status: Optional[int]
+    latency: float
+    request_bytes: Optional[int]
+    response_bytes: Optional[int]
+    retries: Optional[int]
+    cid: Optional[str] = None
+    action: Optional[str] = None
+    error: Optional[str] = None
+
+
+def add_request_observer(observer):
+    """Register a process-wide observer called with a RequestEvent for every request."""
+    global _observers
+    with _observers_lock:
+        if observer not in _observers:
+            _observers = _observers + [observer]
+
+
+def remove_request_observer(observer):
+    """Unregister a process-wide observer previously registered with add_request_observer()."""
+    global _observers
+    with _observers_lock:
+        _observers = [o for o in _observers if o != observer]
+
+
+def has_request_observers(local_observers=()):
+    return bool(_observers or local_observers)
+
+
+def notify_request_observers(event, local_observers=()):
+    """Deliver event to the process-wide observers and then to local_observers."""
+    for observer in _observers + list(local_observers):
+        try:
+            observer(event)
+        except Exception as e:
+            logging.warning("Request observer %r failed: %s" % (observer, e))
+
+
+def path_template(url):
+    """Return a low-cardinality template for the path of a DERIVA service URL.
+
+       Catalog identifiers, table and column names, query predicates,
+       hatrac object names and upload job identifiers are replaced by
+       placeholders, so that the template can be used to group
+       requests by API endpoint.
+    """
+    path = urlsplit(url).path
+    segs = path.split('/')[1:]
+    if not segs or not segs[0]:
+        return '/'
+    service = segs[0]
+    if service == 'ermrest':
+        if len(segs) > 1 and segs[1] == 'catalog':
+            if len(segs) < 3 or not segs[2]:
+                return '/ermrest/catalog'
+            if len(segs) < 4 or not segs[3]:
+                return '/ermrest/catalog/{catalog}'
+            api = segs[3] if segs[3].replace('_', '').isalnum() else '{api}'
+            return '/ermrest/catalog/{catalog}/%s' % api
+        if len(segs) > 1 and segs[1] == 'alias':
+            return '/ermrest/alias/{alias}' if len(segs) > 2 and segs[2] else '/ermrest/alias'
+        return '/ermrest'
+    if service == 'hatrac':
+        rest = path[len('/hatrac'):]
+        if ';' not in rest:
+            return '/hatrac/{object}' if rest.strip('/') else '/hatrac/'
+        subsegs = rest.split(';', 1)[1].split('/')
+        template = '/hatrac/{object};%s' % subsegs[0]
+        if subsegs[0] == 'upload':
+            if len(subsegs) > 1 and subsegs[1]:
+                template += '/{job}'
+            if len(subsegs) > 2 and subsegs[2]:
+                template += '/{chunk}'
+        elif len(subsegs) > 1 and subsegs[1]:
+            template += '/{key}'
+        return template
+    if service == 'authn' and len(segs) > 1 and segs[1]:
+        return '/authn/%s' % segs[1]
+    return '/%s' % service
+
+
+def dcctx_fields(headers):
+    """Return the (cid, action) pair from the deriva-client-context header in headers, if any."""
+    value = headers.get('deriva-client-context') if headers else None
+    if not value:
+        return None, None
+    try:
+        ctx = json.loads(urlunquote(value))
+    except ValueError:
+        return None, None
+    if not isinstance(ctx, dict):
+        return None, None
+    return ctx.get('cid'), ctx.get('action')
+
+
+def _content_length(headers):
+    try:
+        return int(headers['Content-Length'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _response_retries(response):
+    retries = getattr(getattr(response, 'raw', None), 'retries', None)
+    return len(retries.history) if retries is not None else 0
+
+
+class ObservedSession (requests.Session):
+    """A requests session which reports a RequestEvent for every request it sends.
+
+       Observers local to this session are kept in the request_observers
+       list. When neither local nor process-wide observers are
+       registered, requests are sent without any additional overhead.
+    """
+    def __init__(self):
+        super(ObservedSession, self).__init__()
+        self.request_observers = []
+
+    def send(self, request, **kwargs):
+        if not has_request_observers(self.request_observers):
+            return super(ObservedSession, self).send(request, **kwargs)
+
+        start = time.perf_counter()
+        response = error = None
+        try:
+            response = super(ObservedSession, self).send(request, **kwargs)
+            return response
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            cid, action = dcctx_fields(request.headers)
+            if response is None:
+                event = RequestEvent(request.method, request.url, path_template(request.url), None, latency,
+                                     _content_length(request.headers), None, None, cid, action,
+                                     type(error).__name__)
+            else:
+                if response.history:
+                    # redirect hops are sent (and reported) individually, so only report the first exchange here
+                    response = response.history[0]
+                    latency = response.elapsed.total_seconds()
+                if not kwargs.get('stream') and response._content_consumed and response._content is not None:
+                    response_bytes = len(response._content)
+                else:
+                    response_bytes = _content_length(response.headers)
+                event = RequestEvent(request.method, request.url, path_template(request.url), response.status_code,
+                                     latency, _content_length(request.headers), response_bytes,
+                                     _response_retries(response), cid, action)
+            notify_request_observers(event, self.request_observers)
+
+
+class RequestMetrics (object):
+    """Thread-safe aggregator of RequestEvents.
+
+       Instances are observers and may be registered with
+       add_request_observer() or added to the request_observers of a
+       session. Events are aggregated into one series per (method, path
+       template, status), where status is "error" for requests which
+       failed without a response.
+    """
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._series = dict()
+
+    def __call__(self, event):
+        self.observe(event)
+
+    def observe(self, event):
+        key = (event.method, event.path, str(event.status) if event.status is not None else 'error')
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'count': 0,
+                    'latency_sum': 0.0,
+                    'latency_max': 0.0,
+                    'latency_buckets': [0] * len(self.buckets),
+                    'request_bytes': 0,
+                    'response_bytes': 0,
+                    'retries': 0,
+                }
+            series['count'] += 1
+            series['latency_sum'] += event.latency
+            series['latency_max'] = max(series['latency_max'], event.latency)
+            for i, bound in enumerate(self.buckets):
+                if event.latency <= bound:
+                    series['latency_buckets'][i] += 1
+                    break
+            series['request_bytes'] += event.request_bytes or 0
+            series['response_bytes'] += event.response_bytes or 0
+            series['retries'] += event.retries or 0
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self.started = time.time()
+
+    def summary(self):
+        """Return a JSON-serializable dict summarizing the observed requests."""
+        with self._lock:
+            items = sorted((key, dict(series, latency_buckets=list(series['latency_buckets'])))
+                           for key, series in self._series.items())
+        endpoints = []
+        for (method, path, status), series in items:
+            cumulative = 0
+            buckets = dict()
+            for bound, n in zip(self.buckets, series['latency_buckets']):
+                cumulative += n
+                buckets[repr(bound)] = cumulative
+            endpoints.append({
+                'method': method,
+                'path': path,
+                'status': status,
+                'count': series['count'],
+                'latency': {
+                    'sum': series['latency_sum'],
+                    'mean': series['latency_sum'] / series['count'],
+                    'max': series['latency_max'],
+                    'buckets': buckets,
+                },
+                'request_bytes': series['request_bytes'],
+                'response_bytes': series['response_bytes'],
+                'retries': series['retries'],
+            })
+        return {
+            'started': datetime.datetime.fromtimestamp(self.started, datetime.timezone.utc).isoformat(),
+            'elapsed': time.time() - self.started,
+            'requests': sum(e['count'] for e in endpoints),
+            'request_bytes': sum(e['request_bytes'] for e in endpoints),
+            'response_bytes': sum(e['response_bytes'] for e in endpoints),
+            'retries': sum(e['retries'] for e in endpoints),
+            'endpoints': endpoints,
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.summary(), indent=indent)
+
+    def to_prometheus(self):
+        """Return the aggregate in Prometheus text exposition format."""
+        def labels(e, **extra):
+            pairs = [('method', e['method']), ('path', e['path']), ('status', e['status'])] + list(extra.items())
+            return '{%s}' % ','.join('%s="%s"' % (k, _prometheus_escape(v)) for k, v in pairs)
+
+        endpoints = self.summary()['endpoints']
+        out = io.StringIO()
+
+        def metric(name, kind, help_text, value_fn):
+            out.write('# HELP %s %s\n# TYPE %s %s\n' % (name, help_text, name, kind))
+            for e in endpoints:
+                out.write('%s%s %s\n' % (name, labels(e), value_fn(e)))
+
+        metric('deriva_http_requests_total', 'counter', 'Number of HTTP requests.', lambda e: e['count'])
+        out.write('# HELP deriva_http_request_duration_seconds HTTP request latency.\n'
+                  '# TYPE deriva_http_request_duration_seconds histogram\n')
+        for e in endpoints:
+            for bound, n in e['latency']['buckets'].items():
+                out.write('deriva_http_request_duration_seconds_bucket%s %d\n' % (labels(e, le=bound), n))
+            out.write('deriva_http_request_duration_seconds_bucket%s %d\n' % (labels(e, le='+Inf'), e['count']))
+            out.write('deriva_http_request_duration_seconds_sum%s %r\n' % (labels(e), e['latency']['sum']))
+            out.write('deriva_http_request_duration_seconds_count%s %d\n' % (labels(e), e['count']))
+        metric('deriva_http_request_bytes_total', 'counter', 'Bytes sent in HTTP request bodies.',
+               lambda e: e['request_bytes'])
+        metric('deriva_http_response_bytes_total', 'counter', 'Bytes received in HTTP response bodies.',
+               lambda e: e['response_bytes'])
+        metric('deriva_http_retries_total', 'counter', 'Number of transport-level retries.',
+               lambda e: e['retries'])
+        return out.getvalue()
+
+    def dump(self, path=None, output_format=None):
+        """Write the aggregate to path, or to stderr when path is None or "-".
+
+           :param path: output file path
+           :param output_format: "prometheus" or "json"; by default, "json" if path ends with ".json",
+             otherwise "prometheus"
+        """
+        if output_format is None:
+            output_format = 'json' if path and path.lower().endswith('.json') else 'prometheus'
+        if output_format not in ('prometheus', 'json'):
+            raise ValueError('Unsupported request metrics format: %s' % output_format)
+        text = self.to_json() + '\n' if output_format == 'json' else self.to_prometheus()
+        if not path or path == '-':
+            sys.stderr.write(text)
+        else:
+            with open(path, 'w') as f:
+                f.write(text)
+
+
+def _prometheus_escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def install_request_metrics(path=None, output_format=None):
+    """Register a process-wide RequestMetrics observer which is dumped at interpreter exit.
+
+       :param path: output file path, or None or "-" for stderr
+       :param output_format: "prometheus" or "json", see RequestMetrics.dump()
+       :return: the RequestMetrics instance
+    """
+    metrics = RequestMetrics()
+    add_request_observer(metrics)
+
+    def dump():
+        try:
+            metrics.dump(path, output_format)
+        except Exception as e:
+            logging.warning("Unable to write request metrics: %s" % e)
+
+    atexit.register(dump)
+    return metrics
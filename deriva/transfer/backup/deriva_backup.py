@@ -92,7 +92,10 @@ class DerivaBackup(DerivaDownload):
                     query_proc["processor"] = data_format
                     query_proc_params = {"query_path": query_path, "output_path": output_path}
                     if data_format in ("json-stream", "csv"):
-                        query_proc_params.update({"paged_query": True, "paged_query_size": 100000})
+                        query_proc_params.update({"paged_query": True, "paged_query_size": 100000,
+                                                  "paged_query_workers": kwargs.get("paged_query_workers") or 1,
+                                                  "paged_query_size_history": kwargs.get("paged_query_size_history"),
+                                                  "paged_query_max_size": kwargs.get("paged_query_max_size")})
                     query_proc["processor_params"] = query_proc_params
                     self.config["catalog"]["query_processors"].append(query_proc)
 
@@ -35,6 +35,15 @@ class DerivaBackupCLI(DerivaDownloadCLI):
                                  metavar="<schema>, <schema:table>, ...",
                                  help="List of comma-delimited schema-name and/or schema-name/table-name to "
                                       "exclude from data export, in the form <schema> or <schema:table>.")
+        self.parser.add_argument("--paged-query-workers", type=int, default=1, metavar="<n>",
+                                 help="Number of concurrent workers used to download each table's data in "
+                                      "RID key ranges. Default: 1")
+        self.parser.add_argument("--paged-query-size-history", metavar="<file>",
+                                 help="Path to a JSON file in which the page size learned for each table's data query "
+                                      "is saved, and from which it is restored on subsequent runs.")
+        self.parser.add_argument("--paged-query-max-size", type=int, metavar="<n>",
+                                 help="Largest number of rows requested in one page of a table's data query. By "
+                                      "default, page sizes are only limited by the page latency and size targets.")
 
     @classmethod
     def get_downloader(cls, *args, **kwargs):
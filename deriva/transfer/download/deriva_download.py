@@ -61,6 +61,7 @@ class DerivaDownload(object):
         self.server_url = protocol + "://" + self.hostname
         catalog_id = self.server.get("catalog_id", "1")
         session_config = self.server.get('session')
+        self.session_config = session_config
 
         # credential initialization
         token = kwargs.get("token")
@@ -211,7 +212,8 @@ class DerivaDownload(object):
                                             identity=identity,
                                             wallet=wallet,
                                             allow_anonymous=self.allow_anonymous,
-                                            timeout=self.timeout)
+                                            timeout=self.timeout,
+                                            session_config=self.session_config)
                 outputs = processor.process()
                 assert outputs is not None
                 if processor.should_abort():
@@ -19,6 +19,7 @@ class DerivaDownloadCLI(BaseCLI):
         self.parser.add_argument("--catalog", default=1, metavar="<1>", help="Catalog number. Default: 1")
         self.parser.add_argument("--timeout", metavar="<seconds>",
                                  help="Total number of seconds elapsed before the download is aborted.")
+        self.add_request_metrics_options()
         self.parser.add_argument("output_dir", metavar="<output dir>", help="Path to an output directory.")
         self.parser.add_argument("envars", metavar="[key=value key=value ...]",
                                  nargs=argparse.REMAINDER, action=KeyValuePairArgs, default={},
@@ -4,7 +4,7 @@ import uuid
 import logging
 import requests
 from bdbag import bdbag_ro as ro
-from deriva.core import format_exception
+from deriva.core import format_exception, json_loads, json_dumps
 from deriva.core.utils.hash_utils import decodeBase64toHex
 from deriva.core.utils.mime_utils import parse_content_disposition
 from deriva.transfer.download.processors.query.base_query_processor import BaseQueryProcessor, LOCAL_PATH_KEY
@@ -38,11 +38,11 @@ class BagFetchQueryProcessor(BaseQueryProcessor):
                 open(remote_file_manifest, "a", encoding="utf-8") as remote_file:
             for line in in_file:
                 # get the required bdbag remote file manifest vars from each line of the json-stream input file
-                entry = json.loads(line)
+                entry = json_loads(line)
                 entry = self.createManifestEntry(entry)
                 if not entry:
                     continue
-                remote_file.write(json.dumps(entry) + "\n")
+                remote_file.write(json_dumps(entry) + "\n")
                 if self.ro_manifest:
                     ro.add_file_metadata(self.ro_manifest,
                                          source_url=entry["url"],
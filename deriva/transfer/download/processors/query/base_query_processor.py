@@ -1,7 +1,8 @@
 import os
 import errno
 import requests
-from deriva.core import urlsplit, get_new_requests_session, stob, make_dirs, format_exception, DEFAULT_SESSION_CONFIG
+from deriva.core import urlsplit, get_new_requests_session, get_shared_requests_session, stob, make_dirs, format_exception, DEFAULT_SESSION_CONFIG, \
+    PageSizeHistory
 from deriva.transfer.download import DerivaDownloadError, DerivaDownloadConfigurationError, \
     DerivaDownloadAuthenticationError, DerivaDownloadAuthorizationError
 from deriva.transfer.download.processors.base_processor import BaseProcessor, \
@@ -39,6 +40,9 @@ class BaseQueryProcessor(BaseProcessor):
         self.paged_query = self.parameters.get("paged_query", False)
         self.paged_query_size = self.parameters.get("paged_query_size", 100000)
         self.paged_query_sort_columns = self.parameters.get("paged_query_sort_columns", ["RID"])
+        self.paged_query_workers = int(self.parameters.get("paged_query_workers", 1))
+        self.paged_query_size_history = self.parameters.get("paged_query_size_history")
+        self.paged_query_max_size = self.parameters.get("paged_query_max_size")
 
     def process(self):
         resp = self.catalogQuery(headers={'accept': self.content_type})
@@ -69,15 +73,25 @@ class BaseQueryProcessor(BaseProcessor):
         if as_file:
             output_dir = os.path.dirname(self.output_abspath)
             make_dirs(output_dir)
+        page_size = self.paged_query_size
+        history = None
+        if as_file and self.paged_query and self.paged_query_size_history:
+            history = PageSizeHistory(self.paged_query_size_history)
+            page_size = history.controller(self.query, self.paged_query_size, max_size=self.paged_query_max_size)
         try:
             if as_file:
-                return self.catalog.get_as_file(self.query, self.output_abspath,
-                                                headers=headers,
-                                                callback=self.callback,
-                                                delete_if_empty=True,
-                                                paged=self.paged_query,
-                                                page_size=self.paged_query_size,
-                                                page_sort_columns=self.paged_query_sort_columns)
+                result = self.catalog.get_as_file(self.query, self.output_abspath,
+                                                  headers=headers,
+                                                  callback=self.callback,
+                                                  delete_if_empty=True,
+                                                  paged=self.paged_query,
+                                                  page_size=page_size,
+                                                  page_sort_columns=self.paged_query_sort_columns,
+                                                  page_workers=self.paged_query_workers)
+                if history:
+                    history.record(self.query, page_size)
+                    history.save()
+                return result
             else:
                 return self.catalog.get(self.query, headers=headers).json()
         except requests.HTTPError as e:
@@ -102,7 +116,7 @@ class BaseQueryProcessor(BaseProcessor):
             headers = r.headers
         else:
             url = self.getExternalUrl(url)
-            session = self.getExternalSession(urlsplit(url).hostname)
+            session = self.getExternalSession(url)
             r = session.head(url, headers=self.HEADERS)
             if raise_for_status:
                 r.raise_for_status()
@@ -156,16 +170,22 @@ class BaseQueryProcessor(BaseProcessor):
 
         if not session_config:
             session_config = DEFAULT_SESSION_CONFIG
-        session = get_new_requests_session(url, session_config=session_config)
 
-        if cookies:
-            session.cookies.update(cookies)
-        if login_params and auth_url:
-            r = session.post(auth_url, data=login_params)
-            if r.status_code > 203:
-                raise DerivaDownloadError(
-                    'GetExternalSession Failed with Status Code: %s\n%s\n' % (r.status_code, r.text))
+        def init_session(session):
+            if cookies:
+                session.cookies.update(cookies)
+            if login_params and auth_url:
+                r = session.post(auth_url, data=login_params)
+                if r.status_code > 203:
+                    raise DerivaDownloadError(
+                        'GetExternalSession Failed with Status Code: %s\n%s\n' % (r.status_code, r.text))
+
+        if session_config.get("shared_sessions", False):
+            # shared sessions are owned by the process-wide registry, so they are not tracked for closing here
+            return get_shared_requests_session(url, session_config, credentials=auth_params, init=init_session)
 
+        session = get_new_requests_session(url, session_config=session_config)
+        init_session(session)
         self.sessions[host] = session
         return session
 
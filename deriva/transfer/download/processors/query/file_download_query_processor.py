@@ -5,7 +5,8 @@ import datetime
 import logging
 import requests
 from bdbag import bdbag_ro as ro
-from deriva.core import urlsplit, format_exception, get_transfer_summary, make_dirs, DEFAULT_CHUNK_SIZE
+from deriva.core import urlsplit, format_exception, get_transfer_summary, make_dirs, json_loads, \
+    DEFAULT_CHUNK_SIZE
 from deriva.core.utils.mime_utils import parse_content_disposition
 from deriva.transfer.download.processors.query.base_query_processor import BaseQueryProcessor, \
     LOCAL_PATH_KEY, FILE_SIZE_KEY
@@ -65,7 +66,7 @@ class FileDownloadQueryProcessor(BaseQueryProcessor):
             with open(input_manifest, "r", encoding='utf-8') as in_file:
                 file_list = dict()
                 for line in in_file:
-                    entry = json.loads(line)
+                    entry = json_loads(line)
                     url = entry.get('url')
                     if not url:
                         logging.warning(
@@ -1,9 +1,8 @@
-import json
 import os
 import re
 from string import Template
 import logging
-from deriva.core import make_dirs
+from deriva.core import make_dirs, json_loads, json_dumps
 from deriva.transfer.download import DerivaDownloadError, DerivaDownloadConfigurationError
 from deriva.transfer.download.processors.transform.base_transform_processor import BaseTransformProcessor
 
@@ -29,7 +28,7 @@ class InterpolationTransformProcessor(BaseTransformProcessor):
             with open(self.input_abspath, encoding='utf-8') as inputfile, \
                  open(self.output_abspath, mode='w', encoding='utf-8') as outputfile:
                 for line in inputfile:
-                    row = json.loads(line)
+                    row = json_loads(line)
                     output = self.template.safe_substitute(row)
                     outputfile.write(output)
         except IOError as e:
@@ -60,10 +59,10 @@ class StrSubTransformProcessor(BaseTransformProcessor):
             with open(self.input_abspath, encoding='utf-8') as inputfile, \
                  open(self.output_abspath, mode='w', encoding='utf-8') as outputfile:
                 for line in inputfile:
-                    row = json.loads(line)
+                    row = json_loads(line)
                     for strsub in self.substitutions:
                         row[strsub['output']] = re.sub(strsub['pattern'], strsub['repl'], row[strsub['input']])
-                    outputfile.write(json.dumps(row))
+                    outputfile.write(json_dumps(row))
                     outputfile.write('\n')
         except IOError as e:
             raise DerivaDownloadError("Interpolation transform failed", e)
@@ -7,14 +7,17 @@ import time
 import logging
 import datetime
 import platform
+import requests
 from collections import OrderedDict
 from bdbag import bdbag_api as bdb
 from deriva.core import (get_credential, format_credential, urlquote, format_exception, read_config,
-                         DEFAULT_SESSION_CONFIG, __version__ as VERSION)
+                         json_loads, json_dumpb, DEFAULT_SESSION_CONFIG, PageSizeController, __version__ as VERSION)
+from deriva.core.utils.paging_utils import as_page_size_controller
 from deriva.core.utils.version_utils import get_installed_version
 from deriva.core.ermrest_model import Model
 from deriva.core.deriva_server import DerivaServer
-from deriva.core.ermrest_catalog import ErmrestCatalog, _clone_state_url as CLONE_STATE_URL
+from deriva.core.ermrest_catalog import ErmrestCatalog, _clone_state_url as CLONE_STATE_URL, \
+    _query_runtime_exceeded
 from deriva.core.hatrac_store import HatracStore
 from deriva.transfer import DerivaUpload, DerivaUploadError, DerivaUploadConfigurationError, GenericUploader
 from deriva.transfer.restore import DerivaRestoreError, DerivaRestoreConfigurationError, \
@@ -194,24 +197,50 @@ class DerivaRestore:
                 "Input file %s does not appear to be in the required json-stream format." % table_path)
 
     def get_json_recordset(self, data, chunk_size, after=None, after_column='RID'):
+        """Yield lists of rows read from data, of chunk_size rows each. The chunk_size may be a PageSizeController,
+        in which case its current size is used for each chunk."""
         chunk = list()
         found = False
         for line in data:
             if isinstance(line, dict):
                 row = line
             else:
-                row = json.loads(line, object_pairs_hook=OrderedDict)
+                row = json_loads(line)
             if after and not found:
                 if after == row[after_column]:
                     found = True
                 continue
             chunk.append(row)
-            if len(chunk) == chunk_size:
+            if len(chunk) >= (chunk_size.size if isinstance(chunk_size, PageSizeController) else chunk_size):
                 yield chunk
                 chunk = list()
         if chunk:
             yield chunk
 
+    def post_json_recordset(self, tname_uri, chunk, chunk_size):
+        """Insert the rows of chunk into table tname_uri, informing the PageSizeController chunk_size of the elapsed
+        time and encoded size of each request. When a request exceeds the query run time limit or the request size
+        limit (413), the page size is reduced and its rows are sent again in smaller requests."""
+        pending = [chunk]
+        while pending:
+            rows = pending.pop(0)
+            body = json_dumpb(rows)
+            start = time.perf_counter()
+            try:
+                self.dst_catalog.post("/entity/%s?nondefaults=RID,RCT,RCB" % tname_uri, data=body,
+                                      headers={'Content-Type': 'application/json'})
+            except requests.HTTPError as e:
+                if not (_query_runtime_exceeded(e.response) or
+                        (e.response is not None and e.response.status_code == 413)):
+                    raise
+                try:
+                    size = chunk_size.failure(len(rows))
+                except ValueError:
+                    raise e
+                pending[0:0] = [rows[i:i + size] for i in range(0, len(rows), size)]
+                continue
+            chunk_size.observe(len(rows), time.perf_counter() - start, len(body))
+
     def restore(self, **kwargs):
         """
         Perform the catalog restore operation. The restore process is broken up into six phases:
@@ -411,15 +440,16 @@ class DerivaRestore:
                             logging.warning("Restoration of table data [%s] incomplete. File not found: %s" %
                                             (("%s:%s" % (sname, tname)), table_path))
                             continue
+                        chunk_size = as_page_size_controller(self.data_chunk_size)
                         table = self.get_json_recordset(self.open_json_stream_file(table_path),
-                                                        self.data_chunk_size, after=last)
+                                                        chunk_size, after=last)
 
                         total = 0
                         table_success = True
                         try:
                             for chunk in table:
                                 if chunk:
-                                    self.dst_catalog.post("/entity/%s?nondefaults=RID,RCT,RCB" % tname_uri, json=chunk)
+                                    self.post_json_recordset(tname_uri, chunk, chunk_size)
                                     total += len(chunk)
                                 else:
                                     break
@@ -26,6 +26,7 @@ class DerivaUploadCLI(BaseCLI):
                                       "containing file upload status and associated metadata.")
         self.parser.add_argument("--catalog", default=1, metavar="<1>", help="Catalog number. Default: 1")
         self.parser.add_argument("path", metavar="<input dir>", help="Path to an input directory.")
+        self.add_request_metrics_options()
         self.uploader = uploader
 
     @staticmethod
@@ -74,6 +74,9 @@ setup(
         'fair-identifiers-client>=0.5.1',
         'jsonschema>=3.1'
     ],
+    extras_require={
+        'async': ['aiohttp>=3.8']
+    },
     license='Apache 2.0',
     classifiers=[
         'Intended Audience :: Science/Research',
@@ -0,0 +1,59 @@
+"""Shared helpers for the offline tests of deriva.core, which run minimal local HTTP services."""
+import json
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from deriva.core import ErmrestCatalog
+
+
+class JSONRequestHandler (BaseHTTPRequestHandler):
+    """Base request handler for minimal local services, with JSON helpers and without request logging."""
+
+    def send_body(self, status, body=b'', content_type='application/json', headers=None):
+        """Send a complete response of status with the bytes body and any extra headers."""
+        self.send_response(status)
+        if body:
+            self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, doc, status=200, headers=None):
+        """Send a complete response of status with doc encoded as JSON."""
+        self.send_body(status, json.dumps(doc).encode('utf-8'), headers=headers)
+
+    def read_body(self):
+        """Return the bytes of the request body."""
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def read_json(self):
+        """Return the decoded JSON request body."""
+        return json.loads(self.read_body())
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServerTestCase (unittest.TestCase):
+    """Test case serving request handlers on local ports, which are shut down after each test."""
+
+    def start_server(self, handler):
+        """Serve handler on a free local port in a daemon thread, returning the server."""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # cleanups run last in, first out
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    @staticmethod
+    def server_host(server):
+        """Return the host:port of a server started by start_server."""
+        return '127.0.0.1:%d' % server.server_port
+
+    def start_catalog(self, handler, catalog_id='1'):
+        """Serve handler as with start_server, returning an ErmrestCatalog bound to it."""
+        return ErmrestCatalog('http', self.server_host(self.start_server(handler)), catalog_id)
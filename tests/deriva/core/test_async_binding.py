@@ -0,0 +1,158 @@
+import os
+import asyncio
+import shutil
+import tempfile
+import threading
+import unittest
+
+from deriva.core import AsyncErmrestCatalog, ConcurrentUpdate, NotModified, ResponseCache, DiskResponseCache
+
+try:
+    from aiohttp import web
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+
+def _make_app(requests_seen):
+    async def schema(request):
+        requests_seen.append(request)
+        if request.headers.get('if-none-match') == '"v1"':
+            return web.Response(status=304, headers={'ETag': '"v1"'})
+        return web.json_response({'schemas': {}}, headers={'ETag': '"v1"'})
+
+    async def entity(request):
+        requests_seen.append(request)
+        if request.method == 'POST':
+            if request.headers.get('If-Match') == '"stale"':
+                return web.Response(status=412)
+            return web.json_response(await request.json())
+        return web.Response(body=b'{"RID": "1"}\n', content_type='application/x-json-stream')
+
+    async def dropped(request):
+        # the first response is cut off by the server partway through the body
+        requests_seen.append(request)
+        body = b'0123456789' * 10000
+        resp = web.StreamResponse(headers={'Content-Length': str(len(body))})
+        await resp.prepare(request)
+        if len(requests_seen) == 1:
+            await resp.write(body[:len(body) // 2])
+            request.transport.close()
+            return resp
+        await resp.write(body)
+        return resp
+
+    app = web.Application()
+    app.router.add_get('/ermrest/catalog/1/schema', schema)
+    app.router.add_get('/ermrest/catalog/1/entity/S:U', dropped)
+    app.router.add_route('*', '/ermrest/catalog/1/entity/S:T', entity)
+    return app
+
+
+@unittest.skipUnless(HAS_AIOHTTP, "aiohttp not installed")
+class AsyncErmrestCatalogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.requests_seen = []
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _run(self, test, caching=True):
+        async def main():
+            runner = web.AppRunner(_make_app(self.requests_seen))
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            try:
+                async with AsyncErmrestCatalog('http', '127.0.0.1:%d' % port, 1, caching=caching) as catalog:
+                    await test(catalog)
+            finally:
+                await runner.cleanup()
+        asyncio.run(main())
+
+    def test_get_revalidates_cached_response(self):
+        async def test(catalog):
+            r1 = await catalog.get('/schema')
+            r2 = await catalog.get('/schema')
+            self.assertIs(r1, r2)
+            self.assertEqual(r2.json(), {'schemas': {}})
+            with self.assertRaises(NotModified):
+                await catalog.get('/schema', raise_not_modified=True)
+            self.assertEqual(catalog.cache_stats()['revalidated'], 2)
+            self.assertIn('deriva-client-context', self.requests_seen[0].headers)
+        self._run(test)
+
+    def test_cache_instances(self):
+        loop_threads = []
+
+        class _DiskCache (DiskResponseCache):
+            def get(self, url):
+                loop_threads.append(threading.get_ident())
+                return super(_DiskCache, self).get(url)
+
+            def put(self, url, response):
+                loop_threads.append(threading.get_ident())
+                return super(_DiskCache, self).put(url, response)
+
+        async def test(catalog):
+            await catalog.get('/schema')
+            await catalog.get('/schema')
+            self.assertEqual(catalog.cache_stats()['revalidated'], 1)
+            self.assertEqual(self.requests_seen[1].headers.get('if-none-match'), '"v1"')
+
+        for cache in (ResponseCache(), _DiskCache(os.path.join(self.tmpdir, 'responses.sqlite'))):
+            with self.subTest(cache=type(cache).__name__):
+                self.requests_seen.clear()
+                self._run(test, caching=cache)
+        self.assertEqual(len(loop_threads), 3)
+        self.assertNotIn(threading.get_ident(), loop_threads)
+
+    def test_concurrent_gets(self):
+        async def test(catalog):
+            rs = await asyncio.gather(*[catalog.get('/entity/S:T', cache=False) for i in range(20)])
+            self.assertTrue(all(r.status_code == 200 for r in rs))
+        self._run(test)
+
+    def test_request_observer(self):
+        async def test(catalog):
+            events = []
+            catalog.add_request_observer(events.append)
+            await catalog.get('/entity/S:T', cache=False)
+            self.assertEqual(len(events), 1)
+            self.assertEqual((events[0].method, events[0].path, events[0].status, events[0].response_bytes),
+                             ('GET', '/ermrest/catalog/{catalog}/entity', 200, 13))
+        self._run(test)
+
+    def test_post_and_guard(self):
+        async def test(catalog):
+            r = await catalog.post('/entity/S:T', json=[{'x': 1}])
+            self.assertEqual(r.json(), [{'x': 1}])
+            with self.assertRaises(ConcurrentUpdate):
+                await catalog.post('/entity/S:T', json=[], headers={'If-Match': '"stale"'})
+        self._run(test)
+
+    def test_get_as_file(self):
+        destfilename = os.path.join(self.tmpdir, 'out.json')
+
+        async def test(catalog):
+            await catalog.get_as_file('/entity/S:T', destfilename)
+        self._run(test)
+        with open(destfilename, 'rb') as f:
+            self.assertEqual(f.read(), b'{"RID": "1"}\n')
+
+    def test_get_as_file_retries_dropped_body(self):
+        destfilename = os.path.join(self.tmpdir, 'out.json')
+
+        async def test(catalog):
+            await catalog.get_as_file('/entity/S:U', destfilename)
+        self._run(test)
+        self.assertEqual(len(self.requests_seen), 2)
+        with open(destfilename, 'rb') as f:
+            self.assertEqual(f.read(), b'0123456789' * 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
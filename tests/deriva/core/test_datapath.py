@@ -6,12 +6,17 @@
 #  DERIVA_PY_TEST_VERBOSE: set for verbose logging output to stdout
 
 from copy import deepcopy
+import json
 import logging
 from operator import itemgetter
 import os
+import re
+import time
 import unittest
+from urllib.parse import unquote
 from deriva.core import DerivaServer, get_credential, ermrest_model as _em, __version__
 from deriva.core.datapath import *
+from . import LocalServerTestCase, JSONRequestHandler
 
 try:
     from pandas import DataFrame
@@ -19,6 +24,18 @@ try:
 except ImportError:
     HAS_PANDAS = False
 
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    import pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
 TEST_EXP_MAX = 100
 TEST_EXPTYPE_MAX = 10
 TEST_EXP_NAME_FORMAT = "experiment-{}"
@@ -519,6 +536,25 @@ class DatapathTests (unittest.TestCase):
                     with self.assertRaises(ValueError):
                         _do_query()
 
+    def test_iter(self):
+        tests = [
+            ('entities', self.experiment.entities(), TEST_EXP_MAX),
+            ('sorted entities', self.experiment.entities().sort(self.experiment.Amount.desc), TEST_EXP_MAX),
+            ('attributes', self.experiment.attributes(self.experiment.Name), TEST_EXP_MAX),
+            ('attributegroup', self.experiment.groupby(self.experiment.Type).attributes(
+                Cnt(self.experiment.Amount).alias('n')), TEST_EXPTYPE_MAX),
+            ('limited', self.experiment.entities().limit(15), 15),
+        ]
+        for name, results, expected in tests:
+            with self.subTest(name=name):
+                rows = list(results.iter(page_size=7))
+                self.assertEqual(len(rows), expected)
+                self.assertEqual(len({json.dumps(row, sort_keys=True) for row in rows}), expected)
+                if name == 'attributes':
+                    self.assertEqual(set(rows[0]), {'Name'})
+                if name == 'sorted entities':
+                    self.assertEqual([row['Amount'] for row in rows], sorted((row['Amount'] for row in rows), reverse=True))
+
     def test_link_implicit(self):
         results = self.experiment.link(self.experiment_type).entities()
         self.assertEqual(TEST_EXPTYPE_MAX, len(results))
@@ -572,6 +608,18 @@ class DatapathTests (unittest.TestCase):
                 results = self.experiment_type.link(table, on=fkey).entities()
                 self.assertEqual(expected_results_len, len(results))
 
+    def test_link_to(self):
+        results = self.experiment.link_to(self.experiment_type).entities()
+        self.assertEqual(TEST_EXPTYPE_MAX, len(results))
+        with self.assertRaises(DataPathException):
+            self.experiment_type.link_to(self.project)
+        graph = self.model.schema_graph()
+        join_paths = graph.shortest_paths(self.experiment_type._wrapped_table, self.project._wrapped_table, k=3)
+        self.assertEqual([len(join_path) for join_path in join_paths], [2, 2])
+        join_path = [jp for jp in join_paths if jp[0].target.name == TNAME_EXPERIMENT][0]
+        results = self.experiment_type.link_to(self.project, join_path=join_path).entities()
+        self.assertEqual(TEST_PROJ_MAX, len(results))
+
     def test_filter_equality(self):
         # test with value
         results = self.experiment.filter(
@@ -699,6 +747,16 @@ class DatapathTests (unittest.TestCase):
         df = DataFrame(results)
         self.assertEqual(len(df), TEST_EXP_MAX)
 
+    @unittest.skipUnless(HAS_PANDAS, "pandas library not available")
+    def test_to_pandas(self):
+        df = self.experiment.entities().to_pandas()
+        self.assertEqual(len(df), TEST_EXP_MAX)
+        self.assertEqual(str(df['Amount'].dtype), 'Int32')
+        self.assertEqual(str(df['Empty'].dtype), 'Int32')
+        self.assertEqual(str(df['Time'].dtype), 'datetime64[us, UTC]')
+        df = self.experiment.aggregates(Cnt(self.experiment.Amount).alias('n')).to_pandas()
+        self.assertEqual(str(df['n'].dtype), 'Int64')
+
     def test_insert_double_fetch(self):
         entities = _generate_experiment_entities(self.types, 2)
         results = self.experiment_copy.insert(entities)
@@ -753,6 +811,16 @@ class DatapathTests (unittest.TestCase):
         self.assertEqual(inserted[0]['RID'], updated[0]['RID'])
         self.assertNotEqual(inserted[0]['Name'], updated[0]['Name'])
 
+    def test_upsert(self):
+        self.experiment_copy.insert(_generate_experiment_entities(self.types, 5))
+        entities = _generate_experiment_entities(self.types, 10)
+        for entity in entities:
+            entity['Amount'] += 100
+        results = self.experiment_copy.upsert(entities, max_batch_rows=3)
+        self.assertEqual(len(results), 10)
+        amounts = sorted(row['Amount'] for row in self.experiment_copy.entities())
+        self.assertEqual(amounts, list(range(100, 110)))
+
     def test_update_empty_entities(self):
         results = self.experiment_copy.update(None)
         self.assertEqual(len(results), 0)
@@ -889,5 +957,244 @@ class DatapathTests (unittest.TestCase):
         self.assertIn('RID', results[0]['Experiment_Project Investigator_Project_Num_fkey'][0])
 
 
+class _PagingHandler (JSONRequestHandler):
+    """Minimal ERMrest serving a model and keyset-paged rows of one table, sorted by RID."""
+    rows = [{'RID': 'R%02d' % i, 'RCT': '2020-01-01T00:00:%02d.5-08:00' % i, 'name': 'n%d' % (i % 3), 'value': i}
+            for i in range(25)]
+    paths = []
+
+    def do_GET(self):
+        if self.path.endswith('/schema'):
+            table_def = _em.Table.define('T', [_em.Column.define(cname, ctype) for cname, ctype in [
+                ('name', _em.builtin_types.text), ('value', _em.builtin_types.int4)]])
+            body = {'schemas': {'S': dict(_em.Schema.define('S'), tables={'T': table_def})}}
+        else:
+            self.paths.append(unquote(self.path))
+            after = re.search(r'@after\(([^)]*)\)', self.path)
+            limit = re.search(r'limit=(\d+)', self.path)
+            limit = int(limit.group(1)) if limit else None
+            body = [row for row in self.rows if after is None or row['RID'] > after.group(1)][0:limit]
+            if '_RID:=' in self.path:
+                body = [{'name': row['name'], '_RID': row['RID']} for row in body]
+        if self.headers.get('Accept') == 'application/x-json-stream':
+            self.send_body(200, ''.join(json.dumps(row) + '\n' for row in body).encode('utf-8'),
+                           'application/x-json-stream')
+        else:
+            self.send_json(body)
+
+
+class ResultSetIterTests (LocalServerTestCase):
+
+    def setUp(self):
+        self.table = self.start_catalog(_PagingHandler).getPathBuilder().schemas['S'].tables['T']
+        _PagingHandler.paths = []
+
+    def test_iter_entities_by_page(self):
+        rows = list(self.table.entities().iter(page_size=10))
+        self.assertEqual(rows, _PagingHandler.rows)
+        self.assertEqual(len(_PagingHandler.paths), 3)
+        self.assertTrue(_PagingHandler.paths[0].endswith('/entity/T:=S:T@sort(RID)?limit=10'))
+        self.assertTrue(_PagingHandler.paths[1].endswith('@sort(RID)@after(R09)?limit=10'))
+
+    def test_iter_batches_within_limit(self):
+        batches = list(self.table.entities().limit(15).iter(page_size=10, batches=True))
+        self.assertEqual([len(batch) for batch in batches], [10, 5])
+        self.assertTrue(_PagingHandler.paths[1].endswith('@after(R09)?limit=5'))
+
+    def test_iter_attributes_hides_page_key(self):
+        rows = list(self.table.attributes(self.table.name).iter(page_size=10))
+        self.assertEqual(rows, [{'name': row['name']} for row in _PagingHandler.rows])
+        self.assertIn('/attribute/T:=S:T/name,_RID:=T:RID@sort(_RID)', _PagingHandler.paths[0])
+        self.assertTrue(_PagingHandler.paths[1].endswith('@sort(_RID)@after(R09)?limit=10'))
+
+
+class ResultSetColumnarTests (LocalServerTestCase):
+
+    def setUp(self):
+        self.table = self.start_catalog(_PagingHandler).getPathBuilder().schemas['S'].tables['T']
+        _PagingHandler.paths = []
+
+    @unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+    def test_to_numpy(self):
+        columns = self.table.entities().to_numpy(page_size=10)
+        self.assertEqual(list(columns), ['RID', 'RCT', 'name', 'value'])
+        self.assertEqual(columns['value'].dtype, numpy.dtype('int32'))
+        self.assertEqual(columns['value'].tolist(), list(range(25)))
+        self.assertEqual(columns['RCT'][1], numpy.datetime64('2020-01-01T08:00:01.500000'))
+        self.assertEqual(columns['name'].dtype, numpy.dtype(object))
+        self.assertEqual(len(_PagingHandler.paths), 3)
+
+    @unittest.skipUnless(HAS_PANDAS, "pandas is not installed")
+    def test_to_pandas(self):
+        results = self.table.entities().fetch()
+        df = results.to_pandas()
+        self.assertEqual(len(_PagingHandler.paths), 1)
+        self.assertEqual(str(df['value'].dtype), 'Int32')
+        self.assertEqual(str(df['RCT'].dtype), 'datetime64[us, UTC]')
+        self.assertEqual(df['name'].tolist(), [row['name'] for row in _PagingHandler.rows])
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_to_arrow_from_json_stream(self):
+        table = self.table.entities().to_arrow()
+        self.assertEqual(table.num_rows, 25)
+        self.assertEqual(table.schema.field('value').type, pyarrow.int32())
+        self.assertEqual(table.schema.field('RCT').type, pyarrow.timestamp('us', tz='UTC'))
+        self.assertEqual(table.column('RCB').null_count, 25)
+        self.assertEqual(table.column('RID').to_pylist(), [row['RID'] for row in _PagingHandler.rows])
+        self.assertEqual(
+            table.column('RCT')[0].as_py().isoformat(),
+            '2020-01-01T08:00:00.500000+00:00'
+        )
+
+
+
+class _BatchHandler (_PagingHandler):
+    """Minimal ERMrest echoing inserted and updated rows, after a delay given by their value, failing on name 'fail'."""
+
+    body_sizes = []
+
+    def _echo(self):
+        body = self.read_body()
+        rows = json.loads(body)
+        self.paths.append((self.command, unquote(self.path), len(rows)))
+        self.body_sizes.append(len(body))
+        time.sleep(0.002 * (rows[0]['value'] % 5))
+        if any(row['name'] == 'fail' for row in rows):
+            self.send_body(409, b'409 Conflict\nThe request conflicts with the state of the server.', 'text/plain')
+        else:
+            self.send_json(rows)
+
+    do_POST = do_PUT = _echo
+
+
+class ConcurrentBatchTests (LocalServerTestCase):
+
+    def setUp(self):
+        self.table = self.start_catalog(_BatchHandler).getPathBuilder().schemas['S'].tables['T']
+        self.entities = [{'name': 'n%d' % i, 'value': i} for i in range(50)]
+        _BatchHandler.paths = []
+        _BatchHandler.body_sizes = []
+
+    def test_insert_concurrent_in_input_order(self):
+        results = self.table.insert(self.entities, max_batch_rows=3, workers=4)
+        self.assertEqual(list(results), self.entities)
+        self.assertEqual(len(_BatchHandler.paths), 17)
+        self.assertTrue(all(method == 'POST' for method, path, nrows in _BatchHandler.paths))
+
+    def test_update_concurrent_in_input_order(self):
+        results = self.table.update(self.entities, correlation={'name'}, max_batch_rows=3, workers=4)
+        self.assertEqual(list(results), self.entities)
+        self.assertTrue(_BatchHandler.paths[0][1].endswith('/attributegroup/S:T/name;value'))
+
+    def test_insert_fail_fast(self):
+        self.entities[4]['name'] = 'fail'
+        with self.assertRaises(DataPathException) as cm:
+            self.table.insert(self.entities, max_batch_rows=3, workers=2)
+        self.assertNotIsInstance(cm.exception, DataPathBatchException)
+        self.assertLess(len(_BatchHandler.paths), 17)
+
+    def test_insert_collect_errors(self):
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                entities = [dict(entity) for entity in self.entities]
+                entities[4]['name'] = entities[40]['name'] = 'fail'
+                _BatchHandler.paths = []
+                with self.assertRaises(DataPathBatchException) as cm:
+                    self.table.insert(iter(entities), max_batch_rows=3, workers=workers, fail_fast=False)
+                self.assertEqual(len(_BatchHandler.paths), 17)
+                self.assertEqual([(start, stop) for start, stop, e in cm.exception.errors], [(3, 6), (39, 42)])
+                self.assertEqual(cm.exception.failed_entities(), entities[3:6] + entities[39:42])
+                self.assertIsInstance(cm.exception.errors[0][2], DataPathException)
+                self.assertEqual(cm.exception.results, entities[0:3] + entities[6:39] + entities[42:])
+
+    def test_unbatched_insert(self):
+        results = self.table.insert(self.entities, max_batch_rows=False, workers=4)
+        self.assertEqual(list(results), self.entities)
+        self.assertEqual([nrows for method, path, nrows in _BatchHandler.paths], [50])
+
+    def test_insert_from_generator_by_encoded_size(self):
+        entities = ({'name': 'n%d' % i, 'value': i} for i in range(50))
+        results = self.table.insert(entities, max_batch_bytes=200, workers=2)
+        self.assertEqual(list(results), self.entities)
+        self.assertTrue(all(size <= 200 for size in _BatchHandler.body_sizes))
+        self.assertEqual(sum(nrows for method, path, nrows in _BatchHandler.paths), 50)
+        self.assertEqual(max(nrows for method, path, nrows in _BatchHandler.paths), 8)
+
+    def test_update_from_generator_without_results(self):
+        results = self.table.update(iter(self.entities), correlation={'name'}, max_batch_rows=10, keep_results=False)
+        self.assertEqual(len(results), 0)
+        self.assertEqual([nrows for method, path, nrows in _BatchHandler.paths], [10] * 5)
+
+    def test_insert_empty_generator(self):
+        self.assertEqual(len(self.table.insert(iter([]))), 0)
+        self.assertEqual(_BatchHandler.paths, [])
+
+
+
+class _UpsertHandler (JSONRequestHandler):
+    """Minimal ERMrest storing rows of a table keyed by name, inserting with on-conflict skip and updating by name."""
+    stored = {}
+    paths = []
+
+    def do_GET(self):
+        table_def = _em.Table.define(
+            'T', [_em.Column.define(cname, ctype) for cname, ctype in [
+                ('name', _em.builtin_types.text), ('value', _em.builtin_types.int4), ('id', _em.builtin_types.int8)]],
+            key_defs=[_em.Key.define(['name']), _em.Key.define(['id'])]
+        )
+        self.send_json({'schemas': {'S': dict(_em.Schema.define('S'), tables={'T': table_def})}})
+
+    def do_POST(self):
+        rows = self.read_json()
+        self.paths.append((self.command, unquote(self.path), len(rows)))
+        assert 'onconflict=skip' in self.path
+        created = [dict(row, RID='R-%s' % row['name']) for row in rows if row['name'] not in self.stored]
+        for row in created:
+            # the catalog returns canonical values of the column types
+            if row.get('id') is not None:
+                row['id'] = int(row['id'])
+        self.stored.update((row['name'], row) for row in created)
+        self.send_json(created)
+
+    def do_PUT(self):
+        rows = self.read_json()
+        self.paths.append((self.command, unquote(self.path), len(rows)))
+        assert self.path.endswith('/attributegroup/S:T/name;value')
+        for row in rows:
+            self.stored[row['name']]['value'] = row['value']
+        self.send_json(rows)
+
+
+class UpsertTests (LocalServerTestCase):
+
+    def setUp(self):
+        self.table = self.start_catalog(_UpsertHandler).getPathBuilder().schemas['S'].tables['T']
+        _UpsertHandler.stored = {'n%d' % i: {'RID': 'R-n%d' % i, 'name': 'n%d' % i, 'value': -1} for i in range(0, 20, 2)}
+        _UpsertHandler.paths = []
+
+    def test_upsert_inserts_and_updates_skipped(self):
+        entities = [{'name': 'n%d' % i, 'value': i} for i in range(20)]
+        results = self.table.upsert(entities, max_batch_rows=4, workers=2)
+        self.assertEqual({name: row['value'] for name, row in _UpsertHandler.stored.items()}, {'n%d' % i: i for i in range(20)})
+        self.assertEqual([row['name'] for row in results], ['n%d' % i for i in range(1, 20, 2)] + ['n%d' % i for i in range(0, 20, 2)])
+        self.assertEqual([(method, nrows) for method, path, nrows in _UpsertHandler.paths if method == 'PUT'], [('PUT', 4)] * 2 + [('PUT', 2)])
+
+    def test_upsert_without_skipped_entities(self):
+        self.table.upsert([{'name': 'x', 'value': 1}], key=[self.table.name])
+        self.assertEqual([method for method, path, nrows in _UpsertHandler.paths], ['POST'])
+        self.assertEqual(_UpsertHandler.stored['x']['value'], 1)
+
+    def test_upsert_compares_canonical_key_values(self):
+        results = self.table.upsert([{'id': '7', 'name': 'x', 'value': 1}], key=['id'])
+        self.assertEqual([method for method, path, nrows in _UpsertHandler.paths], ['POST'])
+        self.assertEqual([row['id'] for row in results], [7])
+
+    def test_upsert_requires_usable_key(self):
+        with self.assertRaises(ValueError):
+            self.table.upsert([{'name': 'x', 'value': 1}], key=['value'])
+        with self.assertRaises(ValueError):
+            self.table.upsert([{'name': 'x', 'value': 1}], defaults={'name'})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,328 @@
+import os
+import io
+import re
+import csv
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from urllib.parse import urlsplit, unquote, parse_qs
+
+from deriva.core import PageSizeController, crockford_b32encode, ermrest_catalog, ermrest_model
+from deriva.core.ermrest_catalog import _missing_keys
+from . import LocalServerTestCase, JSONRequestHandler
+
+ROWS = [{'RID': crockford_b32encode(1000 + i * 37), 'name': 'row %d' % i} for i in range(500)]
+
+
+class _PagedHandler(JSONRequestHandler):
+    """Minimal ERMrest entity API supporting @sort(RID), @after() and limit over ROWS in string order."""
+    requests_seen = []
+    runtime_failures = 0
+
+    def do_GET(self):
+        self.requests_seen.append(self.path)
+        parts = urlsplit(self.path)
+        path = unquote(parts.path)
+        limit = parse_qs(parts.query).get('limit', ['none'])[0]
+        if limit != '1' and _PagedHandler.runtime_failures > 0:
+            _PagedHandler.runtime_failures -= 1
+            return self.send_body(400, b'Query run time limit exceeded.\n', 'text/plain')
+        rows = sorted(ROWS, key=lambda row: row['RID'])
+        if '@sort(RID::desc::)' in path:
+            rows.reverse()
+        if '@after(' in path:
+            after = path.split('@after(')[1].rstrip(')')
+            rows = [row for row in rows if (row['RID'] < after if '::desc::' in path else row['RID'] > after)]
+        if limit != 'none':
+            rows = rows[:int(limit)]
+
+        accept = self.headers.get('Accept')
+        if accept == 'text/csv':
+            out = io.StringIO()
+            writer = csv.DictWriter(out, ['RID', 'name'], lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(rows)
+            body = out.getvalue().encode('utf-8')
+        elif accept == 'application/x-json-stream':
+            body = b''.join(json.dumps(row).encode('utf-8') + b'\n' for row in rows)
+        else:
+            return self.send_json(rows)
+        self.send_body(200, body, accept)
+
+
+class _SinkHandler(JSONRequestHandler):
+    """Minimal ERMrest entity API accepting POSTed rows and reporting the greatest RID received."""
+    rows = []
+
+    def do_GET(self):
+        self.send_json(sorted(self.rows, key=lambda row: row['RID'])[-1:])
+
+    def do_POST(self):
+        self.rows.extend(self.read_json())
+        self.send_body(200)
+
+
+class CloneTableDataTests(LocalServerTestCase):
+
+    def setUp(self):
+        self.src, self.dst = [self.start_catalog(handler) for handler in (_PagedHandler, _SinkHandler)]
+        _PagedHandler.runtime_failures = 0
+        _SinkHandler.rows = []
+
+    def test_copy_and_resume(self):
+        self.src._clone_table_data(self.dst, 'S:T', 64)
+        expected = sorted(ROWS, key=lambda row: row['RID'])
+        self.assertEqual(_SinkHandler.rows, expected)
+        _SinkHandler.rows = expected[:100]
+        self.src._clone_table_data(self.dst, 'S:T', 64)
+        self.assertEqual(_SinkHandler.rows, expected)
+
+
+def _table_handler(rows):
+    """Make a minimal ERMrest handler over the rows dict of one table, keyed by RID."""
+
+    class _TableHandler(JSONRequestHandler):
+
+        def _path(self):
+            parts = urlsplit(self.path)
+            return unquote(parts.path), parse_qs(parts.query)
+
+        def _reply(self, status, data=None):
+            if data is None:
+                return self.send_body(status)
+            self.send_json(data, status)
+
+        def do_GET(self):
+            path, query = self._path()
+            result = sorted(rows.values(), key=lambda row: row['RID'])
+            if '/RMT::gt::' in path:
+                since = path.split('/RMT::gt::')[1].split('@')[0]
+                result = [row for row in result if row['RMT'] > since]
+            if '@after(' in path:
+                after = path.split('@after(')[1].rstrip(')')
+                result = [row for row in result if row['RID'] > after]
+            result = result[:int(query['limit'][0])]
+            if '/attribute/' in path:
+                result = [{'RID': row['RID']} for row in result]
+            self._reply(200, result)
+
+        def do_POST(self):
+            for row in self.read_json():
+                rows.setdefault(row['RID'], dict(row))
+            self._reply(200, [])
+
+        def do_PUT(self):
+            for row in self.read_json():
+                rows[row['RID']].update(row)
+            self._reply(200, [])
+
+        def do_DELETE(self):
+            for pred in self._path()[0].rsplit('/', 1)[1].split(';'):
+                del rows[pred.split('=', 1)[1]]
+            self._reply(204)
+
+    return _TableHandler
+
+
+class SyncTableDataTests(LocalServerTestCase):
+
+    def setUp(self):
+        self.src_rows = {rid: {'RID': rid, 'RMT': '2024-01-0%d' % (1 + i % 3), 'name': 'row %s' % rid}
+                         for i, rid in enumerate(crockford_b32encode(1000 + i * 7) for i in range(50))}
+        self.dst_rows = {}
+        self.src, self.dst = [self.start_catalog(_table_handler(rows)) for rows in (self.src_rows, self.dst_rows)]
+
+    def test_full_then_incremental(self):
+        self.assertEqual(self.src._sync_table_upserts(self.dst, 'S:T', ['name'], None, 8), 50)
+        self.assertEqual(self.src._sync_table_deletes(self.dst, 'S:T', 8), 0)
+        self.assertEqual(self.dst_rows, self.src_rows)
+
+        rids = sorted(self.src_rows)
+        del self.src_rows[rids[0]], self.src_rows[rids[10]]
+        self.src_rows[rids[5]].update(name='changed', RMT='2024-02-01')
+        self.src_rows['ZZZZ'] = {'RID': 'ZZZZ', 'RMT': '2024-02-01', 'name': 'new'}
+        self.assertEqual(self.src._sync_table_upserts(self.dst, 'S:T', ['name'], '2024-01-03', 8), 2)
+        self.assertEqual(self.src._sync_table_deletes(self.dst, 'S:T', 8), 2)
+        self.assertEqual(self.dst_rows[rids[5]]['name'], 'changed')
+        self.assertEqual(set(self.dst_rows), set(self.src_rows))
+
+    def test_missing_keys(self):
+        self.assertEqual(list(_missing_keys(['a', 'c', 'd'], ['a', 'b', 'd', 'e'])), ['b', 'e'])
+        self.assertEqual(list(_missing_keys([], ['a'])), ['a'])
+        with self.assertRaises(ValueError):
+            list(_missing_keys(['a', 'c'], ['b', 'a']))
+
+
+def _catalog_handler(tables, enforce_fkeys=False, delay=0.0):
+    """Make a minimal ERMrest handler over the rows dicts of parent table S:P and child table S:C, keyed by RID.
+
+    With enforce_fkeys, inserts of C rows referencing missing P rows and deletes of referenced P rows fail with 409.
+    Requests to S:P are delayed by delay seconds.
+    """
+    model_doc = {'schemas': {'S': dict(ermrest_model.Schema.define('S'), tables={
+        'P': ermrest_model.Table.define('P', [ermrest_model.Column.define('name', ermrest_model.builtin_types.text)]),
+        'C': ermrest_model.Table.define('C', [
+            ermrest_model.Column.define('name', ermrest_model.builtin_types.text),
+            ermrest_model.Column.define('parent', ermrest_model.builtin_types.text),
+        ], fkey_defs=[ermrest_model.ForeignKey.define(['parent'], 'S', 'P', ['RID'])]),
+    })}}
+    for table_doc in model_doc['schemas']['S']['tables'].values():
+        table_doc['kind'] = 'table'
+
+    class _CatalogHandler(_table_handler(None)):
+
+        def _route(self):
+            path, query = self._path()
+            rest = re.match(r'/ermrest/catalog/1(?:@[^/]*)?(/.*)?$', path).group(1) or '/'
+            tname = rest.split('/')[2].split('@')[0].split(':')[-1] if rest.count('/') >= 2 else None
+            if tname == 'P':
+                time.sleep(delay)
+            return rest, query, tname
+
+        def _conflict(self):
+            self._reply(409, 'foreign key violation')
+
+        def do_GET(self):
+            rest, query, tname = self._route()
+            if rest == '/':
+                return self._reply(200, {'id': '1', 'snaptime': 'SNAP'})
+            if rest == '/schema':
+                return self._reply(200, model_doc)
+            result = sorted(tables[tname].values(), key=lambda row: row['RID'])
+            if '@after(' in rest:
+                after = rest.split('@after(')[1].rstrip(')')
+                result = [row for row in result if row['RID'] > after]
+            result = result[:int(query['limit'][0])]
+            if rest.startswith('/attribute/'):
+                result = [{'RID': row['RID']} for row in result]
+            self._reply(200, result)
+
+        def do_POST(self):
+            rest, query, tname = self._route()
+            body = self.read_json()
+            if enforce_fkeys and tname == 'C' and any(row['parent'] not in tables['P'] for row in body):
+                return self._conflict()
+            for row in body:
+                tables[tname].setdefault(row['RID'], dict(row))
+            self._reply(200, [])
+
+        def do_PUT(self):
+            rest, query, tname = self._route()
+            body = self.read_json()
+            if rest.startswith('/attributegroup/'):
+                for row in body:
+                    tables[tname][row['RID']].update(row)
+            self._reply(200, [])
+
+        def do_DELETE(self):
+            rest, query, tname = self._route()
+            rids = [pred.split('=', 1)[1] for pred in rest.rsplit('/', 1)[1].split(';')]
+            if enforce_fkeys and tname == 'P' and any(row['parent'] in rids for row in tables['C'].values()):
+                return self._conflict()
+            for rid in rids:
+                del tables[tname][rid]
+            self._reply(204)
+
+    return _CatalogHandler
+
+
+class SyncCatalogTests(LocalServerTestCase):
+
+    def setUp(self):
+        self.src_tables = {
+            'P': {'P2': {'RID': 'P2', 'RMT': '2024-01-02', 'name': 'p2'}},
+            'C': {'C2': {'RID': 'C2', 'RMT': '2024-01-02', 'name': 'c2', 'parent': 'P2'}},
+        }
+        self.dst_tables = {
+            'P': {'P1': {'RID': 'P1', 'RMT': '2024-01-01', 'name': 'p1'}},
+            'C': {'C1': {'RID': 'C1', 'RMT': '2024-01-01', 'name': 'c1', 'parent': 'P1'}},
+        }
+        self.src = self.start_catalog(_catalog_handler(self.src_tables, delay=0.05))
+        self.dst = self.start_catalog(_catalog_handler(self.dst_tables, enforce_fkeys=True, delay=0.05))
+
+    def test_parent_child_order(self):
+        result = self.src.sync_catalog(self.dst, copy_workers=4)
+        self.assertEqual(result['tables'], {
+            'S:P': {'upserted': 1, 'deleted': 1},
+            'S:C': {'upserted': 1, 'deleted': 1},
+        })
+        self.assertEqual(self.dst_tables, self.src_tables)
+
+    def test_fkey_tiers(self):
+        self.assertEqual(
+            ermrest_catalog._fkey_tiers({'a': set(), 'b': {'a', 'b'}, 'c': {'b', 'd'}, 'd': {'c'}, 'e': {'a'}}),
+            [{'a'}, {'b', 'e'}, {'c', 'd'}]
+        )
+
+
+class PagedGetAsFileTests(LocalServerTestCase):
+
+    def setUp(self):
+        self.catalog = self.start_catalog(_PagedHandler)
+        self.tmpdir = tempfile.mkdtemp()
+        _PagedHandler.requests_seen = []
+        _PagedHandler.runtime_failures = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _get(self, accept, **kwargs):
+        destfile = os.path.join(self.tmpdir, 'out')
+        self.catalog.get_as_file('/entity/S:T', destfile, headers={'accept': accept}, paged=True, page_size=32,
+                                 **kwargs)
+        with open(destfile, 'rb') as f:
+            return f.read()
+
+    def test_parallel_json_stream_matches_serial(self):
+        serial = self._get('application/x-json-stream')
+        self.assertEqual(len(serial.splitlines()), len(ROWS))
+        self.assertEqual(self._get('application/x-json-stream', page_workers=4), serial)
+        self.assertTrue(any('@after(' in p and 'limit=1' in p for p in _PagedHandler.requests_seen))
+        self.assertEqual([f for f in os.listdir(self.tmpdir) if '.part' in f], [])
+
+    def test_parallel_csv_matches_serial(self):
+        serial = self._get('text/csv')
+        self.assertEqual(len(serial.splitlines()), len(ROWS) + 1)
+        self.assertEqual(self._get('text/csv', page_workers=3), serial)
+
+    def test_json_stream_pages_are_streamed_in_chunks(self):
+        serial = self._get('application/x-json-stream')
+        chunk_size = ermrest_catalog.DEFAULT_PAGE_STREAM_CHUNK_SIZE
+        ermrest_catalog.DEFAULT_PAGE_STREAM_CHUNK_SIZE = 7
+        try:
+            self.assertEqual(self._get('application/x-json-stream'), serial)
+            self.assertEqual(self._get('application/x-json-stream', page_workers=4), serial)
+        finally:
+            ermrest_catalog.DEFAULT_PAGE_STREAM_CHUNK_SIZE = chunk_size
+
+    def test_page_size_recovers_after_runtime_limit(self):
+        serial = self._get('application/x-json-stream')
+        _PagedHandler.requests_seen = []
+        _PagedHandler.runtime_failures = 1
+        self.assertEqual(self._get('application/x-json-stream'), serial)
+        limits = [parse_qs(urlsplit(p).query)['limit'][0] for p in _PagedHandler.requests_seen]
+        self.assertEqual(limits[:4], ['32', '16', '32', '32'])
+
+    def test_page_size_controller_grows(self):
+        serial = self._get('text/csv')
+        _PagedHandler.requests_seen = []
+        destfile = os.path.join(self.tmpdir, 'out')
+        controller = PageSizeController(8, max_size=128)
+        self.catalog.get_as_file('/entity/S:T', destfile, headers={'accept': 'text/csv'}, paged=True,
+                                 page_size=controller)
+        with open(destfile, 'rb') as f:
+            self.assertEqual(f.read(), serial)
+        limits = [int(parse_qs(urlsplit(p).query)['limit'][0]) for p in _PagedHandler.requests_seen]
+        self.assertEqual(limits[:5], [8, 16, 32, 64, 128])
+
+    def test_parallel_cancelled_by_callback(self):
+        destfile = os.path.join(self.tmpdir, 'out')
+        self.catalog.get_as_file('/entity/S:T', destfile, headers={'accept': 'application/x-json-stream'},
+                                 paged=True, page_size=32, page_workers=4, callback=lambda **kwargs: False)
+        self.assertEqual(os.listdir(self.tmpdir), ['out'])
+
+
+if __name__ == '__main__':
+    unittest.main()
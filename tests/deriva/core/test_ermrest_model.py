@@ -6,11 +6,15 @@
 #  DERIVA_PY_TEST_CREDENTIAL: user credential, if none, it will attempt to get credential for given hostname (optional)
 #  DERIVA_PY_TEST_VERBOSE: set for verbose logging output to stdout (optional)
 
+import copy
+import gc
 import logging
 import os
+import json
+import requests
 import datetime
 import unittest
-from deriva.core import DerivaServer, get_credential, ermrest_model, tag
+from deriva.core import DerivaServer, get_credential, ermrest_model, tag, AttrDict
 from deriva.core import \
     crockford_b32encode, crockford_b32decode, \
     int_to_uintX, uintX_to_int, \
@@ -20,6 +24,7 @@ from deriva.core.ermrest_model import \
     snaptime_to_epoch_microseconds, epoch_microseconds_to_snaptime, \
     datetime_to_snaptime, snaptime_to_datetime, \
     timestamptz_to_snaptime, snaptime_to_timestamptz
+from . import LocalServerTestCase, JSONRequestHandler
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
@@ -109,6 +114,248 @@ class ErmrestTimestampCodingTests (unittest.TestCase):
             self.assertEqual(ts, snaptime_to_timestamptz(snap), f"{ts=} {snap=}")
 
 
+def _model_doc(ntables=20):
+    """Build an offline model document of tables which each reference the previous table and table T0."""
+    schema_def = ermrest_model.Schema.define('S')
+    schema_def['tables'] = {}
+    for i in range(ntables):
+        fkey_defs = [
+            ermrest_model.ForeignKey.define(['ref'], 'S', 'T%d' % max(i - 1, 0), ['RID'], constraint_name='T%d_ref_fkey' % i),
+            ermrest_model.ForeignKey.define(['root'], 'S', 'T0', ['RID'], constraint_name='T%d_root_fkey' % i),
+        ]
+        if i == 1:
+            fkey_defs.append(ermrest_model.ForeignKey.define(['ref'], 'S', 'missing', ['RID'], constraint_name='T1_missing_fkey'))
+        table_def = ermrest_model.Table.define(
+            'T%d' % i,
+            column_defs=[ermrest_model.Column.define(cname, ermrest_model.builtin_types.text) for cname in ['ref', 'root']],
+            fkey_defs=fkey_defs,
+        )
+        table_def.update(schema_name='S', kind='table')
+        schema_def['tables'][table_def['table_name']] = table_def
+        table_def['keys'][0]['names'] = [['S', 'T%d_RID_key' % i]]
+    return {'schemas': {'S': schema_def}}
+
+
+class LazyModelTests (unittest.TestCase):
+
+    def test_lazy_model_matches_eager_model(self):
+        eager = ermrest_model.Model(None, _model_doc())
+        lazy = ermrest_model.Model(None, _model_doc(), lazy=True)
+        t5 = lazy.table('S', 'T5')
+        self.assertEqual(repr(lazy.schemas['S'].tables), '<_LazyMap of 20, 1 constructed>')
+        self.assertEqual(t5.foreign_keys[0].pk_table.name, 'T4')
+        self.assertEqual([fk.table.name for fk in t5.referenced_by], ['T6'])
+        self.assertEqual([fk.constraint_name for fk in lazy.table('S', 'T0').referenced_by],
+                         [fk.constraint_name for fk in eager.table('S', 'T0').referenced_by])
+        self.assertIs(lazy.fkey(('S', 'T9_ref_fkey')).table, lazy.table('S', 'T9'))
+        self.assertEqual(len(lazy.table('S', 'T1').foreign_keys), len(eager.table('S', 'T1').foreign_keys))
+        self.assertEqual(lazy.prejson(), eager.prejson())
+        self.assertEqual(list(lazy.schemas['S'].tables), list(eager.schemas['S'].tables))
+
+    def test_lazy_model_materializes_before_mutation(self):
+        lazy = ermrest_model.Model(None, _model_doc(), lazy=True)
+        lazy.table('S', 'T3')
+        lazy._materialize()
+        self.assertFalse(lazy._lazy)
+        self.assertEqual(repr(lazy.schemas['S'].tables), '<_LazyMap of 20, 20 constructed>')
+        self.assertEqual(len(lazy.table('S', 'T0').referenced_by), 22)
+
+
+class CompactModelTests (unittest.TestCase):
+
+    def test_empty_containers_allocated_on_access(self):
+        model = ermrest_model.Model(None, _model_doc())
+        column = model.column('S', 'T3', 'ref')
+        self.assertIsNone(column._annotations)
+        self.assertEqual(column.prejson()['annotations'], {})
+        self.assertIsNone(column._annotations)
+        self.assertEqual(column.annotations, {})
+        self.assertNotIn(tag.display, column.annotations)
+        self.assertIsNone(column._annotations)
+        column.annotations[tag.display] = {'name': 'Ref'}
+        self.assertIs(column._annotations, column.annotations)
+        self.assertEqual(column.prejson()['annotations'], {tag.display: {'name': 'Ref'}})
+        self.assertEqual(model.column('S', 'T4', 'ref').annotations, {})
+        with self.assertRaises(AttributeError):
+            column.extra = True
+
+    def test_empty_acls_stored_on_first_write(self):
+        model = ermrest_model.Model(None, _model_doc())
+        table = model.table('S', 'T3')
+        acls = table.acls
+        self.assertIsNone(table._acls)
+        with self.assertRaises(AttributeError):
+            acls.select
+        acls.select = ['*']
+        self.assertIs(table._acls, acls)
+        self.assertEqual(table.prejson()['acls'], {'select': ['*']})
+        self.assertIs(type(copy.deepcopy(table.acls)), AttrDict)
+
+    def test_types_are_interned(self):
+        model = ermrest_model.Model(None, _model_doc())
+        self.assertIs(model.column('S', 'T1', 'ref').type, ermrest_model.builtin_types.text)
+        self.assertIs(model.column('S', 'T1', 'RID').type, model.column('S', 'T2', 'RID').type)
+        self.assertEqual(model.column('S', 'T1', 'RID').type.prejson()['base_type'], {'typename': 'text'})
+
+    def test_unused_types_are_released(self):
+        ermrest_model.make_type({'typename': 'int4', 'is_array': True, 'base_type': {'typename': 'unused_domain', 'is_domain': True, 'base_type': {'typename': 'int4'}}})
+        gc.collect()
+        self.assertFalse([key for key in ermrest_model._interned_types if 'unused_domain' in repr(key)])
+        self.assertIs(ermrest_model.make_type({'typename': 'text'}), ermrest_model.builtin_types.text)
+
+
+class ConstraintIndexTests (unittest.TestCase):
+
+    def test_lookups_follow_constraint_changes(self):
+        model = ermrest_model.Model(None, _model_doc())
+        table = model.table('S', 'T3')
+        self.assertEqual(table.key_by_columns(['RID']).constraint_name, 'T3_RID_key')
+        self.assertIsNone(table.key_by_columns(['ref'], raise_nomatch=False))
+        key = ermrest_model.Key(table, {'unique_columns': ['ref'], 'names': [['S', 'T3_ref_key']]})
+        table.keys.append(key)
+        self.assertIs(table.key_by_columns([table.columns['ref']]), key)
+        del table.keys[key.name]
+        with self.assertRaises(KeyError):
+            table.key_by_columns(['ref'])
+
+        ref_fkey = model.fkey(('S', 'T3_ref_fkey'))
+        self.assertEqual(list(table.fkeys_by_columns(['ref'])), [ref_fkey])
+        self.assertIs(table.fkey_by_column_map({'ref': model.column('S', 'T2', 'RID')}), ref_fkey)
+        del table.foreign_keys[ref_fkey.name]
+        self.assertEqual(list(table.fkeys_by_columns(['ref'], raise_nomatch=False)), [])
+        self.assertIsNone(table.fkey_by_column_map({'ref': model.column('S', 'T2', 'RID')}, raise_nomatch=False))
+        self.assertEqual(len(list(table.fkeys_by_columns(['root']))), 1)
+
+
+class SchemaGraphTests (unittest.TestCase):
+
+    def _association_model(self):
+        doc = _model_doc(5)
+        table_def = ermrest_model.Table.define(
+            'A',
+            column_defs=[ermrest_model.Column.define(cname, ermrest_model.builtin_types.text, nullok=False) for cname in ['t1', 't3']],
+            key_defs=[ermrest_model.Key.define(['t1', 't3'], constraint_name='A_key')],
+            fkey_defs=[
+                ermrest_model.ForeignKey.define(['t1'], 'S', 'T1', ['RID'], constraint_name='A_t1_fkey'),
+                ermrest_model.ForeignKey.define(['t3'], 'S', 'T3', ['RID'], constraint_name='A_t3_fkey'),
+            ],
+        )
+        table_def.update(schema_name='S', kind='table')
+        doc['schemas']['S']['tables']['A'] = table_def
+        return ermrest_model.Model(None, doc)
+
+    def test_graph_is_cached_per_model(self):
+        model = ermrest_model.Model(None, _model_doc(5))
+        graph = model.schema_graph()
+        self.assertIs(model.schema_graph(), graph)
+        self.assertEqual(len(graph), 5)
+        self.assertEqual(
+            [(edge.fkey.constraint_name, edge.outbound) for edge in graph.edges(model.table('S', 'T3'))],
+            [('T3_ref_fkey', True), ('T3_root_fkey', True), ('T4_ref_fkey', False)]
+        )
+        lazy = ermrest_model.Model(None, _model_doc(5), lazy=True)
+        self.assertEqual(len(lazy.schema_graph()), 5)
+        self.assertFalse(lazy._lazy)
+
+    def test_shortest_paths(self):
+        model = ermrest_model.Model(None, _model_doc(5))
+        graph = model.schema_graph()
+        t1, t3 = model.table('S', 'T1'), model.table('S', 'T3')
+        path = graph.shortest_path(t3, t1)
+        self.assertEqual([edge.fkey.constraint_name for edge in path], ['T3_ref_fkey', 'T2_ref_fkey'])
+        self.assertEqual([edge.target.name for edge in path], ['T2', 'T1'])
+        self.assertIsNone(graph.shortest_path(t3, t1, max_hops=1))
+        paths = graph.shortest_paths(t3, t1, k=10)
+        self.assertEqual(
+            [[edge.fkey.constraint_name for edge in path] for path in paths[0:3]],
+            [['T3_ref_fkey', 'T2_ref_fkey'], ['T3_root_fkey', 'T1_ref_fkey'], ['T3_root_fkey', 'T1_root_fkey']]
+        )
+        self.assertEqual([len(path) for path in paths], sorted(len(path) for path in paths))
+        self.assertEqual(len({tuple(path) for path in paths}), len(paths))
+        for path in paths:
+            tables = [t3] + [edge.target for edge in path]
+            self.assertEqual(len(set(tables)), len(tables))
+            self.assertIs(tables[-1], t1)
+        self.assertEqual(len(graph.shortest_paths(t3, t1, k=10, max_hops=2)), 3)
+
+    def test_association_detection_is_memoized(self):
+        model = self._association_model()
+        assoc = model.table('S', 'A')
+        self.assertEqual(assoc.is_association(), 2)
+        self.assertEqual(
+            {fkey.constraint_name for fkey in assoc.is_association(return_fkeys=True)},
+            {'A_t1_fkey', 'A_t3_fkey'}
+        )
+        self.assertIs(model.schema_graph().association_fkeys(assoc), model.schema_graph().association_fkeys(assoc))
+        self.assertFalse(model.table('S', 'T2').is_association())
+        results = list(model.table('S', 'T1').find_associations())
+        self.assertEqual([(r.table.name, r.self_fkey.constraint_name) for r in results], [('A', 'A_t1_fkey')])
+        self.assertEqual([fkey.pk_table.name for fkey in results[0].other_fkeys], ['T3'])
+        paths = model.schema_graph().shortest_paths(model.table('S', 'T1'), model.table('S', 'T3'), k=10, max_hops=2)
+        self.assertIn(['A_t1_fkey', 'A_t3_fkey'], [[edge.fkey.constraint_name for edge in path] for path in paths])
+
+
+class _ConfigHandler (JSONRequestHandler):
+    """Minimal ERMrest model API echoing PUT configuration, failing the first PUT with 409 Conflict if asked."""
+    puts = []
+    conflicts = 0
+
+    def do_PUT(self):
+        body = self.read_body()
+        if _ConfigHandler.conflicts > 0:
+            _ConfigHandler.conflicts -= 1
+            return self.send_body(409)
+        self.puts.append((self.path, json.loads(body)))
+        self.send_body(200, body)
+
+
+class ApplyPlanTests (LocalServerTestCase):
+
+    def setUp(self):
+        self.catalog = self.start_catalog(_ConfigHandler)
+        _ConfigHandler.puts = []
+        _ConfigHandler.conflicts = 0
+        self.retry_delay = ermrest_model.DEFAULT_APPLY_RETRY_DELAY
+        ermrest_model.DEFAULT_APPLY_RETRY_DELAY = 0
+
+    def tearDown(self):
+        ermrest_model.DEFAULT_APPLY_RETRY_DELAY = self.retry_delay
+
+    def test_plan_and_apply_changes(self):
+        model = ermrest_model.Model(self.catalog, _model_doc())
+        existing = ermrest_model.Model(self.catalog, _model_doc())
+        self.assertEqual(len(model.plan_apply(existing)), 0)
+
+        model.annotations[tag.display] = {'name': 'Catalog'}
+        model.table('S', 'T3').comment = 'changed'
+        model.column('S', 'T4', 'ref').acls['select'] = ['*']
+        model.fkey(('S', 'T5_ref_fkey')).annotations[tag.foreign_key] = {'to_name': 'Ref'}
+        plan = model.plan_apply(existing)
+        self.assertEqual(
+            [(request['uri_path'], sorted(request['json'])) for request in plan.prejson()],
+            [
+                ('/annotation', [tag.display]),
+                ('/schema/S/table/T3', ['comment']),
+                ('/schema/S/table/T4/column/ref', ['acls']),
+                ('/schema/S/table/T5/foreignkey/ref/reference/S:T4/RID', ['annotations']),
+            ]
+        )
+
+        # changes are sent one at a time without retries unless requested
+        _ConfigHandler.conflicts = 1
+        with self.assertRaises(requests.HTTPError):
+            model.apply(existing)
+        self.assertEqual(_ConfigHandler.puts, [])
+
+        _ConfigHandler.conflicts = 1
+        model.apply(existing, workers=3, retries=1)
+        self.assertEqual(
+            sorted(path for path, body in _ConfigHandler.puts),
+            sorted('/ermrest/catalog/1' + request['uri_path'] for request in plan.prejson())
+        )
+        self.assertEqual(model.column('S', 'T4', 'ref').acls, {'select': ['*']})
+
+
 @unittest.skipUnless(hostname, "Test host not specified")
 class ErmrestModelTests (unittest.TestCase):
 
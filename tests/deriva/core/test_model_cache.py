@@ -0,0 +1,68 @@
+import shutil
+import tempfile
+import unittest
+
+from deriva.core import ErmrestCatalog, ErmrestSnapshot, ModelCache
+from deriva.core.ermrest_model import Schema, Table, Column, builtin_types
+from . import LocalServerTestCase, JSONRequestHandler
+
+MODEL_DOC = {
+    'acls': {},
+    'annotations': {},
+    'schemas': {'S': dict(Schema.define('S'), tables={'T': Table.define('T', [Column.define('name', builtin_types.text)])})},
+}
+
+
+class _SchemaHandler(JSONRequestHandler):
+    requests_seen = []
+    etag = '"v1"'
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == self.etag:
+            return self.send_body(304, headers={'ETag': self.etag})
+        self.send_json(MODEL_DOC, headers={'ETag': self.etag})
+
+
+class ModelCacheTests(LocalServerTestCase):
+
+    def setUp(self):
+        self.host = self.server_host(self.start_server(_SchemaHandler))
+        self.tmpdir = tempfile.mkdtemp()
+        _SchemaHandler.requests_seen = []
+        _SchemaHandler.etag = '"v1"'
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_revalidates_catalog_model(self):
+        catalog = ErmrestCatalog('http', self.host, '1')
+        catalog.model_cache = ModelCache(self.tmpdir)
+        model = catalog.getCatalogModel()
+        self.assertIn('T', model.schemas['S'].tables)
+        model.schemas['S'].tables['T'].annotations['x'] = 1
+
+        # a new cache on the same directory starts warm and needs only a 304 revalidation
+        catalog.model_cache = ModelCache(self.tmpdir)
+        model = catalog.getCatalogModel()
+        self.assertEqual(model.schemas['S'].tables['T'].annotations, {})
+        self.assertIs(model.catalog, catalog)
+        self.assertEqual(catalog.model_cache.stats()['revalidated'], 1)
+        self.assertEqual(_SchemaHandler.requests_seen[-1], ('/ermrest/catalog/1/schema', '"v1"'))
+
+        _SchemaHandler.etag = '"v2"'
+        catalog.getCatalogModel()
+        self.assertEqual(catalog.model_cache.stats()['misses'], 1)
+
+    def test_snapshot_model_without_requests(self):
+        cache = ModelCache(None)
+        snapshot = ErmrestSnapshot('http', self.host, '1', '2TA-XYZ')
+        snapshot.model_cache = cache
+        snapshot.getCatalogModel()
+        snapshot.getPathBuilder()
+        self.assertEqual(len(_SchemaHandler.requests_seen), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
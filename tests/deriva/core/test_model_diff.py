@@ -0,0 +1,120 @@
+import json
+import unittest
+
+from deriva.core import ermrest_model, tag
+from deriva.core.ermrest_model import Table, Column, Key, ForeignKey, builtin_types
+from deriva.core.model_diff import diff, resolve, ModelOp, ModelPatch
+from .test_ermrest_model import _model_doc
+from . import LocalServerTestCase, JSONRequestHandler
+
+
+def _changed_model(catalog=None):
+    """Build a model from _model_doc(5) with one of each kind of structural and configuration change."""
+    model = ermrest_model.Model(catalog, _model_doc(5))
+    doc = model.prejson()
+    tables = doc['schemas']['S']['tables']
+    for table_doc in tables.values():
+        table_doc['kind'] = 'table'
+    del tables['T4']
+    tables['T3']['column_definitions'] = [c for c in tables['T3']['column_definitions'] if c['name'] != 'root']
+    tables['T3']['foreign_keys'] = [fk for fk in tables['T3']['foreign_keys'] if fk['names'][0][1] != 'T3_root_fkey']
+    tables['T2']['column_definitions'].append(Column.define('label', builtin_types.text))
+    tables['T2']['keys'].append(Key.define(['label'], constraint_name='T2_label_key'))
+    for column_doc in tables['T1']['column_definitions']:
+        if column_doc['name'] == 'ref':
+            column_doc.update(nullok=False, type=builtin_types.int8.prejson())
+            column_doc['annotations'][tag.display] = {'name': 'Reference'}
+    tables['T1']['foreign_keys'][0]['on_delete'] = 'CASCADE'
+    new_table = Table.define(
+        'U', [Column.define('t2', builtin_types.text)],
+        fkey_defs=[ForeignKey.define(['t2'], 'S', 'T2', ['RID'], constraint_name='U_t2_fkey')],
+    )
+    new_table.update(schema_name='S2', kind='table')
+    new_table['keys'][0]['names'] = [['S2', 'U_RID_key']]
+    schema_doc = ermrest_model.Schema.define('S2', comment='new')
+    schema_doc['tables'] = {'U': new_table}
+    doc['schemas']['S2'] = schema_doc
+    doc['schemas']['S']['comment'] = 'changed'
+    doc['annotations'] = {tag.generated: None}
+    return ermrest_model.Model(catalog, doc)
+
+
+class ModelDiffTests (unittest.TestCase):
+
+    def test_diff_of_equal_models_is_empty(self):
+        self.assertEqual(len(diff(ermrest_model.Model(None, _model_doc(5)), ermrest_model.Model(None, _model_doc(5)))), 0)
+
+    def test_diff_operations_and_order(self):
+        old, new = ermrest_model.Model(None, _model_doc(5)), _changed_model()
+        patch = diff(old, new)
+        self.assertEqual(
+            [(op.op, op.target[0:2]) for op in patch],
+            [
+                ('drop_fkey', ('S', 'T4')),
+                ('drop_fkey', ('S', 'T4')),
+                ('drop_fkey', ('S', 'T3')),
+                ('drop_column', ('S', 'T3')),
+                ('drop_table', ('S', 'T4')),
+                ('alter_column', ('S', 'T1')),
+                ('create_column', ('S', 'T2')),
+                ('create_key', ('S', 'T2')),
+                ('create_schema', ('S2',)),
+                ('create_table', ('S2', 'U')),
+                ('alter_fkey', ('S', 'T1')),
+                ('create_fkey', ('S2', 'U')),
+                ('set_annotation', ()),
+                ('set_comment', ('S',)),
+                ('set_annotation', ('S', 'T1')),
+            ]
+        )
+        ops = {op.op: op for op in patch}
+        self.assertEqual(ops['drop_column'].target, ('S', 'T3', 'column', 'root'))
+        self.assertEqual(ops['create_key'].target, ('S', 'T2', 'key', ('label',)))
+        self.assertEqual(ops['alter_column'].value, {'type': builtin_types.int8.prejson(), 'nullok': False})
+        self.assertEqual(ops['alter_fkey'].value, {'on_delete': 'CASCADE'})
+        self.assertEqual(ops['create_fkey'].target, ('S2', 'U', 'foreign_key', ('S', 'T2', (('t2', 'RID'),))))
+        self.assertIs(resolve(old, patch.ops[2].target), old.fkey(('S', 'T3_root_fkey')))
+        self.assertIs(resolve(new, ops['create_fkey'].target), new.fkey(('S2', 'U_t2_fkey')))
+
+    def test_patch_json_round_trip(self):
+        patch = diff(ermrest_model.Model(None, _model_doc(5)), _changed_model())
+        restored = ModelPatch.fromjson(json.loads(json.dumps(patch.prejson())))
+        self.assertEqual(restored.ops, patch.ops)
+        self.assertIsInstance(restored.ops[0], ModelOp)
+
+
+class _EchoHandler (JSONRequestHandler):
+    """Minimal ERMrest model API echoing POST and PUT bodies and accepting DELETE."""
+    requests_seen = []
+
+    def _echo(self):
+        body = self.read_body()
+        self.requests_seen.append((self.command, self.path))
+        self.send_body(201 if self.command == 'POST' else 200, body)
+
+    do_POST = do_PUT = _echo
+
+    def do_DELETE(self):
+        self.requests_seen.append((self.command, self.path))
+        self.send_body(204)
+
+
+class ModelPatchApplyTests (LocalServerTestCase):
+
+    def setUp(self):
+        self.catalog = self.start_catalog(_EchoHandler)
+        _EchoHandler.requests_seen = []
+
+    def test_apply_patch_to_third_catalog(self):
+        patch = diff(ermrest_model.Model(None, _model_doc(5)), _changed_model())
+        target = ermrest_model.Model(self.catalog, _model_doc(5))
+        patch.apply(target, workers=2)
+        self.assertEqual(len(diff(target, _changed_model())), 0)
+        methods = [method for method, path in _EchoHandler.requests_seen]
+        self.assertEqual(methods.count('DELETE'), 5)
+        self.assertEqual(methods.count('POST'), 5)
+        self.assertEqual(methods.count('PUT'), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
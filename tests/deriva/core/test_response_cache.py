@@ -0,0 +1,189 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from deriva.core import DerivaBinding, ResponseCache, DiskResponseCache
+from . import LocalServerTestCase, JSONRequestHandler
+
+
+def _response(body=b'{}', etag='"x"'):
+    r = requests.Response()
+    r.status_code = 200
+    r._content = body
+    if etag is not None:
+        r.headers['etag'] = etag
+    return r
+
+
+class ResponseCacheTests(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = ResponseCache()
+        r = _response()
+        self.assertIsNone(cache.get('u1'))
+        cache.put('u1', r)
+        self.assertIs(cache.get('u1'), r)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['stores'], 1)
+        self.assertEqual(stats['entries'], 1)
+
+    def test_no_etag_not_stored(self):
+        cache = ResponseCache()
+        cache.put('u1', _response(etag=None))
+        self.assertNotIn('u1', cache)
+
+    def test_lru_max_entries(self):
+        cache = ResponseCache(max_entries=2, max_bytes=None)
+        cache.put('u1', _response())
+        cache.put('u2', _response())
+        cache.get('u1')
+        cache.put('u3', _response())
+        self.assertIn('u1', cache)
+        self.assertNotIn('u2', cache)
+        self.assertIn('u3', cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_max_bytes(self):
+        cache = ResponseCache(max_entries=None, max_bytes=150)
+        cache.put('u1', _response(b'a' * 100))
+        cache.put('u2', _response(b'b' * 100))
+        self.assertEqual(len(cache), 1)
+        self.assertIn('u2', cache)
+        self.assertLessEqual(cache.nbytes, 150)
+        cache.put('u3', _response(b'c' * 1000))
+        self.assertNotIn('u3', cache)
+        self.assertEqual(cache.stats()['rejected'], 1)
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=0.01)
+        cache.put('u1', _response())
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('u1'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+class DiskResponseCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache', 'responses.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_shared_between_instances(self):
+        writer = DiskResponseCache(self.path)
+        writer.put('u1', _response(b'{"a": 1}', '"e1"'))
+        reader = DiskResponseCache(self.path)
+        r = reader.get('u1')
+        self.assertIsNotNone(r)
+        self.assertEqual(r.headers['ETag'], '"e1"')
+        self.assertEqual(r.json(), {"a": 1})
+        self.assertEqual(reader.stats()['disk_hits'], 1)
+
+    def test_disk_eviction(self):
+        cache = DiskResponseCache(self.path, max_disk_bytes=250)
+        cache.put('u1', _response(b'a' * 100))
+        cache.put('u2', _response(b'b' * 100))
+        cache.put('u3', _response(b'c' * 100))
+        stats = cache.stats()
+        self.assertEqual(stats['disk_entries'], 2)
+        self.assertLessEqual(stats['disk_bytes'], 250)
+        self.assertIsNone(DiskResponseCache(self.path).get('u1'))
+
+    def test_pop_and_clear(self):
+        cache = DiskResponseCache(self.path)
+        cache.put('u1', _response())
+        cache.put('u2', _response())
+        self.assertIsNotNone(cache.pop('u1'))
+        self.assertNotIn('u1', DiskResponseCache(self.path))
+        cache.clear()
+        self.assertEqual(len(DiskResponseCache(self.path)), 0)
+
+    def test_disk_hit_keeps_ttl(self):
+        DiskResponseCache(self.path).put('u1', _response())
+        time.sleep(0.3)
+        cache = DiskResponseCache(self.path, ttl=0.5)
+        self.assertIsNotNone(cache.get('u1'))
+        time.sleep(0.3)
+        self.assertIsNone(cache.get('u1'))
+
+    def test_content_encoding_not_stored(self):
+        r = _response(b'{"a": 1}')
+        r.headers.update({'Content-Encoding': 'gzip', 'Content-Length': '28'})
+        DiskResponseCache(self.path).put('u1', r)
+        cached = DiskResponseCache(self.path).get('u1')
+        self.assertNotIn('Content-Encoding', cached.headers)
+        self.assertNotIn('Content-Length', cached.headers)
+        self.assertEqual(cached.json(), {"a": 1})
+
+    def test_pop_with_unusable_database(self):
+        cache = DiskResponseCache(self.path)
+        cache.put('u1', _response())
+        os.remove(self.path)
+        os.mkdir(self.path)
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNotNone(cache.pop('u1'))
+
+
+class _ETagHandler (JSONRequestHandler):
+    """Minimal service returning a fixed document with an ETag, answering 304 to a matching If-None-Match."""
+    conditional = []
+
+    def do_GET(self):
+        self.conditional.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == '"e1"':
+            return self.send_body(304, headers={'ETag': '"e1"'})
+        self.send_json({"a": 1}, headers={'ETag': '"e1"'})
+
+
+class BindingCacheTests(LocalServerTestCase):
+
+    def setUp(self):
+        self.host = self.server_host(self.start_server(_ETagHandler))
+        self.tmpdir = tempfile.mkdtemp()
+        _ETagHandler.conditional = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _url(self, path):
+        return 'http://%s%s' % (self.host, path)
+
+    def _binding(self, caching):
+        return DerivaBinding('http', self.host, caching=caching)
+
+    def test_empty_cache_instance_enables_caching(self):
+        cache = ResponseCache()
+        binding = self._binding(cache)
+        self.assertEqual(binding.get('/doc').json(), {"a": 1})
+        self.assertEqual(binding.get('/doc').json(), {"a": 1})
+        self.assertEqual(_ETagHandler.conditional, [None, '"e1"'])
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['revalidated'], 1)
+
+    def test_empty_disk_cache_instance_enables_caching(self):
+        path = os.path.join(self.tmpdir, 'responses.sqlite')
+        self._binding(DiskResponseCache(path)).get('/doc')
+        self.assertIn(self._url('/doc'), DiskResponseCache(path))
+        cache = DiskResponseCache(path)
+        binding = self._binding(cache)
+        self.assertEqual(binding.get('/doc').json(), {"a": 1})
+        self.assertEqual(_ETagHandler.conditional, [None, '"e1"'])
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+
+    def test_caching_disabled(self):
+        binding = self._binding(False)
+        binding.get('/doc')
+        binding.get('/doc')
+        self.assertEqual(_ETagHandler.conditional, [None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import io
+import gzip
+import json
+import unittest
+
+from deriva.core import ErmrestCatalog, HatracStore, DEFAULT_SESSION_CONFIG
+from deriva.core.utils.compress_utils import compress, is_compressible
+
+try:
+    import zstandard
+    HAS_ZSTANDARD = True
+except ImportError:
+    HAS_ZSTANDARD = False
+
+
+class CompressTests(unittest.TestCase):
+
+    def test_gzip_sources(self):
+        payload = b'{"RID": "1-0000"}\n' * 10000
+        self.assertEqual(gzip.decompress(compress(payload, 'gzip')), payload)
+        self.assertEqual(gzip.decompress(compress(payload.decode(), 'gzip', chunk_size=1000)), payload)
+        self.assertEqual(gzip.decompress(compress(io.BytesIO(payload), 'gzip', chunk_size=1000)), payload)
+        self.assertEqual(gzip.decompress(compress(io.StringIO(payload.decode()), 'gzip')), payload)
+
+    @unittest.skipUnless(HAS_ZSTANDARD, "zstandard not installed")
+    def test_zstd(self):
+        payload = b'a,b,c\n' * 10000
+        self.assertEqual(zstandard.ZstdDecompressor().decompressobj().decompress(compress(payload, 'zstd')), payload)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            compress(b'x', 'br')
+
+    def test_is_compressible(self):
+        self.assertTrue(is_compressible('application/json'))
+        self.assertTrue(is_compressible('text/csv; charset=utf-8'))
+        self.assertFalse(is_compressible('application/octet-stream'))
+        self.assertFalse(is_compressible(None))
+
+
+class CompressBodyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.session_config = dict(DEFAULT_SESSION_CONFIG, request_compression='gzip', request_compression_min_size=100)
+        self.rows = [{'RID': str(i), 'value': 'x' * 10} for i in range(100)]
+
+    def test_catalog_compresses_json(self):
+        catalog = ErmrestCatalog('http', 'localhost', '1', session_config=self.session_config)
+        data, headers = catalog._encode_body(None, self.rows, {})
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(gzip.decompress(data)), self.rows)
+
+    def test_small_and_binary_bodies_are_not_compressed(self):
+        catalog = ErmrestCatalog('http', 'localhost', '1', session_config=self.session_config)
+        data, headers = catalog._encode_body(None, [{'RID': '1'}], {})
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(json.loads(data), [{'RID': '1'}])
+        data, headers = catalog._encode_body(b'\0' * 1000, None, {'Content-Type': 'application/octet-stream'})
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_hatrac_bodies_are_not_compressed(self):
+        store = HatracStore('http', 'localhost', session_config=self.session_config)
+        data, headers = store._encode_body(None, self.rows, {})
+        self.assertEqual(json.loads(data), self.rows)
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_disabled_by_default(self):
+        catalog = ErmrestCatalog('http', 'localhost', '1')
+        data, headers = catalog._encode_body(None, self.rows, {})
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(json.loads(data), self.rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,14 @@
 
 import datetime
+import threading
 import unittest
 
 from deriva.core import \
     topo_ranked, topo_sorted, \
     crockford_b32encode, crockford_b32decode, \
     int_to_uintX, uintX_to_int, \
-    datetime_to_epoch_microseconds, epoch_microseconds_to_datetime
+    datetime_to_epoch_microseconds, epoch_microseconds_to_datetime, \
+    SessionRegistry, SingleFlight, DEFAULT_SESSION_CONFIG
 
 def _myiter(s):
     for v in s:
@@ -265,5 +267,100 @@ class TimestampCodingTests (unittest.TestCase):
             self.assertEqual(dt, epoch_microseconds_to_datetime(usecs), f"{dt=} {usecs=}")
 
 
+class SessionRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = SessionRegistry()
+
+    def tearDown(self):
+        self.registry.close_all()
+
+    def test_shared_by_host_and_credentials(self):
+        s1 = self.registry.get('https://example.org/ermrest', DEFAULT_SESSION_CONFIG, {'cookie': 'a=1'})
+        s2 = self.registry.get('https://EXAMPLE.org/hatrac/', DEFAULT_SESSION_CONFIG, {'cookie': 'a=1'})
+        s3 = self.registry.get('https://example.org/', DEFAULT_SESSION_CONFIG, {'cookie': 'a=2'})
+        s4 = self.registry.get('https://example.com/', DEFAULT_SESSION_CONFIG, {'cookie': 'a=1'})
+        self.assertIs(s1, s2)
+        self.assertIsNot(s1, s3)
+        self.assertIsNot(s1, s4)
+
+    def test_pool_config(self):
+        config = dict(DEFAULT_SESSION_CONFIG, pool_connections=4, pool_maxsize=32, pool_block=True)
+        session = self.registry.get('https://example.org/', config)
+        adapter = session.get_adapter('https://example.org/')
+        self.assertEqual(adapter._pool_connections, 4)
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertTrue(adapter._pool_block)
+
+    def test_concurrent_init_once(self):
+        calls = []
+        results = []
+
+        def worker():
+            results.append(self.registry.get('https://example.org/', DEFAULT_SESSION_CONFIG, init=calls.append))
+
+        threads = [threading.Thread(target=worker) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r is results[0] for r in results))
+
+
+class SingleFlightTests(unittest.TestCase):
+
+    def _run_concurrently(self, fn, n=8):
+        results = []
+        errors = []
+
+        def worker():
+            try:
+                results.append(fn())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    def test_concurrent_calls_coalesce(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return object()
+
+        threading.Timer(0.2, release.set).start()
+        results, errors = self._run_concurrently(lambda: flight.do('k', slow))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.coalesced, 7)
+        self.assertTrue(all(r is results[0] for r in results))
+
+        # nothing is retained once the call has finished
+        flight.do('k', slow)
+        self.assertEqual(len(calls), 2)
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def failing():
+            release.wait(5)
+            raise ValueError('boom')
+
+        threading.Timer(0.2, release.set).start()
+        results, errors = self._run_concurrently(lambda: flight.do('k', failing), n=4)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,62 @@
+import json
+import unittest
+
+from deriva.core.utils import json_utils
+from deriva.core.utils.json_utils import JSONCodec, JSON_CODEC_PREFERENCE
+
+
+def _available_codecs():
+    codecs = []
+    for name in JSON_CODEC_PREFERENCE:
+        try:
+            codecs.append(JSONCodec(name))
+        except ImportError:
+            pass
+    return codecs
+
+
+class JSONCodecTests(unittest.TestCase):
+
+    doc = {"RID": "1-0000", "Name": "café/bar", "Count": 3, "Ratio": 0.5, "Tags": [None, True, False]}
+
+    def test_roundtrip(self):
+        for codec in _available_codecs():
+            with self.subTest(codec=codec.name):
+                encoded = codec.dumpb(self.doc)
+                self.assertIsInstance(encoded, bytes)
+                self.assertEqual(json.loads(encoded), self.doc)
+                self.assertEqual(codec.loads(encoded), self.doc)
+                self.assertEqual(codec.loads(encoded.decode('utf-8')), self.doc)
+                self.assertEqual(codec.dumps(self.doc), encoded.decode('utf-8'))
+
+    def test_fallback_to_stdlib(self):
+        for codec in _available_codecs():
+            with self.subTest(codec=codec.name):
+                self.assertEqual(json.loads(codec.dumpb([2 ** 70])), [2 ** 70])
+
+    def test_stdlib_rejects_nan(self):
+        with self.assertRaises(ValueError):
+            JSONCodec("json").dumpb(float("nan"))
+
+    def test_every_codec_rejects_nonfinite(self):
+        for codec in _available_codecs():
+            for value in (float("nan"), float("inf"), float("-inf")):
+                with self.subTest(codec=codec.name, value=value):
+                    with self.assertRaises(ValueError):
+                        codec.dumpb([{"RID": "1-0000", "Empty": None, "Ratio": value}])
+                    with self.assertRaises(ValueError):
+                        codec.dumps(value)
+
+    def test_set_json_codec(self):
+        previous = json_utils.json_codec.name
+        try:
+            self.assertEqual(json_utils.set_json_codec("json").name, "json")
+            self.assertEqual(json_utils.json_loads(json_utils.json_dumpb(self.doc)), self.doc)
+            with self.assertRaises(ValueError):
+                json_utils.set_json_codec("yaml")
+        finally:
+            json_utils.set_json_codec(previous)
+
+
+if __name__ == '__main__':
+    unittest.main()
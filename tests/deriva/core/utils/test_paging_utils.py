@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from deriva.core import PageSizeController, PageSizeHistory
+
+
+class PageSizeControllerTests(unittest.TestCase):
+
+    def test_grows_toward_targets(self):
+        controller = PageSizeController(100, target_seconds=10, target_bytes=1000000)
+        self.assertEqual(controller.observe(100, 1.0, 1000), 200)
+        self.assertEqual(controller.observe(200, 8.0, 1000), 250)
+        self.assertEqual(controller.observe(250, 1.0, 500000), 500)
+        self.assertEqual(controller.observe(500, 1.0, 1000000), 500)
+
+    def test_short_page_does_not_grow(self):
+        controller = PageSizeController(100)
+        self.assertEqual(controller.observe(10, 0.01, 100), 100)
+
+    def test_shrinks_when_over_target(self):
+        controller = PageSizeController(1000, target_seconds=10, target_bytes=1000000)
+        self.assertEqual(controller.observe(1000, 20.0, 1000), 500)
+        self.assertEqual(controller.observe(500, 1.0, 2000000), 250)
+
+    def test_failure_and_bounds(self):
+        controller = PageSizeController(4, min_size=2, max_size=6)
+        self.assertEqual(controller.failure(), 2)
+        with self.assertRaises(ValueError):
+            controller.failure()
+        self.assertEqual(controller.observe(2, 0.01, 10), 4)
+        self.assertEqual(controller.observe(4, 0.01, 10), 6)
+
+
+class PageSizeHistoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'page-sizes.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_roundtrip(self):
+        history = PageSizeHistory(self.path)
+        controller = history.controller('/entity/S:T', 1000)
+        controller.failure()
+        history.record('/entity/S:T', controller)
+        history.save()
+
+        restored = PageSizeHistory(self.path).controller('/entity/S:T', 1000)
+        self.assertEqual(restored.size, 500)
+        self.assertIsNone(restored.max_size)
+        self.assertEqual(PageSizeHistory(self.path).controller('/entity/S:U', 1000).size, 1000)
+        self.assertEqual(PageSizeHistory(self.path).controller('/entity/S:T', 1000, max_size=400).size, 400)
+
+    def test_growth_is_remembered(self):
+        history = PageSizeHistory(self.path)
+        controller = history.controller('/entity/S:T', 1000)
+        controller.observe(1000, 1.0, 1024)
+        history.record('/entity/S:T', controller)
+        history.save()
+        self.assertEqual(PageSizeHistory(self.path).controller('/entity/S:T', 1000).size, 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import unittest
+
+from deriva.core import DerivaBinding, RequestMetrics, add_request_observer, remove_request_observer
+from deriva.core.utils.request_metrics import RequestEvent, path_template
+from .. import LocalServerTestCase, JSONRequestHandler
+
+
+class _Handler(JSONRequestHandler):
+    def do_GET(self):
+        self.send_body(200, b'{"RID": "1"}\n')
+
+    def do_POST(self):
+        self.read_body()
+        self.send_body(204)
+
+
+class PathTemplateTests(unittest.TestCase):
+
+    def test_ermrest(self):
+        self.assertEqual(path_template('https://h/ermrest/catalog/1/entity/S:T/RID=1'),
+                         '/ermrest/catalog/{catalog}/entity')
+        self.assertEqual(path_template('https://h/ermrest/catalog/1@2TA-XYZ/attribute/S:T/C?limit=10'),
+                         '/ermrest/catalog/{catalog}/attribute')
+        self.assertEqual(path_template('https://h/ermrest/catalog/1'), '/ermrest/catalog/{catalog}')
+        self.assertEqual(path_template('https://h/ermrest/catalog'), '/ermrest/catalog')
+
+    def test_hatrac(self):
+        self.assertEqual(path_template('https://h/hatrac/ns/obj.txt:ABC'), '/hatrac/{object}')
+        self.assertEqual(path_template('https://h/hatrac/ns/obj.txt;upload'), '/hatrac/{object};upload')
+        self.assertEqual(path_template('https://h/hatrac/ns/obj.txt;upload/job1/3'),
+                         '/hatrac/{object};upload/{job}/{chunk}')
+
+    def test_other(self):
+        self.assertEqual(path_template('https://h/authn/session'), '/authn/session')
+        self.assertEqual(path_template('https://h/chaise/recordset/'), '/chaise')
+
+
+class RequestObserverTests(LocalServerTestCase):
+
+    def setUp(self):
+        self.binding = DerivaBinding('http', self.server_host(self.start_server(_Handler)))
+        self.binding.dcctx['cid'] = 'test'
+
+    def test_binding_observer(self):
+        events = []
+        self.binding.add_request_observer(events.append)
+        self.binding.get('/ermrest/catalog/1/entity/S:T', headers={'deriva-client-context': {'action': 'fetch'}})
+        self.binding.post('/ermrest/catalog/1/entity/S:T', json=[{'a': 1}])
+        self.binding.remove_request_observer(events.append)
+        self.binding.get('/ermrest/catalog/1/entity/S:T')
+
+        self.assertEqual(len(events), 2)
+        get, post = events
+        self.assertEqual((get.method, get.path, get.status), ('GET', '/ermrest/catalog/{catalog}/entity', 200))
+        self.assertEqual(get.response_bytes, 13)
+        self.assertEqual(get.retries, 0)
+        self.assertEqual((get.cid, get.action), ('test', 'fetch'))
+        self.assertEqual((post.method, post.status, post.request_bytes), ('POST', 204, len(b'[{"a":1}]')))
+
+    def test_process_observer_metrics(self):
+        metrics = RequestMetrics()
+        add_request_observer(metrics)
+        try:
+            for i in range(3):
+                self.binding.get('/ermrest/catalog/1/entity/S:T', cache=False)
+        finally:
+            remove_request_observer(metrics)
+
+        summary = metrics.summary()
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['response_bytes'], 39)
+        endpoint = summary['endpoints'][0]
+        self.assertEqual((endpoint['method'], endpoint['status'], endpoint['count']), ('GET', '200', 3))
+        json.loads(metrics.to_json())
+
+        text = metrics.to_prometheus()
+        self.assertIn('deriva_http_requests_total{method="GET",path="/ermrest/catalog/{catalog}/entity",'
+                      'status="200"} 3', text)
+        self.assertIn('le="+Inf"} 3', text)
+
+
+class RequestMetricsTests(unittest.TestCase):
+
+    def test_error_series(self):
+        metrics = RequestMetrics(buckets=(0.1, 1.0))
+        metrics(RequestEvent('GET', 'https://h/hatrac/x', '/hatrac/{object}', None, 0.5, None, None, None,
+                             error='ConnectionError'))
+        metrics(RequestEvent('GET', 'https://h/hatrac/x', '/hatrac/{object}', 200, 0.05, None, 10, 2))
+        endpoints = metrics.summary()['endpoints']
+        self.assertEqual([e['status'] for e in endpoints], ['200', 'error'])
+        self.assertEqual(endpoints[0]['retries'], 2)
+        self.assertEqual(endpoints[1]['latency']['buckets'], {'0.1': 0, '1.0': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()